@@ -1,30 +1,57 @@
 import os
+import signal
 import logging
 import datetime
+import functools
+import io
 import calendar
 import subprocess
 import tempfile
-import signal
+import asyncio
 import threading
-import matplotlib
+import base64
 import json
+import mmap
+import multiprocessing
 import re
+import shutil
+import sqlite3
+import zlib
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import IntEnum
+from types import MappingProxyType
 from typing import Dict, List, Optional, Tuple, Union, Any
-# Set non-interactive backend for matplotlib
-matplotlib.use('Agg')
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 from dotenv import load_dotenv
 import plot_times
+import fetch_tokens
+import httpx
 import requests
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.common.exceptions import TimeoutException as WebDriverTimeoutException
 import time
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib json module
+    orjson = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, credentials are then kept in the config var or file
+    aioredis = None
+
 # Load environment variables
 load_dotenv()
 
@@ -38,22 +65,50 @@ logger = logging.getLogger(__name__)
 # Define weekday keys
 WEEKDAY_KEYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
+# Weekday position lookup, used as a sort key for day abbreviations
+WEEKDAY_INDEX = {day: i for i, day in enumerate(WEEKDAY_KEYS)}
+
+# Full day names for display
+DAY_FULL_NAMES = {
+    "Mon": "Monday",
+    "Tue": "Tuesday",
+    "Wed": "Wednesday",
+    "Thu": "Thursday",
+    "Fri": "Friday",
+    "Sat": "Saturday",
+    "Sun": "Sunday"
+}
+
+# Abbreviation lookup for work days stored under their full names
+FULL_TO_ABBREV = {name: day for day, name in DAY_FULL_NAMES.items()}
+
 # States for conversation handler
-CHOOSING_ACTION = 0
-WAITING_FOR_CUSTOM_MONTH = 1
-WAITING_FOR_SESSION_ID = 2
-WAITING_FOR_CSRF_TOKEN = 3
-WAITING_FOR_ODOO_UID = 4
-CHOOSING_WORK_SCHEDULE = 5
-SETTING_WORK_DAYS = 6
-SETTING_WORK_HOURS = 7
-WAITING_FOR_HOURS_INPUT = 8
-WAITING_FOR_ALL_HOURS_INPUT = 9
-WAITING_FOR_EMAIL = 10
-WAITING_FOR_PASSWORD = 11
-
-# Default work schedule settings
-DEFAULT_WORK_DAYS = {
+class State(IntEnum):
+    CHOOSING_ACTION = 0
+    WAITING_FOR_SESSION_ID = 1
+    WAITING_FOR_CSRF_TOKEN = 2
+    WAITING_FOR_ODOO_UID = 3
+    WAITING_FOR_CUSTOM_MONTH = 4
+    WAITING_FOR_ALL_HOURS_INPUT = 5
+    CHOOSING_WORK_SCHEDULE = 6
+    SETTING_WORK_DAYS = 7
+    SETTING_WORK_HOURS = 8
+    SETTING_SPECIFIC_HOURS = 9
+    WAITING_FOR_HOURS_INPUT = 10
+    WAITING_FOR_EMAIL = 11
+    WAITING_FOR_PASSWORD = 12
+
+# Input validators, compiled once at import
+_SESSION_RE = re.compile(r'[A-Za-z0-9]{20,}\Z')
+_CSRF_RE = re.compile(r'\S{20,}\Z')
+_MONTH_RE = re.compile(r'(?:(\d{4})-)?(\d{1,2})\Z')
+# One 'Day: hours' line of the set-all-hours message, with the day and value stripped
+_HOURS_LINE_RE = re.compile(r'\s*([^:]*?)\s*:\s*([^:]*?)\s*\Z')
+# Plain decimal hours value such as 8 or 7.5 (float() would also take 'nan' or '1e1')
+_HOURS_VALUE_RE = re.compile(r'-?\d+(?:\.\d+)?\Z')
+
+# Default work schedule settings; the work days are read-only and copied on the first toggle
+DEFAULT_WORK_DAYS = MappingProxyType({
     "Mon": True,
     "Tue": True,
     "Wed": True,
@@ -61,7 +116,7 @@ DEFAULT_WORK_DAYS = {
     "Fri": True,
     "Sat": False,
     "Sun": False
-}
+})
 
 DEFAULT_WORK_HOURS = {
     "Mon": 8.0,
@@ -78,116 +133,432 @@ FULL_TIME = "full_time"  # 40 hours per week
 PART_TIME = "part_time"  # 20 hours per week
 CUSTOM = "custom"        # Custom hours per day
 
+# Main menu keyboard, built once and shared by every menu message
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📅 Current Month", callback_data="month"),
+        InlineKeyboardButton("📊 Current Week", callback_data="week"),
+    ],
+    [
+        InlineKeyboardButton("🗓️ Custom Month", callback_data="custom_month"),
+        InlineKeyboardButton("📈 Status", callback_data="status"),
+    ],
+    [
+        InlineKeyboardButton("🔄 Auto Fetch Tokens", callback_data="auto_fetch_tokens"),
+        InlineKeyboardButton("⏰ Work Schedule", callback_data="work_schedule"),
+    ],
+    [
+        InlineKeyboardButton("❓ Help", callback_data="help"),
+    ]
+])
+
+# Work schedule type selection keyboard
+WORK_SCHEDULE_OPTIONS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⏰ Full Time (40h/week)", callback_data="hours_full_time")],
+    [InlineKeyboardButton("⌛ Part Time", callback_data="part_time_custom")],
+    [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
+])
+
+# Hours distribution keyboards shown after picking custom or part-time work days
+HOURS_DISTRIBUTION_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⌛ Standard Distribution", callback_data="hours_standard")],
+    [InlineKeyboardButton("📝 Set Specific Hours per Day", callback_data="set_specific_hours")],
+    [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
+    [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
+])
+PART_TIME_HOURS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⌛ Standard Part-Time (20h/week)", callback_data="hours_part_time")],
+    [InlineKeyboardButton("📝 Set Specific Hours per Day", callback_data="set_specific_hours")],
+    [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
+    [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
+])
+
+# Help message shown by /help and the Help button
+HELP_TEXT = (
+    "🤖 *Odoo Time Tracking Bot* 🤖\n\n"
+    "*📋 Available Commands:*\n"
+    "• `/start` - Start the bot and show main menu\n"
+    "• `/month` - Generate report for current month\n"
+    "• `/week` - Generate report for current week\n"
+    "• `/custom YYYY-MM` - Generate report for specific month\n"
+    "• `/status` - Show current status without PDF\n"
+    "• `/work_schedule` - Set your work schedule\n"
+    "• `/debug` - Show your credential status\n"
+    "• `/help` - Show this help message\n\n"
+    "*📊 Report Types:*\n"
+    "• *Monthly Report* - Complete analysis with PDF chart\n"
+    "• *Weekly Report* - Current week's hours with chart\n"
+    "• *Custom Month* - Specify any month (YYYY-MM)\n"
+    "• *Status* - Quick text-only summary\n\n"
+    "*⚙️ Getting Started:*\n"
+    "1. Set your credentials using the 'Auto Fetch Tokens' button in the menu\n"
+    "2. Set your work schedule with `/work_schedule`\n"
+    "3. Generate your first report with `/month`\n"
+    "4. Check your status anytime with `/status`\n\n"
+    "This bot helps you track your work hours from Odoo and visualize them."
+)
+
 # Get the bot token from environment variable
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
 # Environment variable for storing credentials
 CREDENTIALS_ENV_VAR = 'USER_CREDENTIALS'
+# Marks a config var value holding zlib-compressed, base64-encoded credentials JSON
+COMPRESSED_CREDENTIALS_PREFIX = 'z:'
+# Redis server for credential storage (set by the Heroku Redis add-on); optional
+REDIS_URL = os.getenv('REDIS_URL')
+# Redis hash holding one JSON encoded credentials record per user_id
+CREDENTIALS_REDIS_KEY = 'user_credentials'
+# SQLite database with one JSON encoded credentials row per user_id, used outside Heroku
+CREDENTIALS_DB = 'credentials.db'
+
+def dumps_json(obj):
+    """Serialize obj to UTF-8 encoded JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def loads_json(data):
+    """Parse a JSON str or bytes payload, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json_file(path):
+    """Parse a JSON file, letting orjson read straight from a memory map when available."""
+    with open(path, 'rb') as f:
+        if orjson is None:
+            return json.load(f)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+def pack_credentials(credentials_json):
+    """Compress serialized credentials into a compact config var value."""
+    packed = base64.b64encode(zlib.compress(credentials_json, 9)).decode()
+    return COMPRESSED_CREDENTIALS_PREFIX + packed
+
+def unpack_credentials(value):
+    """Return the JSON stored in a config var value, compressed (as bytes) or not."""
+    if not value.startswith(COMPRESSED_CREDENTIALS_PREFIX):
+        # Plain JSON written before compression was introduced
+        return value
+    packed = value[len(COMPRESSED_CREDENTIALS_PREFIX):]
+    return zlib.decompress(base64.b64decode(packed, validate=True))
 
 # Load existing credentials or create empty dict
 def load_credentials():
+    # Try to get credentials from Heroku config vars first
+    if os.environ.get('DYNO'):  # Check if running on Heroku
+        credentials_json = os.getenv(CREDENTIALS_ENV_VAR)
+        if credentials_json:
+            try:
+                credentials = loads_json(unpack_credentials(credentials_json))
+            except (ValueError, zlib.error) as e:
+                logger.error(f"Error parsing credentials from Heroku config var: {e}")
+                return {}
+            logger.info(f"Loaded credentials for {len(credentials)} users from Heroku config var")
+            return credentials
+
+    # Local development, or no config var on Heroku - use the local database
     try:
-        # Try to get credentials from Heroku config vars first
-        if os.environ.get('DYNO'):  # Check if running on Heroku
-            credentials_json = os.getenv(CREDENTIALS_ENV_VAR)
-            if not credentials_json:
-                # If not in env var, try to load from local file as fallback
-                if os.path.exists('credentials.json'):
-                    with open('credentials.json', 'r') as f:
-                        credentials = json.load(f)
-                        logger.info(f"Loaded credentials for {len(credentials)} users from local file")
-                        return credentials
-            else:
-                credentials = json.loads(credentials_json)
-                logger.info(f"Loaded credentials for {len(credentials)} users from Heroku config var")
-                return credentials
-        else:
-            # Local development - use local file
-            if os.path.exists('credentials.json'):
-                with open('credentials.json', 'r') as f:
-                    credentials = json.load(f)
-                    logger.info(f"Loaded credentials for {len(credentials)} users from local file")
-                    return credentials
+        credentials = read_credentials_db()
+    except sqlite3.Error as e:
+        logger.error(f"Error loading credentials from {CREDENTIALS_DB}: {e}")
+        return {}
+    if credentials:
+        logger.info(f"Loaded credentials for {len(credentials)} users from {CREDENTIALS_DB}")
+        return credentials
 
+    # Credentials saved before the database was introduced
+    if not os.path.exists('credentials.json'):
         logger.warning(f"No credentials found, creating new empty dictionary")
         return {}
-    except Exception as e:
+
+    try:
+        credentials = read_json_file('credentials.json')
+    except (OSError, ValueError) as e:
+        # JSONDecodeError is a ValueError, and so is mmap's error for an empty file
         logger.error(f"Error loading credentials: {e}")
         return {}
+    logger.info(f"Loaded credentials for {len(credentials)} users from local file")
 
-# Save credentials to environment variable
-def save_credentials(credentials):
+    # Move them over once, later saves only touch the changed rows
+    write_credentials_db({user_id: dumps_json(record) for user_id, record in credentials.items()})
+    return credentials
+
+def connect_credentials_db():
+    """Open the local credentials database, creating its table on first use."""
+    conn = sqlite3.connect(CREDENTIALS_DB)
+    conn.execute("CREATE TABLE IF NOT EXISTS credentials (user_id TEXT PRIMARY KEY, record BLOB NOT NULL)")
+    return conn
+
+def read_credentials_db():
+    """Load all users' credentials from the local database."""
+    if not os.path.exists(CREDENTIALS_DB):
+        return {}
+    conn = connect_credentials_db()
     try:
-        credentials_json = json.dumps(credentials)
-        if os.environ.get('DYNO'):  # Check if running on Heroku
-            # Save to both env var and file for redundancy
-            os.environ[CREDENTIALS_ENV_VAR] = credentials_json
-            with open('credentials.json', 'w') as f:
-                json.dump(credentials, f)
-            logger.info("Saved credentials to Heroku env var and local file")
+        rows = conn.execute("SELECT user_id, record FROM credentials").fetchall()
+    finally:
+        conn.close()
+    return {user_id: loads_json(record) for user_id, record in rows}
+
+def write_credentials_db(records):
+    """Insert or replace the given JSON encoded records, keyed by user_id, in one transaction."""
+    conn = connect_credentials_db()
+    try:
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO credentials (user_id, record) VALUES (?, ?)", records.items())
+    finally:
+        conn.close()
+
+# Quiet time after the last credential change before the pending changes are written
+CREDENTIALS_FLUSH_DELAY = 2  # seconds
+# Upper bound on how long a steady stream of changes can hold back the write
+CREDENTIALS_FLUSH_MAX_DELAY = 30  # seconds
+
+# Async HTTP client for Heroku API calls, created in post_init
+heroku_client = None
+# Shared HTTP/2 client for the Odoo exports; credentials are sent per request
+odoo_client = None
+# Redis connection used for credential storage when REDIS_URL is set, created in post_init
+redis_client = None
+
+# IDs of users whose credentials changed since the last write
+_dirty_users = set()
+_credentials_flush_task = None
+# time.monotonic() of the latest credential change, pushes the pending write back
+_last_credentials_change = 0.0
+
+async def update_heroku_config(config_value):
+    """Store the packed credentials in the Heroku config var."""
+    try:
+        heroku_api_key = os.getenv('HEROKU_API_KEY')
+        if heroku_api_key:
+            # Get app name from environment or use default
+            app_name = os.getenv('HEROKU_APP_NAME', 'odoo-time-tracking-tool')
+            logger.info(f"Using Heroku app name: {app_name}")
+
+            headers = {
+                'Accept': 'application/vnd.heroku+json; version=3',
+                'Authorization': f'Bearer {heroku_api_key}',
+                'Content-Type': 'application/json'
+            }
+            url = f'https://api.heroku.com/apps/{app_name}/config-vars'
+            data = {CREDENTIALS_ENV_VAR: config_value}
+
+            logger.info(f"Updating Heroku config var with API: {url}")
+            response = await heroku_client.patch(url, headers=headers, json=data)
+
+            if response.status_code == 200:
+                logger.info("Successfully updated Heroku config var")
+            else:
+                logger.error(f"Failed to update Heroku config var: {response.status_code}, {response.text}")
+    except Exception as e:
+        logger.error(f"Error updating Heroku config var: {e}")
+
+async def write_credentials(credentials, user_ids):
+    """Write the given users' changed credentials to Redis, the Heroku config var or the local database."""
+    try:
+        if redis_client is not None:
+            await write_redis_credentials(credentials, user_ids)
+        elif os.environ.get('DYNO'):  # Check if running on Heroku
+            # The dyno filesystem is ephemeral, so the config var holding every user is the only store
+            credentials_json = dumps_json(credentials)
+            packed = pack_credentials(credentials_json)
+            os.environ[CREDENTIALS_ENV_VAR] = packed
+            logger.info(f"Saved credentials to Heroku env var ({len(packed)} of {len(credentials_json)} bytes)")
 
             # Update Heroku config var using API
-            try:
-                heroku_api_key = os.getenv('HEROKU_API_KEY')
-                if heroku_api_key:
-                    # Get app name from environment or use default
-                    app_name = os.getenv('HEROKU_APP_NAME', 'odoo-time-tracking-tool')
-                    logger.info(f"Using Heroku app name: {app_name}")
-
-                    headers = {
-                        'Accept': 'application/vnd.heroku+json; version=3',
-                        'Authorization': f'Bearer {heroku_api_key}',
-                        'Content-Type': 'application/json'
-                    }
-                    url = f'https://api.heroku.com/apps/{app_name}/config-vars'
-                    data = {CREDENTIALS_ENV_VAR: credentials_json}
-
-                    logger.info(f"Updating Heroku config var with API: {url}")
-                    response = requests.patch(url, headers=headers, json=data)
-
-                    if response.status_code == 200:
-                        logger.info("Successfully updated Heroku config var")
-                    else:
-                        logger.error(f"Failed to update Heroku config var: {response.status_code}, {response.text}")
-            except Exception as e:
-                logger.error(f"Error updating Heroku config var: {e}")
+            await update_heroku_config(packed)
         else:
-            # Local development - save to file
-            with open('credentials.json', 'w') as f:
-                json.dump(credentials, f)
-            logger.info("Saved credentials to local file")
+            # Local development - only the changed rows are written
+            # Serialize on the event loop so handlers cannot mutate the records mid-dump
+            records = {user_id: dumps_json(credentials[user_id]) for user_id in user_ids}
+            await asyncio.to_thread(write_credentials_db, records)
+            logger.info(f"Saved credentials for {len(records)} users to {CREDENTIALS_DB}")
     except Exception as e:
         logger.error(f"Error saving credentials: {e}")
 
-# Global variables
-user_credentials = load_credentials()
-logger.info(f"Loaded credentials for users: {list(user_credentials.keys())}")
-
-class TimeoutException(Exception):
-    """Exception raised when a function call times out."""
-    pass
-
-def timeout_handler(signum, frame):
-    """Handler for timeout signal."""
-    raise TimeoutException("Function call timed out")
+async def load_redis_credentials():
+    """Load all users' credentials from the Redis hash."""
+    records = await redis_client.hgetall(CREDENTIALS_REDIS_KEY)
+    credentials = {}
+    for user_id, record in records.items():
+        try:
+            credentials[user_id.decode()] = loads_json(record)
+        except ValueError as e:
+            logger.error(f"Error parsing credentials of user {user_id.decode()} from Redis: {e}")
+    logger.info(f"Loaded credentials for {len(credentials)} users from Redis")
+    return credentials
+
+async def write_redis_credentials(credentials, user_ids):
+    """Store the given users' credentials, each as its own field of the Redis hash."""
+    try:
+        await redis_client.hset(
+            CREDENTIALS_REDIS_KEY,
+            mapping={user_id: dumps_json(credentials[user_id]) for user_id in user_ids}
+        )
+        logger.info(f"Saved credentials for {len(user_ids)} users to Redis")
+    except Exception as e:
+        logger.error(f"Error saving credentials to Redis: {e}")
+
+async def flush_credentials(credentials):
+    """
+    Write pending credential changes once no new change arrived for CREDENTIALS_FLUSH_DELAY,
+    or CREDENTIALS_FLUSH_MAX_DELAY after the batch started if changes keep coming in.
+    """
+    while _dirty_users:
+        batch_started = time.monotonic()
+        while True:
+            wait = min(
+                _last_credentials_change + CREDENTIALS_FLUSH_DELAY, batch_started + CREDENTIALS_FLUSH_MAX_DELAY
+            ) - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        logger.info(f"Writing credential changes for users: {sorted(_dirty_users)}")
+        user_ids = list(_dirty_users)
+        _dirty_users.clear()
+        await write_credentials(credentials, user_ids)
 
-def run_with_timeout(func, timeout=60, *args, **kwargs):
-    """Run a function with a timeout."""
-    # Set the timeout handler
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout)
+# Save credentials to environment variable
+async def save_credentials(credentials, user_id):
+    """Mark a user's credentials as changed and schedule a debounced background write."""
+    global _credentials_flush_task, _last_credentials_change
+    _dirty_users.add(str(user_id))
+    _last_credentials_change = time.monotonic()
+    _CREDENTIALS_VERSION[str(user_id)] = _CREDENTIALS_VERSION.get(str(user_id), 0) + 1
+    invalidate_report_cache(user_id)
+    if _credentials_flush_task is None or _credentials_flush_task.done():
+        _credentials_flush_task = asyncio.create_task(flush_credentials(credentials))
+
+async def save_work_schedule(user_id, schedule_type, work_days, work_hours):
+    """Store a user's work schedule, saving credentials only if it actually changed."""
+    work_schedule = {
+        'type': schedule_type,
+        'days': dict(work_days),
+        'hours': dict(work_hours)
+    }
+    credentials = user_credentials.setdefault(str(user_id), {})
+    if credentials.get('work_schedule') == work_schedule:
+        logger.info(f"Work schedule of user {user_id} is unchanged, nothing to save")
+        return
 
+    credentials['work_schedule'] = work_schedule
+    await save_credentials(user_credentials, user_id)
+
+async def post_shutdown(application: Application) -> None:
+    """Write pending credential changes and release network and browser resources on shutdown."""
+    if _dirty_users:
+        user_ids = list(_dirty_users)
+        _dirty_users.clear()
+        await write_credentials(user_credentials, user_ids)
+    if redis_client is not None:
+        await redis_client.aclose()
+    await heroku_client.aclose()
+    await odoo_client.aclose()
+    report_pool.shutdown(cancel_futures=True)
+    driver_pool.close()
+    selenium_executor.shutdown(cancel_futures=True)
+
+# Global variables - filled by post_init before the first update is handled
+user_credentials = {}
+
+async def post_init(application: Application) -> None:
+    """Load stored credentials, open the Heroku, Odoo and Redis clients and start the report worker."""
+    global heroku_client, odoo_client, redis_client, report_pool, report_worker_pid
+    heroku_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=32, keepalive_expiry=60))
+    odoo_client = httpx.AsyncClient(
+        http2=True, limits=httpx.Limits(max_connections=32, max_keepalive_connections=20), timeout=30
+    )
+    report_pool, report_worker_pid = new_report_pool()
+    if REDIS_URL and aioredis is not None:
+        redis_client = aioredis.from_url(REDIS_URL)
+        user_credentials.update(await load_redis_credentials())
+    if not user_credentials:
+        user_credentials.update(await asyncio.to_thread(load_credentials))
+        if redis_client is not None and user_credentials:
+            # Nothing in Redis yet: move the config var or file contents over once
+            await write_redis_credentials(user_credentials, list(user_credentials))
+    logger.info(f"Loaded credentials for users: {list(user_credentials.keys())}")
+
+# Bumped by save_credentials whenever a user's credentials or work schedule change,
+# so text rendered from them can be cached per (user_id, version)
+_CREDENTIALS_VERSION = {}
+
+# Formatted work schedule strings keyed by (user_id, credentials version)
+SCHEDULE_FMT_CACHE_SIZE = 1024
+_SCHEDULE_FMT_CACHE = {}
+_DAY_HOUR_FMT = "{0}: {1}h".format
+
+# Seconds a generated report is reused when the same period is requested again
+REPORT_CACHE_TTL = {'status': 15, 'week': 45, 'month': 60, 'custom': 60}
+# Oldest report still served as a fallback when fresh data cannot be retrieved
+REPORT_CACHE_MAX_AGE = 3600  # seconds
+
+# Generated reports keyed by (user_id, report kind)
+CachedReport = namedtuple('CachedReport', 'created text pdf_file pdf_bytes')
+_REPORT_CACHE = {}
+
+# Seconds a user's credentials are treated as rejected after Odoo refused them
+AUTH_FAILURE_TTL = 60
+# Monotonic deadline until which a user's credentials are known to be rejected, keyed by user_id
+_AUTH_FAILURES = {}
+
+# Reply for reports requested with session credentials Odoo no longer accepts
+EXPIRED_CREDENTIALS_MESSAGE = "Your session ID or CSRF token has expired or is invalid. Please update your credentials using the 'Auto Fetch Tokens' button in the menu."
+
+# Serializes report generation, which shares plot_times module state
+REPORT_LOCK = asyncio.Lock()
+
+# Raised when a wrapped call does not finish within its timeout
+TimeoutException = asyncio.TimeoutError
+
+# Worker process running plot_times, created in post_init. Reports are serialized by
+# REPORT_LOCK, so a single worker is enough to keep pandas/matplotlib off the event loop
+report_pool = None
+# Future holding the PID of the report worker, used to stop it when a report hangs
+report_worker_pid = None
+
+def new_report_pool():
+    """Create the process pool used for report generation and a future of its worker's PID."""
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    # Queued ahead of every report, so the PID is known by the time a report can time out
+    return pool, pool.submit(os.getpid)
+
+def restart_report_pool(stop_worker=False):
+    """Replace the report pool, first terminating its worker if a report is stuck in it."""
+    global report_pool, report_worker_pid
+    if stop_worker and report_worker_pid.done() and report_worker_pid.exception() is None:
+        try:
+            os.kill(report_worker_pid.result(), signal.SIGTERM)
+        except OSError as e:
+            logger.warning(f"Could not stop the report worker: {e}")
+    report_pool.shutdown(wait=False, cancel_futures=True)
+    report_pool, report_worker_pid = new_report_pool()
+
+async def run_report(report_args, expected_hours, timeout=120):
+    """Run plot_times for the given expected hours per weekday in the worker process, with a timeout."""
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(report_pool, plot_times.run_report, report_args, expected_hours)
+    except BrokenProcessPool:
+        # The worker died while idle (e.g. killed for memory), so this report gets a fresh one
+        logger.warning("Report worker died, starting a new one")
+        restart_report_pool()
+        future = loop.run_in_executor(report_pool, plot_times.run_report, report_args, expected_hours)
     try:
-        result = func(*args, **kwargs)
-        # Cancel the alarm if the function returns before timeout
-        signal.alarm(0)
-        return result
+        return await asyncio.wait_for(future, timeout)
     except TimeoutException:
-        # Handle the timeout
+        # A running job cannot be cancelled, so stop the worker and start a fresh pool
+        restart_report_pool(stop_worker=True)
+        raise
+    except BrokenProcessPool:
+        # The worker died during this report, later reports run in a fresh pool
+        logger.error("Report worker terminated abruptly, starting a new one")
+        restart_report_pool()
         raise
-    finally:
-        # Reset the alarm
-        signal.alarm(0)
 
 def get_formatted_work_schedule(user_id):
     """Get a formatted string with work schedule details for the given user."""
@@ -201,64 +572,41 @@ def get_formatted_work_schedule(user_id):
         return "✅ Work schedule: Full Time (40h/week)"
     elif schedule_type == PART_TIME:
         return "✅ Work schedule: Part Time (20h/week)"
-    else:
-        # Custom schedule - show days and hours
-        work_days = work_schedule.get('days', {})
-        work_hours = work_schedule.get('hours', {})
-
-        # Get day full names for display
-        day_full_names = {
-            "Mon": "Monday",
-            "Tue": "Tuesday",
-            "Wed": "Wednesday",
-            "Thu": "Thursday",
-            "Fri": "Friday",
-            "Sat": "Saturday",
-            "Sun": "Sunday"
-        }
 
-        # Get enabled days in correct order
-        day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        enabled_days = sorted(
-            [day for day, enabled in work_days.items() if enabled],
-            key=lambda x: day_order.index(x)
-        )
+    # Custom schedule - reuse the cached text while the schedule is unchanged
+    cache_key = (str(user_id), _CREDENTIALS_VERSION.get(str(user_id), 0))
+    cached = _SCHEDULE_FMT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    work_days = work_schedule.get('days', {})
+    work_hours = work_schedule.get('hours', {})
+
+    # Get enabled days in correct order
+    enabled_days = sorted(
+        (day for day, enabled in work_days.items() if enabled),
+        key=WEEKDAY_INDEX.__getitem__
+    )
 
-        # Format days with hours
-        days_with_hours = []
-        for day in enabled_days:
-            hours = work_hours.get(day, 0.0)
-            if hours > 0:
-                days_with_hours.append(f"{day}: {hours}h")
+    # Format days with hours
+    days_text = ", ".join(
+        _DAY_HOUR_FMT(day, work_hours[day]) for day in enabled_days if work_hours.get(day, 0.0) > 0
+    )
+    total_hours = sum(hours for day, hours in work_hours.items() if work_days.get(day, False))
 
-        days_text = ", ".join(days_with_hours)
-        total_hours = sum([hours for day, hours in work_hours.items() if work_days.get(day, False)])
+    formatted = f"✅ Work schedule: {total_hours:.1f}h/week ({days_text})"
 
-        return f"✅ Work schedule: {total_hours:.1f}h/week ({days_text})"
+    # Keep the cache bounded by dropping the oldest entry
+    if len(_SCHEDULE_FMT_CACHE) >= SCHEDULE_FMT_CACHE_SIZE:
+        _SCHEDULE_FMT_CACHE.pop(next(iter(_SCHEDULE_FMT_CACHE)))
+    _SCHEDULE_FMT_CACHE[cache_key] = formatted
+    return formatted
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Send a welcome message when the command /start is issued."""
     user_id = update.effective_user.id
     logger.info(f"User {user_id} started the bot")
 
-    keyboard = [
-        [
-            InlineKeyboardButton("📅 Current Month", callback_data="month"),
-            InlineKeyboardButton("📊 Current Week", callback_data="week"),
-        ],
-        [
-            InlineKeyboardButton("🗓️ Custom Month", callback_data="custom_month"),
-            InlineKeyboardButton("📈 Status", callback_data="status"),
-        ],
-        [
-            InlineKeyboardButton("🔄 Auto Fetch Tokens", callback_data="auto_fetch_tokens"),
-            InlineKeyboardButton("⏰ Work Schedule", callback_data="work_schedule"),
-        ],
-        [
-            InlineKeyboardButton("❓ Help", callback_data="help"),
-        ]
-    ]
-
     # Check if user has credentials
     has_credentials = str(user_id) in user_credentials
     credential_status = "✅ Credentials set" if has_credentials else "❌ No credentials set"
@@ -266,115 +614,82 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # Get formatted work schedule status
     work_schedule_status = get_formatted_work_schedule(user_id)
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
         f"Welcome to the Odoo Time Tracking Bot!\n\n{credential_status}\n{work_schedule_status}\n\nWhat would you like to do?",
-        reply_markup=reply_markup
+        reply_markup=MAIN_MENU_MARKUP
     )
 
-    return CHOOSING_ACTION
+    return State.CHOOSING_ACTION
 
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle button presses."""
+async def start_report_task(update: Update, context: ContextTypes.DEFAULT_TYPE, **report_kwargs) -> int:
+    """Generate a report in a background task so the callback returns to Telegram right away."""
+    context.application.create_task(generate_report(update, context, **report_kwargs), update=update)
+    return ConversationHandler.END
+
+async def prompt_custom_month(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask the user which month to report on."""
     query = update.callback_query
-    await query.answer()
+    logger.info(f"User {query.from_user.id} selected custom month option")
+    # Store the fact that we're waiting for custom month input
+    context.user_data['awaiting_custom_month'] = True
 
-    logger.info(f"User {query.from_user.id} pressed button: {query.data}")
+    # Edit the message to prompt for custom month input
+    await query.edit_message_text(
+        "Please send the month in format YYYY-MM (e.g., 2024-12) or just the month number (1-12)"
+    )
+    # IMPORTANT: Return the state to transition to
+    return State.WAITING_FOR_CUSTOM_MONTH
 
-    if query.data == "month":
-        await generate_report(update, context, plot_month=True)
-        return ConversationHandler.END
-    elif query.data == "week":
-        await generate_report(update, context, plot_week=True)
-        return ConversationHandler.END
-    elif query.data == "custom_month":
-        logger.info(f"User {query.from_user.id} selected custom month option")
-        # Store the fact that we're waiting for custom month input
-        context.user_data['awaiting_custom_month'] = True
+async def prompt_odoo_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Start the auto fetch tokens flow by asking for the Odoo email."""
+    await update.callback_query.edit_message_text(
+        "Please enter your Odoo email address"
+    )
+    # Store the default URL in context
+    context.user_data['odoo_url'] = "https://perinet.odoo.com/web"
+    return State.WAITING_FOR_EMAIL
 
-        # Edit the message to prompt for custom month input
-        await query.edit_message_text(
-            "Please send the month in format YYYY-MM (e.g., 2024-12) or just the month number (1-12)"
-        )
-        # IMPORTANT: Return the state to transition to
-        return WAITING_FOR_CUSTOM_MONTH
-    elif query.data == "status":
-        await generate_report(update, context, status_only=True)
-        return ConversationHandler.END
+async def show_help_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show the help text in place of the menu message."""
+    await update.callback_query.edit_message_text(HELP_TEXT, parse_mode="Markdown")
 
-    elif query.data == "auto_fetch_tokens":
-        await query.edit_message_text(
-            "Please enter your Odoo email address"
-        )
-        # Store the default URL in context
-        context.user_data['odoo_url'] = "https://perinet.odoo.com/web"
-        return WAITING_FOR_EMAIL
-    elif query.data == "work_schedule":
-        return await show_work_schedule_options(update, context)
-    elif query.data == "help":
-        help_text = (
-            "🤖 *Odoo Time Tracking Bot* 🤖\n\n"
-            "*📋 Available Commands:*\n"
-            "• `/start` - Start the bot and show main menu\n"
-            "• `/month` - Generate report for current month\n"
-            "• `/week` - Generate report for current week\n"
-            "• `/custom YYYY-MM` - Generate report for specific month\n"
-            "• `/status` - Show current status without PDF\n"
-            "• `/work_schedule` - Set your work schedule\n"
-            "• `/debug` - Show your credential status\n"
-            "• `/help` - Show this help message\n\n"
-            "*📊 Report Types:*\n"
-            "• *Monthly Report* - Complete analysis with PDF chart\n"
-            "• *Weekly Report* - Current week's hours with chart\n"
-            "• *Custom Month* - Specify any month (YYYY-MM)\n"
-            "• *Status* - Quick text-only summary\n\n"
-            "*⚙️ Getting Started:*\n"
-            "1. Set your credentials using the 'Auto Fetch Tokens' button in the menu\n"
-            "2. Set your work schedule with `/work_schedule`\n"
-            "3. Generate your first report with `/month`\n"
-            "4. Check your status anytime with `/status`\n\n"
-            "This bot helps you track your work hours from Odoo and visualize them."
-        )
-        await query.edit_message_text(help_text, parse_mode="Markdown")
+    # Show menu buttons after help
+    await show_menu_buttons(update, context)
 
-        # Show menu buttons after help
-        await show_menu_buttons(update, context)
+    return ConversationHandler.END
 
-        return ConversationHandler.END
-    # Handle work schedule options
-    elif query.data == "full_time":
-        return await set_work_schedule(update, context, FULL_TIME)
-    elif query.data == "part_time_custom":
-        return await start_part_time_custom(update, context)
-    elif query.data == "custom_schedule":
-        return await start_custom_schedule(update, context)
-    elif query.data.startswith("toggle_day_"):
-        return await toggle_work_day(update, context, query.data.replace("toggle_day_", ""))
-    elif query.data == "save_work_days":
-        return await save_work_days(update, context)
-    elif query.data == "save_part_time_days":
-        return await save_part_time_days(update, context)
-    elif query.data == "cancel_work_schedule":
-        await query.edit_message_text("Work schedule setup cancelled.")
-        await show_menu_buttons(update, context)
-        return ConversationHandler.END
-    # Handle work hours options
-    elif query.data == "hours_full_time" or query.data == "hours_part_time":
-        return await set_hours_distribution(update, context, query.data)
-    elif query.data == "hours_standard":
-        return await set_hours_distribution(update, context, "hours_part_time")
-    elif query.data == "set_specific_hours":
-        return await show_specific_hours_setup(update, context)
-    elif query.data == "set_all_hours":
-        return await set_all_hours_at_once(update, context)
-    elif query.data.startswith("edit_hours_"):
-        return await edit_day_hours(update, context, query.data.replace("edit_hours_", ""))
-    elif query.data == "save_specific_hours":
-        return await save_specific_hours(update, context)
-    elif query.data == "back_to_days":
-        return await show_work_days_selection(update, context)
-    elif query.data == "back_to_hours_selection":
-        return await save_work_days(update, context)
+# Conversation state kept in user_data while a work schedule is being edited
+SCHEDULE_DRAFT_KEYS = ('temp_work_days', 'temp_work_hours', 'selected_days', 'editing_day')
+
+def clear_schedule_draft(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop the work schedule draft from user_data once the setup is saved or cancelled."""
+    for key in SCHEDULE_DRAFT_KEYS:
+        context.user_data.pop(key, None)
+
+async def cancel_work_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Abort the work schedule setup."""
+    clear_schedule_draft(context)
+    await update.callback_query.edit_message_text("Work schedule setup cancelled.")
+    await show_menu_buttons(update, context)
+    return ConversationHandler.END
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle button presses."""
+    query = update.callback_query
+    # Day toggles answer with the updated day count themselves
+    if not query.data.startswith("toggle_day_"):
+        await query.answer()
+
+    logger.info(f"User {query.from_user.id} pressed button: {query.data}")
+
+    handler = BUTTON_HANDLERS.get(query.data)
+    if handler is not None:
+        return await handler(update, context)
+
+    # Buttons that carry a weekday in their callback data
+    for prefix, prefix_handler in PREFIX_BUTTON_HANDLERS:
+        if query.data.startswith(prefix):
+            return await prefix_handler(update, context, query.data[len(prefix):])
 
     # Default fallback
     return ConversationHandler.END
@@ -386,18 +701,18 @@ async def session_id_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     # Validate session ID format - typically alphanumeric without special characters
     # Session IDs are usually long alphanumeric strings
-    if not session_id or len(session_id) < 20 or not session_id.isalnum():
+    if not _SESSION_RE.match(session_id):
         await update.message.reply_text(
             "Invalid session ID format. Session IDs are typically long alphanumeric strings.\n\n"
             "Please enter a valid session ID. You can find this in your browser cookies after logging into Odoo."
         )
-        return WAITING_FOR_SESSION_ID
+        return State.WAITING_FOR_SESSION_ID
 
     # Store in context for later
     context.user_data['session_id'] = session_id
 
     await update.message.reply_text("Great! Now please enter your CSRF Token")
-    return WAITING_FOR_CSRF_TOKEN
+    return State.WAITING_FOR_CSRF_TOKEN
 
 async def csrf_token_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle CSRF token input."""
@@ -405,18 +720,34 @@ async def csrf_token_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     csrf_token = update.message.text.strip()
 
     # Validate CSRF token format - typically a long alphanumeric string
-    if not csrf_token or len(csrf_token) < 20:
+    if not _CSRF_RE.match(csrf_token):
         await update.message.reply_text(
             "Invalid CSRF token format. CSRF tokens are typically long strings.\n\n"
             "Please enter a valid CSRF token. You can find this in your browser cookies or page source after logging into Odoo."
         )
-        return WAITING_FOR_CSRF_TOKEN
+        return State.WAITING_FOR_CSRF_TOKEN
 
     # Store in context for later
     context.user_data['csrf_token'] = csrf_token
 
     await update.message.reply_text("Almost done! Now please enter your Odoo User ID (UID)")
-    return WAITING_FOR_ODOO_UID
+    return State.WAITING_FOR_ODOO_UID
+
+async def save_user_credentials(user_id, session_id, csrf_token, odoo_uid):
+    """Store a user's session ID, CSRF token and Odoo UID and schedule the credentials write."""
+    user_credentials[str(user_id)] = {
+        'session_id': session_id,
+        'csrf_token': csrf_token,
+        'odoo_uid': odoo_uid
+    }
+
+    # Save to environment variable
+    await save_credentials(user_credentials, user_id)
+    logger.info(f"Saved credentials for user {user_id}")
+
+    # Log the current state of credentials
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Current credentials: %s", list(user_credentials))
 
 async def odoo_uid_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle Odoo UID input."""
@@ -428,22 +759,11 @@ async def odoo_uid_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         odoo_uid = int(odoo_uid)
     except ValueError:
         await update.message.reply_text("User ID must be a number. Please try again.")
-        return WAITING_FOR_ODOO_UID
-
-    # Save all credentials
-    global user_credentials
-    user_credentials[str(user_id)] = {
-        'session_id': context.user_data.get('session_id'),
-        'csrf_token': context.user_data.get('csrf_token'),
-        'odoo_uid': odoo_uid
-    }
-
-    # Save to environment variable
-    save_credentials(user_credentials)
-    logger.info(f"Saved credentials for user {user_id}")
+        return State.WAITING_FOR_ODOO_UID
 
-    # Log the current state of credentials
-    logger.info(f"Current credentials: {list(user_credentials.keys())}")
+    await save_user_credentials(
+        user_id, context.user_data.get('session_id'), context.user_data.get('csrf_token'), odoo_uid
+    )
 
     await update.message.reply_text("Your credentials have been saved successfully! You can now generate reports.")
 
@@ -453,6 +773,14 @@ async def odoo_uid_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     return ConversationHandler.END
 
 
+def parse_custom_month(text):
+    """Parse YYYY-MM or a bare month number into a (year, month) tuple, or None if invalid."""
+    match = _MONTH_RE.match(text.strip())
+    if not match or not (1 <= int(match[2]) <= 12):
+        return None
+    year = int(match[1]) if match[1] else datetime.date.today().year
+    return year, int(match[2])
+
 async def custom_month_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle text input for custom month."""
     user_id = update.effective_user.id
@@ -471,34 +799,29 @@ async def custom_month_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Reset the flag
     context.user_data['awaiting_custom_month'] = False
 
-    # Check if input is just a month number (1-12)
-    if custom_month.isdigit() and 1 <= int(custom_month) <= 12:
-        # Convert to YYYY-MM format using current year
-        current_year = datetime.datetime.now().year
-        custom_month = f"{current_year}-{int(custom_month):02d}"
-        logger.info(f"Converted month input to: {custom_month}")
-
-    try:
-        year, month = map(int, custom_month.split('-'))
-        if not (1 <= month <= 12):
-            raise ValueError("Month must be between 1 and 12")
-    except ValueError as e:
-        logger.warning(f"User {user_id} provided invalid month format: {custom_month}, error: {str(e)}")
+    # Accept either YYYY-MM or just the month number (1-12) for the current year
+    parsed_month = parse_custom_month(custom_month)
+    if parsed_month is None:
+        logger.warning(f"User {user_id} provided invalid month format: {custom_month}")
         await update.message.reply_text("Invalid format. Please use YYYY-MM (e.g., 2024-12) or just the month number (1-12)")
         # Set the flag again since we're still waiting for input
         context.user_data['awaiting_custom_month'] = True
-        return WAITING_FOR_CUSTOM_MONTH
+        return State.WAITING_FOR_CUSTOM_MONTH
+
+    year, month = parsed_month
+    custom_month = f"{year}-{month:02d}"
+    logger.info(f"Normalized month input to: {custom_month}")
 
     try:
         logger.info(f"Generating report for custom month: {custom_month}")
         # Store the custom month in context to ensure it's available
-        context.user_data['custom_month'] = custom_month
+        context.user_data['custom_month'] = parsed_month
 
         # Send a message to indicate we're processing
         processing_message = await update.message.reply_text(f"Generating report for {custom_month}... Please wait.")
 
         # Generate the report with the custom month
-        await generate_report(update, context, custom_month=custom_month)
+        await generate_report(update, context, custom_month=parsed_month)
 
         # End the conversation
         return ConversationHandler.END
@@ -525,12 +848,8 @@ async def custom_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Please provide a month in format YYYY-MM (e.g., /custom 2024-12)")
         return
 
-    custom_month = context.args[0]
-    try:
-        year, month = map(int, custom_month.split('-'))
-        if not (1 <= month <= 12):
-            raise ValueError
-    except ValueError:
+    custom_month = parse_custom_month(context.args[0])
+    if custom_month is None:
         await update.message.reply_text("Invalid format. Please use YYYY-MM (e.g., 2024-12)")
         return
 
@@ -542,31 +861,7 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a help message."""
-    help_text = (
-        "🤖 *Odoo Time Tracking Bot* 🤖\n\n"
-        "*📋 Available Commands:*\n"
-        "• `/start` - Start the bot and show main menu\n"
-        "• `/month` - Generate report for current month\n"
-        "• `/week` - Generate report for current week\n"
-        "• `/custom YYYY-MM` - Generate report for specific month\n"
-        "• `/status` - Show current status without PDF\n"
-        "• `/work_schedule` - Set your work schedule\n"
-        "• `/debug` - Show your credential status\n"
-        "• `/help` - Show this help message\n\n"
-        "*📊 Report Types:*\n"
-        "• *Monthly Report* - Complete analysis with PDF chart\n"
-        "• *Weekly Report* - Current week's hours with chart\n"
-        "• *Custom Month* - Specify any month (YYYY-MM)\n"
-        "• *Status* - Quick text-only summary\n\n"
-        "*⚙️ Getting Started:*\n"
-        "1. Set your credentials using the 'Auto Fetch Tokens' button in the menu\n"
-        "2. Set your work schedule with `/work_schedule`\n"
-        "3. Generate your first report with `/month`\n"
-        "4. Check your status anytime with `/status`\n\n"
-        "This bot helps you track your work hours from Odoo and visualize them."
-    )
-
-    await update.message.reply_text(help_text, parse_mode="Markdown")
+    await update.message.reply_text(HELP_TEXT, parse_mode="Markdown")
 
     # Show menu buttons after help
     await show_menu_buttons(update, context)
@@ -578,18 +873,24 @@ async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     # Only show debug info for the requesting user
     has_credentials = str(user_id) in user_credentials
 
-    debug_text = f"Debug Info:\n\n"
-    debug_text += f"Your User ID: {user_id}\n"
-    debug_text += f"Credentials set: {has_credentials}\n"
-    debug_text += f"Total users with credentials: {len(user_credentials)}\n"
-    debug_text += f"Users with credentials: {list(user_credentials.keys())}\n"
+    debug_lines = [
+        "Debug Info:",
+        "",
+        f"Your User ID: {user_id}",
+        f"Credentials set: {has_credentials}",
+        f"Total users with credentials: {len(user_credentials)}",
+        f"Users with credentials: {list(user_credentials.keys())}",
+    ]
 
     if has_credentials:
         creds = user_credentials[str(user_id)]
-        debug_text += f"\nYour credentials:\n"
-        debug_text += f"Session ID: {creds['session_id'][:10]}...\n"
-        debug_text += f"CSRF Token: {creds['csrf_token'][:10]}...\n"
-        debug_text += f"UID: {creds['odoo_uid']}\n"
+        debug_lines += [
+            "",
+            "Your credentials:",
+            f"Session ID: {creds['session_id'][:10]}...",
+            f"CSRF Token: {creds['csrf_token'][:10]}...",
+            f"UID: {creds['odoo_uid']}",
+        ]
 
         # Add work schedule info if available
         if 'work_schedule' in creds:
@@ -598,24 +899,26 @@ async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             work_days = work_schedule.get('days', {})
             work_hours = work_schedule.get('hours', {})
 
-            debug_text += f"\nYour work schedule:\n"
-            debug_text += f"Type: {schedule_type}\n"
-
             # Show work days
             work_days_list = [day for day, enabled in work_days.items() if enabled]
-            debug_text += f"Work days: {', '.join(work_days_list)}\n"
-
-            # Show hours per day
-            debug_text += "Hours per day:\n"
-            for day in ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]:
-                if work_days.get(day, False):
-                    debug_text += f"- {day}: {work_hours.get(day, 0.0)}h\n"
 
             # Calculate total hours
             total_hours = sum(hours for day, hours in work_hours.items() if work_days.get(day, False))
-            debug_text += f"Total hours per week: {total_hours}h\n"
+
+            debug_lines += [
+                "",
+                "Your work schedule:",
+                f"Type: {schedule_type}",
+                f"Work days: {', '.join(work_days_list)}",
+                "Hours per day:",
+            ]
+            # Show hours per day
+            debug_lines += [f"- {day}: {work_hours.get(day, 0.0)}h" for day in WEEKDAY_KEYS if work_days.get(day, False)]
+            debug_lines.append(f"Total hours per week: {total_hours}h")
         else:
-            debug_text += "\nNo work schedule set. Use /work_schedule to set it up.\n"
+            debug_lines += ["", "No work schedule set. Use /work_schedule to set it up."]
+
+    debug_text = "\n".join(debug_lines) + "\n"
 
     await update.message.reply_text(debug_text)
 
@@ -631,7 +934,8 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE,
     user_id = update.effective_user.id if not is_callback else update.callback_query.from_user.id
 
     logger.info(f"Generating report for user {user_id}")
-    logger.info(f"Current credentials: {list(user_credentials.keys())}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Current credentials: %s", list(user_credentials))
 
     # Check if user has credentials
     if str(user_id) not in user_credentials:
@@ -659,520 +963,387 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE,
     else:
         message = await update.message.reply_text("Generating report... Please wait.")
 
-    # Create a temporary directory for files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Prepare arguments for plot_times
-        args = []
-
-        if plot_month:
-            args.append("-M")
-            report_type = "monthly"
-        elif plot_week:
-            args.append("-W")
-            report_type = "weekly"
-        elif custom_month:
-            args.extend(["-c", custom_month])
-            report_type = f"custom ({custom_month})"
-        else:
-            # Default to current month
-            args.append("-M")
-            report_type = "monthly"
-
-        # Capture output
-        try:
-            # Get user credentials
-            creds = user_credentials[str(user_id)]
-            logger.info(f"Using credentials for user {user_id}")
-
-            # Set credentials for this session
-            plot_times.SESSION_ID = creds['session_id']
-            plot_times.CSRF_TOKEN = creds['csrf_token']
-            plot_times.UID = creds['odoo_uid']
+    # Prepare arguments for plot_times
+    args = []
+
+    if plot_month:
+        args.append("-M")
+        report_type = "monthly"
+        cache_kind = "month"
+    elif plot_week:
+        args.append("-W")
+        report_type = "weekly"
+        cache_kind = "week"
+    elif custom_month:
+        # custom_month is a parsed (year, month) tuple
+        year, month = custom_month
+        args.extend(["-c", f"{year}-{month:02d}"])
+        report_type = f"custom ({year}-{month:02d})"
+        cache_kind = f"custom:{year}-{month:02d}"
+    else:
+        # Default to current month
+        args.append("-M")
+        report_type = "monthly"
+        cache_kind = "status" if status_only else "month"
+
+    # Reuse a recent report for the same period instead of fetching and plotting again
+    cache_key = (str(user_id), cache_kind)
+    cached = _REPORT_CACHE.get(cache_key)
+    if cached is not None and time.monotonic() - cached.created < REPORT_CACHE_TTL[cache_kind.split(':')[0]]:
+        logger.info(f"Serving cached {cache_kind} report for user {user_id}")
+        await send_report(update, context, message, cached, report_type)
+        return
 
-            # Update expected hours based on user's work schedule
-            update_plot_times_expected_hours(user_id)
+    # Don't hit Odoo again with credentials it has just refused
+    if credentials_recently_rejected(user_id):
+        logger.info(f"Skipping report for user {user_id}, credentials were rejected recently")
+        await message.edit_text(EXPIRED_CREDENTIALS_MESSAGE)
+        await show_menu_buttons(update, context)
+        return
 
-            # First, pull the attendance and leave data
-            logger.info("Starting to pull attendance and leave data...")
+    # Create a temporary directory for files
+    # plot_times keeps the current user's credentials, schedule and downloaded files
+    # in module globals, so only one report may use it at a time
+    async with REPORT_LOCK:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Capture output
             try:
-                plot_times.pull_attendance_leave_lists()
-                logger.info("Successfully pulled attendance and leave data")
-            except requests.exceptions.HTTPError as e:
-                logger.error(f"HTTP error when pulling data: {e}")
-                error_message = "Failed to retrieve data from Odoo. "
-
-                if e.response.status_code == 401 or e.response.status_code == 403:
-                    error_message += "Your session may have expired or your credentials are invalid. Please update your credentials using the 'Auto Fetch Tokens' button in the menu."
-                elif e.response.status_code == 404:
-                    error_message += "The requested resource was not found. Please check your Odoo URL."
-                else:
-                    error_message += f"Error code: {e.response.status_code}. Please try again later or update your credentials."
-
-                await message.edit_text(error_message)
-                await show_menu_buttons(update, context)
-                return
-            except Exception as e:
-                logger.error(f"Error pulling attendance and leave data: {e}")
-                await message.edit_text(f"Error retrieving data: {str(e)}\n\nPlease check your credentials and try again.")
-                await show_menu_buttons(update, context)
-                return
-
-            # Determine file paths
-            attendance_file = os.path.join(os.getcwd(), plot_times.ATTENDANCE_FILENAME)
-            leave_file = os.path.join(os.getcwd(), plot_times.LEAVE_FILENAME)
-
-            # Add file paths to args
-            args.extend(["-af", attendance_file, "-lf", leave_file])
-            logger.info(f"Arguments prepared: {args}")
-
-            # Run the script and capture output
-            if status_only:
-                # For status, we'll run the script directly and capture output
-                # Capture stdout
-                import io
-                import sys
-                from contextlib import redirect_stdout
-
-                logger.info("Running status report...")
-                # Save original argv
-                original_argv = sys.argv
-                # Set sys.argv to our args
-                sys.argv = ['plot_times.py'] + args
-
-                f = io.StringIO()
-                with redirect_stdout(f):
-                    logger.info("Calling plot_times.main()...")
-                    try:
-                        run_with_timeout(plot_times.main, 120)  # 2 minute timeout
-                        logger.info("plot_times.main() completed")
-                    except TimeoutException:
-                        logger.error("plot_times.main() timed out after 120 seconds")
-                        raise TimeoutException("Report generation timed out after 120 seconds. Please try again later.")
-                raw_output = f.getvalue()
-
-                # Restore original argv
-                sys.argv = original_argv
-
-                # Format the output
-                formatted_output = format_report_output(raw_output, user_id, weekly_report=plot_week)
+                # Get user credentials
+                creds = user_credentials[str(user_id)]
+                logger.info(f"Using credentials for user {user_id}")
 
-                logger.info("Status report generated, sending to user")
-                await message.edit_text(formatted_output, parse_mode="Markdown")
+                # Set credentials for this session
+                plot_times.SESSION_ID = creds['session_id']
+                plot_times.CSRF_TOKEN = creds['csrf_token']
+                plot_times.UID = creds['odoo_uid']
 
-                # Show menu buttons after sending the report
-                await show_menu_buttons(update, context)
-                return
-
-            # For reports with PDF, we'll run the script
-            pdf_file = None
-
-            # Determine the PDF filename based on the report type
-            if plot_month:
-                now = datetime.datetime.now()
-                pdf_file = f"worktimes-{now.year}-{now.month}.pdf"
-            elif plot_week:
-                now = datetime.datetime.now()
-                week_number = now.isocalendar().week
-                pdf_file = f"worktimes-{now.year}-W{week_number}.pdf"
-            elif custom_month:
-                year, month = map(int, custom_month.split('-'))
-                pdf_file = f"worktimes-{year}-{month:02d}.pdf"
-
-            logger.info(f"Expected PDF file: {pdf_file}")
-
-            # Run the script
-            # Capture stdout
-            import io
-            import sys
-            from contextlib import redirect_stdout
-
-            logger.info("Running report generation...")
-            # Save original argv
-            original_argv = sys.argv
-            # Set sys.argv to our args
-            sys.argv = ['plot_times.py'] + args
-
-            f = io.StringIO()
-            with redirect_stdout(f):
+                # First, pull the attendance and leave data
+                logger.info("Starting to pull attendance and leave data...")
+                try:
+                    await asyncio.wait_for(plot_times.pull_attendance_leave_lists_async(odoo_client), 120)
+                    logger.info("Successfully pulled attendance and leave data")
+                except httpx.HTTPStatusError as e:
+                    logger.error(f"HTTP error when pulling data: {e}")
+                    error_message = "Failed to retrieve data from Odoo. "
+
+                    if e.response.status_code == 401 or e.response.status_code == 403:
+                        _AUTH_FAILURES[str(user_id)] = time.monotonic() + AUTH_FAILURE_TTL
+                        error_message += "Your session may have expired or your credentials are invalid. Please update your credentials using the 'Auto Fetch Tokens' button in the menu."
+                    elif e.response.status_code == 404:
+                        error_message += "The requested resource was not found. Please check your Odoo URL."
+                    else:
+                        error_message += f"Error code: {e.response.status_code}. Please try again later or update your credentials."
+
+                    await message.edit_text(error_message)
+                    await show_menu_buttons(update, context)
+                    return
+                except Exception as e:
+                    logger.error(f"Error pulling attendance and leave data: {e}")
+                    if "session ID or CSRF token" in str(e):
+                        _AUTH_FAILURES[str(user_id)] = time.monotonic() + AUTH_FAILURE_TTL
+                    if await send_stale_report(update, context, message, cache_key, report_type, e):
+                        return
+                    await message.edit_text(f"Error retrieving data: {str(e)}\n\nPlease check your credentials and try again.")
+                    await show_menu_buttons(update, context)
+                    return
+
+                # Determine file paths
+                attendance_file = os.path.join(os.getcwd(), plot_times.ATTENDANCE_FILENAME)
+                leave_file = os.path.join(os.getcwd(), plot_times.LEAVE_FILENAME)
+
+                # Add file paths to args
+                args.extend(["-af", attendance_file, "-lf", leave_file])
+                logger.info(f"Arguments prepared: {args}")
+                report_args = plot_times.parse_args(args)
+
+                # Run the script
+                logger.info("Running status report..." if status_only else "Running report generation...")
                 logger.info("Calling plot_times.main()...")
                 try:
-                    run_with_timeout(plot_times.main, 120)  # 2 minute timeout
+                    result = await run_report(report_args, expected_hours_by_day(user_id), 120)  # 2 minute timeout
                     logger.info("plot_times.main() completed")
                 except TimeoutException:
                     logger.error("plot_times.main() timed out after 120 seconds")
                     raise TimeoutException("Report generation timed out after 120 seconds. Please try again later.")
-            raw_output = f.getvalue()
 
-            # Restore original argv
-            sys.argv = original_argv
+                # Format the output
+                if status_only:
+                    report = CachedReport(time.monotonic(), format_status_output(result), None, None)
+                else:
+                    pdf_file = f"{result.pdf_file_name}.pdf"
+                    logger.info(f"PDF {pdf_file} {'generated' if result.pdf_bytes else 'not generated'}")
+                    report = CachedReport(time.monotonic(), format_report_output(result, user_id), pdf_file, result.pdf_bytes)
+                store_cached_report(cache_key, report)
 
-            # Format the output
-            formatted_output = format_report_output(raw_output, user_id)
+                logger.info("Report generated, sending to user")
+                await send_report(update, context, message, report, report_type)
 
-            logger.info(f"Checking if PDF file exists: {os.path.exists(pdf_file) if pdf_file else 'No PDF file specified'}")
+            except Exception as e:
+                logger.error(f"Error generating report: {e}")
+                logger.exception("Full traceback:")
+
+                # Provide more specific error messages for common issues
+                error_message = str(e)
+                if "session ID or CSRF token" in error_message or "File is not a zip file" in error_message:
+                    _AUTH_FAILURES[str(user_id)] = time.monotonic() + AUTH_FAILURE_TTL
+                    await message.edit_text(EXPIRED_CREDENTIALS_MESSAGE)
+                elif await send_stale_report(update, context, message, cache_key, report_type, e):
+                    return
+                else:
+                    await message.edit_text(f"Error generating report: {error_message}")
 
-            # Send the PDF if it exists
-            if pdf_file and os.path.exists(pdf_file):
-                logger.info(f"PDF file found, sending to user")
-                with open(pdf_file, 'rb') as file:
-                    await context.bot.send_document(
-                        chat_id=update.effective_chat.id,
-                        document=file,
-                        filename=pdf_file,
-                        caption=f"Time tracking report ({report_type})"
-                    )
+                # Show menu buttons even after error
+                await show_menu_buttons(update, context)
 
-                # Send the text output as well
-                await message.edit_text(formatted_output, parse_mode="Markdown")
+def store_cached_report(cache_key, report):
+    """Cache a generated report and drop entries too old to be served even as a fallback."""
+    now = time.monotonic()
+    for key in [key for key, entry in _REPORT_CACHE.items() if now - entry.created > REPORT_CACHE_MAX_AGE]:
+        del _REPORT_CACHE[key]
+    _REPORT_CACHE[cache_key] = report
+
+def invalidate_report_cache(user_id):
+    """Forget cached reports of a user whose credentials or work schedule changed."""
+    for key in [key for key in _REPORT_CACHE if key[0] == str(user_id)]:
+        del _REPORT_CACHE[key]
+    _AUTH_FAILURES.pop(str(user_id), None)
+
+def credentials_recently_rejected(user_id):
+    """Whether Odoo rejected the user's current credentials within the last AUTH_FAILURE_TTL seconds."""
+    rejected_until = _AUTH_FAILURES.get(str(user_id))
+    if rejected_until is None:
+        return False
+    if time.monotonic() < rejected_until:
+        return True
+    del _AUTH_FAILURES[str(user_id)]
+    return False
+
+async def send_report(update: Update, context: ContextTypes.DEFAULT_TYPE, message, report, report_type, note="") -> None:
+    """Send a generated or cached report followed by the menu buttons."""
+    text = report.text + note
+    if report.pdf_bytes:
+        # Upload the PDF and put the text output into the status message concurrently;
+        # both calls are independent, so let each one finish before reporting a failure
+        results = await asyncio.gather(
+            context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=io.BytesIO(report.pdf_bytes),
+                filename=report.pdf_file,
+                caption=f"Time tracking report ({report_type})"
+            ),
+            message.edit_text(text, parse_mode="Markdown"),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            logger.error(f"Error sending {report_type} report: {error}")
+        if errors:
+            raise errors[0]
 
-                # Clean up
-                os.remove(pdf_file)
-                logger.info(f"PDF file sent and cleaned up")
-            else:
-                logger.info(f"No PDF file found, sending text output only")
-                await message.edit_text(f"{formatted_output}\n\nNo PDF was generated.", parse_mode="Markdown")
+        # The PDF now sits below the summary, so the menu needs a message of its own
+        await show_menu_buttons(update, context)
+        return
 
-            # Show menu buttons after sending the report
-            await show_menu_buttons(update, context)
+    if report.pdf_file is not None:
+        text += "\n\nNo PDF was generated."
 
-        except Exception as e:
-            logger.error(f"Error generating report: {e}")
-            logger.exception("Full traceback:")
-
-            # Provide more specific error messages for common issues
-            error_message = str(e)
-            if "session ID or CSRF token" in error_message:
-                await message.edit_text(
-                    "Your session ID or CSRF token has expired or is invalid. Please update your credentials using the 'Auto Fetch Tokens' button in the menu."
-                )
-            elif "File is not a zip file" in error_message:
-                await message.edit_text(
-                    "Your session ID or CSRF token has expired or is invalid. Please update your credentials using the 'Auto Fetch Tokens' button in the menu."
-                )
-            else:
-                await message.edit_text(f"Error generating report: {error_message}")
+    # Attach the menu to the summary instead of sending a separate message
+    await message.edit_text(
+        f"{text}\n\n{menu_prompt_text(update.effective_user.id)}",
+        parse_mode="Markdown",
+        reply_markup=MAIN_MENU_MARKUP
+    )
 
-            # Show menu buttons even after error
-            await show_menu_buttons(update, context)
+async def send_stale_report(update: Update, context: ContextTypes.DEFAULT_TYPE, message, cache_key, report_type, error) -> bool:
+    """Fall back to the last cached report when Odoo or the report worker is unavailable."""
+    cached = _REPORT_CACHE.get(cache_key)
+    if cached is None or not isinstance(error, (TimeoutException, httpx.TransportError)):
+        return False
+
+    age_minutes = int((time.monotonic() - cached.created) // 60)
+    logger.info(f"Serving stale {cache_key[1]} report for user {cache_key[0]} after error: {error}")
+    note = f"\n\n⚠️ _Fresh data could not be retrieved, showing the report from {age_minutes} min ago._"
+    await send_report(update, context, message, cached, report_type, note)
+    return True
 
 # Add a new function to show menu buttons
 async def show_menu_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show the menu buttons to the user."""
-    user_id = update.effective_user.id
+    # Send a new message with the menu buttons
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=menu_prompt_text(update.effective_user.id),
+        reply_markup=MAIN_MENU_MARKUP
+    )
 
-    keyboard = [
-        [
-            InlineKeyboardButton("📅 Current Month", callback_data="month"),
-            InlineKeyboardButton("📊 Current Week", callback_data="week"),
-        ],
-        [
-            InlineKeyboardButton("🗓️ Custom Month", callback_data="custom_month"),
-            InlineKeyboardButton("📈 Status", callback_data="status"),
-        ],
-        [
-            InlineKeyboardButton("🔄 Auto Fetch Tokens", callback_data="auto_fetch_tokens"),
-            InlineKeyboardButton("⏰ Work Schedule", callback_data="work_schedule"),
-        ],
-        [
-            InlineKeyboardButton("❓ Help", callback_data="help"),
-        ]
-    ]
+def menu_prompt_text(user_id):
+    """Text shown above the menu buttons: the user's credential and work schedule status."""
+    user_id = str(user_id)
+    return _render_menu_prompt(user_id, _CREDENTIALS_VERSION.get(user_id, 0), user_id in user_credentials)
 
-    # Check if user has credentials
-    has_credentials = str(user_id) in user_credentials
+@functools.lru_cache(maxsize=512)
+def _render_menu_prompt(user_id, version, has_credentials):
+    """Render menu_prompt_text; cached until save_credentials bumps the user's version."""
     credential_status = "✅ Credentials set" if has_credentials else "❌ No credentials set"
 
     # Get formatted work schedule status
     work_schedule_status = get_formatted_work_schedule(user_id)
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return f"What would you like to do next?\n\n{credential_status}\n{work_schedule_status}"
 
-    # Send a new message with the menu buttons
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=f"What would you like to do next?\n\n{credential_status}\n{work_schedule_status}",
-        reply_markup=reply_markup
-    )
+# Footer appended to every report message
+REPORT_FOOTER = "\n_Generated by Odoo Time Tracking Bot_"
 
-def format_report_output(raw_output, user_id=None, weekly_report=False):
-    """Format the raw output from plot_times.py into a cleaner, more organized format."""
-    # Initialize formatted sections
-    summary = ""
-    holidays = ""
-    leaves = ""
-    weekly_hours = ""
-    leave_summary = ""  # New section for leave summary
-
-    # Process the raw output line by line to extract the relevant information
-    lines = raw_output.split('\n')
-    status = ""
-    difference = ""
-
-    # Extract the key metrics
-    worked_hours_value = ""
-    total_hours_value = ""
-    hours_to_complete_value = ""
-
-    # Scan through each line to find the metrics
-    for line in lines:
-        line = line.strip()
-        if "Status:" in line and "Difference:" in line:
-            parts = line.split(", Difference:")
-            status = parts[0].replace("Status:", "").strip()
-            difference = parts[1].strip()
-        elif "Total work time accounted so far" in line:
-            worked_hours_value = line.strip()
-        elif "Total hours Accounted this period" in line:
-            total_hours_value = line.strip()
-        elif "Total hours To complete this period" in line:
-            hours_to_complete_value = line.strip()
+# Progress emoji by tens of percent: red below 30%, purple below 60%, orange below 80%,
+# yellow below 90% and green from there on (index 10 is a complete 100%)
+_PROGRESS_EMOJI = ['🔴', '🔴', '🔴', '🟣', '🟣', '🟣', '🟠', '🟠', '🟡', '🟡', '🟢']
+
+def format_progress_line(result):
+    """Format the progress bar line comparing accounted and expected time of a report."""
+    expected_minutes = result.expected_hours * 60 + result.expected_minutes
+    accounted_minutes = result.accounted_hours * 60 + result.accounted_minutes
+
+    # Calculate percentage in whole minutes so e.g. 7h 59m of 8h reads 99%
+    if expected_minutes > 0:
+        percentage = min(100, max(0, accounted_minutes * 100 // expected_minutes))
+    else:
+        percentage = 100 if accounted_minutes > 0 else 0
+
+    # Create a progress bar with fixed-width Unicode block characters
+    filled = percentage // 10
+    progress_bar = "█" * filled + "░" * (10 - filled)
+
+    return f"\n{_PROGRESS_EMOJI[filled]} *Progress:* {progress_bar} {percentage}%\n"
+
+def format_report_summary(result, weekly_report=False):
+    """Format the status, totals and progress section of a report."""
+    status = result.status
+    difference = f"{'+' if status == 'Overtime' else ''}{result.diff_hours} hours and {result.diff_minutes} minutes"
 
     # Format the summary section with emojis and clear labels
-    summary = f"*📊 Time Tracking Summary*\n\n"
+    summary_parts = ["*📊 Time Tracking Summary*\n\n"]
 
     # Add status with appropriate emoji and formatting
     if status.lower() == "overtime":
-        summary += f"✅ *Status:* {status}\n"
+        summary_parts.append(f"✅ *Status:* {status}\n")
     else:
-        summary += f"⚠️ *Status:* {status}\n"
+        summary_parts.append(f"⚠️ *Status:* {status}\n")
+
+    summary_parts.append(f"⏱️ *Difference:* {difference}\n\n")
 
-    summary += f"⏱️ *Difference:* {difference}\n\n"
+    # Weekly runs of plot_times only report the status, not the period totals
+    has_period_totals = not result.plot_week
 
     # Add the detailed metrics with better formatting
-    if worked_hours_value:
-        # Extract just the hours and minutes part
-        import re
-        hours_match = re.search(r"(\d+) hours and (\d+) minutes", worked_hours_value)
-        if hours_match:
-            hours = hours_match.group(1)
-            minutes = hours_match.group(2)
-            summary += f"🕒 *Actual Hours Worked:* {hours}h {minutes}m\n"
-
-    if total_hours_value:
-        # Format the total hours more cleanly
-        import re
-        # Look for patterns like "X hours and Y minutes of Z hours and W minutes"
-        match = re.search(r"(\d+) hours and (\d+) minutes of (\d+) hours and (\d+) minutes", total_hours_value)
-        if match:
-            accounted_hours = match.group(1)
-            accounted_minutes = match.group(2)
-            expected_hours = match.group(3)
-            expected_minutes = match.group(4)
-            summary += f"📆 *Expected Hours:* {expected_hours}h {expected_minutes}m\n"
-            summary += f"✓ *Total Hours Accounted:* {accounted_hours}h {accounted_minutes}m\n"
-
-    if hours_to_complete_value:
-        # Extract the remaining hours needed
-        import re
-        match = re.search(r"(\d+) hours and (\d+) minutes of", hours_to_complete_value)
-        if match:
-            remaining_hours = match.group(1)
-            remaining_minutes = match.group(2)
-            summary += f"⏳ *Remaining Hours Needed:* {remaining_hours}h {remaining_minutes}m\n"
-
-    # Extract holidays information
-    holidays_section = ""
-    holidays_found = False
+    if has_period_totals:
+        summary_parts.append(f"🕒 *Actual Hours Worked:* {result.worked_hours}h {result.worked_minutes}m\n")
+        summary_parts.append(f"📆 *Expected Hours:* {result.expected_hours}h {result.expected_minutes}m\n")
+        summary_parts.append(f"✓ *Total Hours Accounted:* {result.accounted_hours}h {result.accounted_minutes}m\n")
+
+        # Nothing is left to complete once the expected hours are exceeded
+        if result.remaining_hours >= 0 and result.remaining_minutes >= 0:
+            summary_parts.append(f"⏳ *Remaining Hours Needed:* {result.remaining_hours}h {result.remaining_minutes}m\n")
+
+    # Add a progress bar for visual representation of completion
+    if has_period_totals and not weekly_report:  # Only show progress for non-weekly reports
+        summary_parts.append(format_progress_line(result))
+    else:
+        summary_parts.append("\n")
+
+    return "".join(summary_parts)
+
+def format_report_header():
+    """Report title line with the current date."""
+    current_date = datetime.datetime.now().strftime("%d %B %Y")
+    return f"*📋 Time Tracking Report - {current_date}*\n\n"
+
+def format_status_output(result):
+    """Format only the summary of a ReportResult, as shown by the status report."""
+    return f"{format_report_header()}{format_report_summary(result)}{REPORT_FOOTER}"
+
+def format_report_output(result, user_id=None, weekly_report=False):
+    """Format the ReportResult returned by plot_times.main() into a cleaner, more organized message."""
+    summary = format_report_summary(result, weekly_report)
+
+    # Format holidays information
+    holidays_parts = []
     holiday_hours = 0.0
-    for i, line in enumerate(lines):
-        if "List of Holidays:" in line:
-            holidays_found = True
-            j = i + 1
-            while j < len(lines) and lines[j].strip() and not lines[j].startswith("List of"):
-                # Format each holiday entry
-                holiday_line = lines[j].strip()
-                # Try to extract date and type
-                date_match = re.search(r"Date: (.*?),", holiday_line)
-                if date_match:
-                    date = date_match.group(1)
-                    # Extract hours if available
-                    hours_match = re.search(r"Hours Accounted: (.*?)h", holiday_line)
-                    if hours_match:
-                        try:
-                            holiday_hours += float(hours_match.group(1))
-                        except ValueError:
-                            pass
-                    formatted_line = f"• *{date}*: " + holiday_line.split("Date: " + date + ",")[1].strip()
-                    holidays_section += f"{formatted_line}\n"
-                else:
-                    holidays_section += f"• {holiday_line}\n"
-                j += 1
-            break
+    for holiday in result.holidays.itertuples(index=False):
+        holiday_hours += float(holiday.Hours)
+        holidays_parts.append(f"• *{holiday.Date}*: Type: {holiday.Type}, Hours Accounted: {holiday.Hours}h\n")
 
-    if holidays_found and holidays_section.strip():
-        holidays = f"\n*🏖️ Holidays*\n{holidays_section}"
+    if holidays_parts:
+        holidays = "\n*🏖️ Holidays*\n" + "".join(holidays_parts)
     else:
         holidays = "\n*🏖️ Holidays*\n• No holidays in this period."
 
-    # Extract leaves information
-    leaves_section = ""
-    leaves_found = False
+    # Format leaves information
+    leaves_parts = []
     sick_leave_hours = 0.0
     vacation_hours = 0.0
     half_day_hours = 0.0
     other_leave_hours = 0.0
 
-    for i, line in enumerate(lines):
-        if "List of Leaves and Half Days:" in line:
-            leaves_found = True
-            j = i + 1
-            while j < len(lines) and lines[j].strip() and not lines[j].startswith("List of") and not lines[j].startswith("Total weekly"):
-                # Format each leave entry
-                leave_line = lines[j].strip()
-                # Try to extract date and type
-                date_match = re.search(r"Date: (.*?),", leave_line)
-                if date_match:
-                    date = date_match.group(1)
-                    type_match = re.search(r"Type: (.*?),", leave_line)
-                    if type_match:
-                        leave_type = type_match.group(1)
-                        hours_match = re.search(r"Hours Accounted: (.*?)h", leave_line)
-                        hours = hours_match.group(1) if hours_match else "0.0"
-
-                        # Track hours by leave type
-                        try:
-                            hours_float = float(hours)
-                            if "Half Day" in leave_type:
-                                half_day_hours += hours_float
-                            elif "Krankheit" in leave_type or "Sick" in leave_type:
-                                sick_leave_hours += hours_float
-                            elif "Urlaub" in leave_type or "Vacation" in leave_type:
-                                vacation_hours += hours_float
-                            else:
-                                other_leave_hours += hours_float
-                        except ValueError:
-                            pass
-
-                        leaves_section += f"• *{date}* - {leave_type} ({hours}h)\n"
-                    else:
-                        formatted_line = f"• *{date}*: " + leave_line.split("Date: " + date + ",")[1].strip()
-                        leaves_section += f"{formatted_line}\n"
-                else:
-                    leaves_section += f"• {leave_line}\n"
-                j += 1
-            break
+    for leave in result.leaves.itertuples(index=False):
+        leave_type = leave.Type
+        hours_float = float(leave.Hours)
+
+        # Track hours by leave type
+        if "Half Day" in leave_type:
+            half_day_hours += hours_float
+        elif "Krankheit" in leave_type or "Sick" in leave_type:
+            sick_leave_hours += hours_float
+        elif "Urlaub" in leave_type or "Vacation" in leave_type:
+            vacation_hours += hours_float
+        else:
+            other_leave_hours += hours_float
+
+        leaves_parts.append(f"• *{leave.Date}* - {leave_type} ({leave.Hours}h)\n")
 
-    if leaves_found and leaves_section.strip():
-        leaves = f"\n*🌴 Leaves & Half Days*\n{leaves_section}"
+    if leaves_parts:
+        leaves = "\n*🌴 Leaves & Half Days*\n" + "".join(leaves_parts)
     else:
         leaves = "\n*🌴 Leaves & Half Days*\n• No leaves or half days in this period."
 
     # Create the leave summary section
     total_leave_hours = sick_leave_hours + vacation_hours + half_day_hours + holiday_hours + other_leave_hours
 
-    leave_summary = "\n*📝 Leave Hours Summary*\n"
+    leave_summary_parts = ["\n*📝 Leave Hours Summary*\n"]
     if sick_leave_hours > 0:
-        leave_summary += f"• 🤒 *Sick Leave:* {sick_leave_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 🤒 *Sick Leave:* {sick_leave_hours:.1f}h\n")
     if vacation_hours > 0:
-        leave_summary += f"• 🏝️ *Vacation:* {vacation_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 🏝️ *Vacation:* {vacation_hours:.1f}h\n")
     if half_day_hours > 0:
-        leave_summary += f"• 🕛 *Half Days:* {half_day_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 🕛 *Half Days:* {half_day_hours:.1f}h\n")
     if holiday_hours > 0:
-        leave_summary += f"• 🎉 *Holidays:* {holiday_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 🎉 *Holidays:* {holiday_hours:.1f}h\n")
     if other_leave_hours > 0:
-        leave_summary += f"• 📅 *Other Leaves:* {other_leave_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 📅 *Other Leaves:* {other_leave_hours:.1f}h\n")
 
     if total_leave_hours > 0:
-        leave_summary += f"• 🔖 *Total Leave Hours:* {total_leave_hours:.1f}h\n"
+        leave_summary_parts.append(f"• 🔖 *Total Leave Hours:* {total_leave_hours:.1f}h\n")
     else:
-        leave_summary += "• No leave hours in this period.\n"
-
-    # Extract weekly hours
-    weekly_hours_section = ""
-    weekly_found = False
-    for i, line in enumerate(lines):
-        if "Total weekly working hours:" in line:
-            weekly_found = True
-            j = i + 1
-            while j < len(lines) and lines[j].strip() and "Week ending" in lines[j]:
-                weekly_hours_section += f"{lines[j].strip()}\n"
-                j += 1
-            break
-
-    if weekly_found and weekly_hours_section.strip():
-        # Format the weekly hours to match the desired output
-        formatted_weekly_hours = ""
-        for line in weekly_hours_section.split('\n'):
-            if line.strip():
-                # Extract week ending date and hours
-                import re
-                week_match = re.search(r"Week ending (.*?): (.*?) hours and (.*?) minutes", line)
-                if week_match:
-                    date = week_match.group(1)
-                    hours = week_match.group(2)
-                    minutes = week_match.group(3)
-                    # Format the date to be more readable
-                    try:
-                        date_obj = datetime.datetime.strptime(date, "%Y-%m-%d")
-                        formatted_date = date_obj.strftime("%b %d")  # e.g., "Feb 09"
-
-                        # Use a bullet point instead of colored emoji
-                        formatted_weekly_hours += f"• *Week ending {formatted_date}:* {hours}h {minutes}m\n"
-                    except:
-                        formatted_weekly_hours += f"• *Week ending {date}:* {hours}h {minutes}m\n"
-                else:
-                    formatted_weekly_hours += f"• {line}\n"
+        leave_summary_parts.append("• No leave hours in this period.\n")
 
+    # Format weekly hours, e.g. "Week ending Feb 09"
+    formatted_weekly_hours = "".join(
+        f"• *Week ending {week['Week_End'].strftime('%b %d')}:* {week['Hours']}h {week['Minutes']}m\n"
+        for week in result.weekly
+    )
+
+    if formatted_weekly_hours:
         weekly_hours = f"\n*📅 Weekly Hours*\n{formatted_weekly_hours}"
     else:
         weekly_hours = "\n*📅 Weekly Hours*\n• No weekly hours data available."
 
-    # Add a progress bar for visual representation of completion
-    if total_hours_value and worked_hours_value and not weekly_report:  # Only show progress for non-weekly reports
-        import re
-        # Extract expected and accounted hours
-        expected_match = re.search(r"of (\d+) hours", total_hours_value)
-        accounted_match = re.search(r"(\d+) hours and \d+ minutes of", total_hours_value)
-
-        # Always show a progress bar even if we can't extract both values
-        expected_hours = int(expected_match.group(1)) if expected_match else 0
-        accounted_hours = int(accounted_match.group(1)) if accounted_match else 0
-
-        # Calculate percentage
-        if expected_hours <= 0 and accounted_hours > 0:
-            percentage = 100
-        elif expected_hours > 0:
-            percentage = min(100, int((accounted_hours / expected_hours) * 100))
-        else:
-            percentage = 0
-
-        # Create a progress bar with fixed-width Unicode block characters
-        filled = int(percentage / 10)
-        progress_bar = "█" * filled + "░" * (10 - filled)
-
-        # Add to summary with appropriate emoji based on percentage
-        # More granular color coding based on progress percentage
-        if percentage >= 100:
-            progress_emoji = "🟢"  # Green for complete/overtime (100%+)
-        elif percentage >= 90:
-            progress_emoji = "🟢"  # Green for almost complete (90-99%)
-        elif percentage >= 80:
-            progress_emoji = "🟡"  # Yellow for good progress (80-89%)
-        elif percentage >= 60:
-            progress_emoji = "🟠"  # Orange for medium progress (60-79%)
-        elif percentage >= 30:
-            progress_emoji = "🟣"  # Purple for low progress (30-59%)
-        else:
-            progress_emoji = "🔴"  # Red for very low progress (<30%)
-
-        summary += f"\n{progress_emoji} *Progress:* {progress_bar} {percentage}%\n"
-    else:
-        summary += "\n"
-
     # Add a divider for better visual separation
     divider = "\n" + "•───────────────────────•" + "\n"
 
-    # Add a header with current date
-    current_date = datetime.datetime.now().strftime("%d %B %Y")
-    header = f"*📋 Time Tracking Report - {current_date}*\n\n"
-
-    # Add copyright footer with hyperlink
-    copyright_footer = "\n_Generated by Odoo Time Tracking Bot_"
-
     # Combine all sections with dividers
-    formatted_output = f"{header}{summary}{divider}{leave_summary}{divider}{holidays}{divider}{leaves}{divider}{weekly_hours}{copyright_footer}"
-
-    return formatted_output
+    return "".join((
+        format_report_header(), summary, divider, *leave_summary_parts, divider,
+        holidays, divider, leaves, divider, weekly_hours, REPORT_FOOTER,
+    ))
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle errors in the telegram bot."""
@@ -1207,26 +1378,24 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 def main() -> None:
     """Start the bot."""
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(256)
+        .request(HTTPXRequest(connection_pool_size=20, read_timeout=15, connect_timeout=5))
+        .get_updates_request(HTTPXRequest(read_timeout=15, connect_timeout=5))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
 
-    # Define conversation states
-    global WAITING_FOR_SESSION_ID, WAITING_FOR_CSRF_TOKEN, WAITING_FOR_ODOO_UID, WAITING_FOR_CUSTOM_MONTH, WAITING_FOR_ALL_HOURS_INPUT
-    global CHOOSING_WORK_SCHEDULE, SETTING_WORK_DAYS, SETTING_WORK_HOURS, SETTING_SPECIFIC_HOURS, WAITING_FOR_HOURS_INPUT
-    global CHOOSING_ACTION, WAITING_FOR_EMAIL, WAITING_FOR_PASSWORD
+    # Talk to a self-hosted telegram-bot-api server instead of api.telegram.org when configured
+    local_api_url = os.getenv('TELEGRAM_LOCAL_API_URL')
+    if local_api_url:
+        local_api_url = local_api_url.rstrip('/')
+        logger.info(f"Using local Bot API server at {local_api_url}")
+        builder = builder.base_url(f"{local_api_url}/bot").base_file_url(f"{local_api_url}/file/bot")
 
-    CHOOSING_ACTION = 0
-    WAITING_FOR_SESSION_ID = 1
-    WAITING_FOR_CSRF_TOKEN = 2
-    WAITING_FOR_ODOO_UID = 3
-    WAITING_FOR_CUSTOM_MONTH = 4
-    WAITING_FOR_ALL_HOURS_INPUT = 5
-    CHOOSING_WORK_SCHEDULE = 6
-    SETTING_WORK_DAYS = 7
-    SETTING_WORK_HOURS = 8
-    SETTING_SPECIFIC_HOURS = 9
-    WAITING_FOR_HOURS_INPUT = 10
-    WAITING_FOR_EMAIL = 11
-    WAITING_FOR_PASSWORD = 12
+    application = builder.build()
 
     # Add conversation handler
     conv_handler = ConversationHandler(
@@ -1238,58 +1407,58 @@ def main() -> None:
             CallbackQueryHandler(button_callback),
         ],
         states={
-            CHOOSING_ACTION: [
+            State.CHOOSING_ACTION: [
                 CallbackQueryHandler(button_callback),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, lambda update, context: start(update, context)),
             ],
-            WAITING_FOR_SESSION_ID: [
+            State.WAITING_FOR_SESSION_ID: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, session_id_input),
                 # Add a command handler for /start to allow users to exit credential setting
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_CSRF_TOKEN: [
+            State.WAITING_FOR_CSRF_TOKEN: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, csrf_token_input),
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_ODOO_UID: [
+            State.WAITING_FOR_ODOO_UID: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, odoo_uid_input),
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_CUSTOM_MONTH: [
+            State.WAITING_FOR_CUSTOM_MONTH: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, custom_month_input),
                 CallbackQueryHandler(button_callback),
                 # Add a command handler for /start to allow users to exit the custom month state
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_ALL_HOURS_INPUT: [
+            State.WAITING_FOR_ALL_HOURS_INPUT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, all_hours_input),
                 CommandHandler("start", start),
             ],
-            CHOOSING_WORK_SCHEDULE: [
+            State.CHOOSING_WORK_SCHEDULE: [
                 CallbackQueryHandler(button_callback),
                 CommandHandler("start", start),
             ],
-            SETTING_WORK_DAYS: [
+            State.SETTING_WORK_DAYS: [
                 CallbackQueryHandler(button_callback),
                 CommandHandler("start", start),
             ],
-            SETTING_WORK_HOURS: [
+            State.SETTING_WORK_HOURS: [
                 CallbackQueryHandler(button_callback),
                 CommandHandler("start", start),
             ],
-            SETTING_SPECIFIC_HOURS: [
+            State.SETTING_SPECIFIC_HOURS: [
                 CallbackQueryHandler(button_callback),
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_HOURS_INPUT: [
+            State.WAITING_FOR_HOURS_INPUT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, hours_input),
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_EMAIL: [
+            State.WAITING_FOR_EMAIL: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, email_input),
                 CommandHandler("start", start),
             ],
-            WAITING_FOR_PASSWORD: [
+            State.WAITING_FOR_PASSWORD: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, password_input),
                 CommandHandler("start", start),
             ],
@@ -1326,7 +1495,8 @@ def main() -> None:
     application.add_error_handler(error_handler)
 
     # Start the Bot
-    application.run_polling()
+    # Only messages and button presses are handled, so don't ask Telegram for anything else
+    application.run_polling(allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY])
 
 async def custom_command_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Entry point for the /custom command to set up the conversation state."""
@@ -1335,18 +1505,14 @@ async def custom_command_entry(update: Update, context: ContextTypes.DEFAULT_TYP
 
     if context.args:
         # If arguments are provided, use them directly
-        custom_month = context.args[0]
-        try:
-            year, month = map(int, custom_month.split('-'))
-            if not (1 <= month <= 12):
-                raise ValueError
+        custom_month = parse_custom_month(context.args[0])
+        if custom_month is not None:
             # Valid format, generate report directly
             await generate_report(update, context, custom_month=custom_month)
             return ConversationHandler.END
-        except ValueError:
-            # Invalid format, prompt for correct format
-            await update.message.reply_text("Invalid format. Please use YYYY-MM (e.g., 2024-12)")
-            # Fall through to prompt for input
+        # Invalid format, prompt for correct format
+        await update.message.reply_text("Invalid format. Please use YYYY-MM (e.g., 2024-12)")
+        # Fall through to prompt for input
 
     # Store the fact that we're waiting for custom month input
     context.user_data['awaiting_custom_month'] = True
@@ -1355,55 +1521,61 @@ async def custom_command_entry(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text(
         "Please send the month in format YYYY-MM (e.g., 2024-12) or just the month number (1-12)"
     )
-    return WAITING_FOR_CUSTOM_MONTH
+    return State.WAITING_FOR_CUSTOM_MONTH
 
-async def show_work_schedule_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show work schedule options."""
-    query = update.callback_query
-    user_id = query.from_user.id
+def current_schedule_text(user_id):
+    """Summary of the user's saved work schedule shown above the schedule options."""
+    user_id = str(user_id)
+    return _render_current_schedule(user_id, _CREDENTIALS_VERSION.get(user_id, 0))
 
-    # Check if user has credentials
-    if str(user_id) not in user_credentials:
-        await query.edit_message_text(
-            "You need to set your credentials first before setting your work schedule. Use the 'Auto Fetch Tokens' button in the menu to set them up."
-        )
-        await show_menu_buttons(update, context)
-        return ConversationHandler.END
+@functools.lru_cache(maxsize=512)
+def _render_current_schedule(user_id, version):
+    """Render current_schedule_text; cached until save_credentials bumps the user's version."""
+    work_schedule = user_credentials.get(user_id, {}).get('work_schedule')
+    if work_schedule is None:
+        return ""
 
-    keyboard = [
-        [InlineKeyboardButton("⏰ Full Time (40h/week)", callback_data="hours_full_time")],
-        [InlineKeyboardButton("⌛ Part Time", callback_data="part_time_custom")],
-        [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
-    ]
+    schedule_type = work_schedule.get('type', 'custom')
+    if schedule_type == FULL_TIME:
+        return "Current: Full Time (40h/week)"
+    elif schedule_type == PART_TIME:
+        return "Current: Part Time (20h/week)"
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Custom schedule - show days and hours
+    work_days = work_schedule.get('days', {})
+    work_hours = work_schedule.get('hours', {})
 
-    # Show current work schedule if it exists
-    current_schedule = ""
-    if 'work_schedule' in user_credentials[str(user_id)]:
-        work_schedule = user_credentials[str(user_id)]['work_schedule']
-        schedule_type = work_schedule.get('type', 'custom')
-
-        if schedule_type == FULL_TIME:
-            current_schedule = "Current: Full Time (40h/week)"
-        elif schedule_type == PART_TIME:
-            current_schedule = "Current: Part Time (20h/week)"
-        else:
-            # Custom schedule - show days and hours
-            work_days = work_schedule.get('days', {})
-            work_hours = work_schedule.get('hours', {})
+    days_text = ", ".join([day for day, enabled in work_days.items() if enabled])
+    total_hours = sum(hours for day, hours in work_hours.items() if work_days.get(day, False))
+
+    return f"Current: Custom ({total_hours}h/week on {days_text})"
 
-            days_text = ", ".join([day for day, enabled in work_days.items() if enabled])
-            total_hours = sum([hours for day, hours in work_hours.items() if work_days.get(day, False)])
+async def show_work_schedule_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show work schedule options, editing the menu message or replying to /work_schedule."""
+    user_id = update.effective_user.id
+    # Edit the message of a menu button press, reply to a command
+    if update.callback_query is not None:
+        send = update.callback_query.edit_message_text
+    else:
+        send = update.message.reply_text
+
+    # Check if user has credentials
+    if str(user_id) not in user_credentials:
+        await send(
+            "You need to set your credentials first before setting your work schedule. Use the 'Auto Fetch Tokens' button in the menu to set them up."
+        )
+        await show_menu_buttons(update, context)
+        return ConversationHandler.END
 
-            current_schedule = f"Current: Custom ({total_hours}h/week on {days_text})"
+    # Show current work schedule if it exists
+    current_schedule = current_schedule_text(user_id)
 
-    await query.edit_message_text(
+    await send(
         f"Please select your work schedule type:\n\n{current_schedule}",
-        reply_markup=reply_markup
+        reply_markup=WORK_SCHEDULE_OPTIONS_MARKUP
     )
 
-    return CHOOSING_WORK_SCHEDULE
+    return State.CHOOSING_WORK_SCHEDULE
 
 async def set_work_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, schedule_type: str) -> int:
     """Set work schedule based on predefined types."""
@@ -1459,18 +1631,7 @@ async def set_work_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return ConversationHandler.END
 
     # Save work schedule to user credentials
-    global user_credentials
-    user_credentials[str(user_id)]['work_schedule'] = {
-        'type': schedule_type,
-        'days': work_days,
-        'hours': work_hours
-    }
-
-    # Save to environment variable
-    save_credentials(user_credentials)
-
-    # Update plot_times expected hours
-    update_plot_times_expected_hours(user_id)
+    await save_work_schedule(user_id, schedule_type, work_days, work_hours)
 
     await query.edit_message_text(f"Your work schedule has been set to {schedule_name}.")
     await show_menu_buttons(update, context)
@@ -1484,61 +1645,81 @@ async def start_custom_schedule(update: Update, context: ContextTypes.DEFAULT_TY
 
     # Initialize with default or existing work days
     if str(user_id) in user_credentials and 'work_schedule' in user_credentials[str(user_id)]:
-        work_days = user_credentials[str(user_id)]['work_schedule'].get('days', DEFAULT_WORK_DAYS.copy())
-        work_hours = user_credentials[str(user_id)]['work_schedule'].get('hours', {})
+        work_days = user_credentials[str(user_id)]['work_schedule'].get('days', DEFAULT_WORK_DAYS)
+        # Edited in place by the hours handlers, so don't share the saved dict
+        work_hours = dict(user_credentials[str(user_id)]['work_schedule'].get('hours', {}))
     else:
-        work_days = DEFAULT_WORK_DAYS.copy()
+        work_days = DEFAULT_WORK_DAYS
         work_hours = {}
 
     # Store in context for the conversation
     context.user_data['temp_work_days'] = work_days
     context.user_data['temp_work_hours'] = work_hours
-    context.user_data['is_custom_schedule'] = True
 
     # Show work days selection
     return await show_work_days_selection(update, context)
 
-async def show_work_days_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show the work days selection interface."""
-    query = update.callback_query
+# Shown above the work days selection when the user continues without any day selected
+NO_WORK_DAYS_NOTICE = "⚠️ You must select at least one work day. Please try again.\n\n"
 
-    # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
+# Days offered as toggles in the work days selection
+TOGGLE_WORK_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri")
 
-    # Create keyboard with toggles for each day (only weekdays)
-    keyboard = []
-    for day in ["Mon", "Tue", "Wed", "Thu", "Fri"]:  # Only weekdays
-        status = "✅" if work_days.get(day, False) else "❌"
-        keyboard.append([
-            InlineKeyboardButton(f"{day}: {status}", callback_data=f"toggle_day_{day}")
-        ])
+@functools.lru_cache(maxsize=64)
+def _work_days_markup(selected, continue_data="save_work_days"):
+    """Build the work days toggle keyboard for one on/off flag per TOGGLE_WORK_DAYS entry."""
+    keyboard = [
+        [InlineKeyboardButton(f"{day}: {'✅' if enabled else '❌'}", callback_data=f"toggle_day_{day}")]
+        for day, enabled in zip(TOGGLE_WORK_DAYS, selected)
+    ]
 
     # Add save and cancel buttons
     keyboard.append([
-        InlineKeyboardButton("✅ Continue to Set Hours", callback_data="save_work_days"),
+        InlineKeyboardButton("✅ Continue to Set Hours", callback_data=continue_data),
         InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")
     ])
+    return InlineKeyboardMarkup(keyboard)
+
+async def edit_message_if_changed(query, text, reply_markup=None):
+    """Edit the callback's message unless it already shows this text and keyboard."""
+    message = query.message
+    if message is not None and message.text == text and message.reply_markup == reply_markup:
+        return
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e):
+            raise
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+async def show_work_days_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, notice: str = "") -> int:
+    """Show the work days selection interface, optionally below a notice line."""
+    query = update.callback_query
 
-    # Count selected days (only weekdays)
-    selected_days = sum(1 for day, enabled in work_days.items()
-                       if day in ["Mon", "Tue", "Wed", "Thu", "Fri"] and enabled)
+    # Get the temporary work days from context
+    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS)
 
-    await query.edit_message_text(
-        f"Select your work days:\n"
+    # Keyboard with toggles for each day (only weekdays)
+    selected = tuple(bool(work_days.get(day, False)) for day in TOGGLE_WORK_DAYS)
+    # Remembered for toggle_work_day(), which redraws the keyboard with the same Continue button
+    context.user_data['work_days_continue'] = "save_work_days"
+    reply_markup = _work_days_markup(selected)
+
+    await edit_message_if_changed(
+        query,
+        f"{notice}Select your work days:\n"
         f"(Click on a day to toggle it on/off)\n\n"
-        f"Selected days: {selected_days}/5\n"
         f"After selecting days, you'll be able to set specific hours for each day.",
-        reply_markup=reply_markup
+        reply_markup
     )
 
-    return SETTING_WORK_DAYS
+    return State.SETTING_WORK_DAYS
 
 async def toggle_work_day(update: Update, context: ContextTypes.DEFAULT_TYPE, day: str) -> int:
-    """Toggle a work day on or off."""
-    # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
+    """Toggle a work day on or off, updating only the picker keyboard."""
+    query = update.callback_query
+
+    # Copy the temporary work days from context, which may be the read-only default or the saved schedule
+    work_days = dict(context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS))
 
     # Toggle the selected day
     work_days[day] = not work_days.get(day, False)
@@ -1546,8 +1727,15 @@ async def toggle_work_day(update: Update, context: ContextTypes.DEFAULT_TYPE, da
     # Update the context
     context.user_data['temp_work_days'] = work_days
 
-    # Show the updated selection
-    return await show_work_days_selection(update, context)
+    # The day count goes into the callback answer, so the message text stays as it is
+    selected = tuple(bool(work_days.get(toggle_day, False)) for toggle_day in TOGGLE_WORK_DAYS)
+    await query.answer(f"Selected days: {sum(selected)}/5")
+
+    # Keep the picker's Continue button, which differs between the custom and part-time flows
+    continue_data = context.user_data.get('work_days_continue', "save_work_days")
+    await query.edit_message_reply_markup(reply_markup=_work_days_markup(selected, continue_data))
+
+    return State.SETTING_WORK_DAYS
 
 async def save_work_days(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Save the selected work days and proceed to hours setup."""
@@ -1560,52 +1748,27 @@ async def save_work_days(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Count enabled work days
     enabled_days = [day for day, enabled in work_days.items() if enabled]
     if not enabled_days:
-        await query.edit_message_text(
-            "You must select at least one work day. Please try again."
-        )
-        return await show_work_days_selection(update, context)
-
-    # Store work days in context for later use
-    context.user_data['work_days'] = work_days
-
-    # Format days for display using full names and proper sorting
-    day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    day_full_names = {
-        "Mon": "Monday",
-        "Tue": "Tuesday",
-        "Wed": "Wednesday",
-        "Thu": "Thursday",
-        "Fri": "Friday",
-        "Sat": "Saturday",
-        "Sun": "Sunday"
-    }
-
-    # Create reverse mapping from full names to abbreviations
-    full_to_abbrev = {v: k for k, v in day_full_names.items()}
+        return await show_work_days_selection(update, context, NO_WORK_DAYS_NOTICE)
 
     # Convert any full day names to abbreviations before sorting
     normalized_enabled_days = []
     for day in enabled_days:
-        if day in full_to_abbrev:  # If it's a full day name
-            normalized_enabled_days.append(full_to_abbrev[day])
+        if day in FULL_TO_ABBREV:  # If it's a full day name
+            normalized_enabled_days.append(FULL_TO_ABBREV[day])
         else:  # It's already an abbreviation
             normalized_enabled_days.append(day)
 
     # Sort days according to the week order
-    sorted_enabled_days = sorted(normalized_enabled_days, key=lambda x: day_order.index(x))
-    formatted_days = [day_full_names[day] for day in sorted_enabled_days]
+    sorted_enabled_days = sorted(normalized_enabled_days, key=WEEKDAY_INDEX.__getitem__)
+    formatted_days = [DAY_FULL_NAMES[day] for day in sorted_enabled_days]
     days_text = ", ".join(formatted_days)
 
     # Calculate total hours per week (default to 20 hours per week for part-time)
     total_hours_per_week = 20.0
     hours_per_day = round(total_hours_per_week / len(enabled_days), 1)
 
-    # Store the calculated hours in context
-    context.user_data['hours_per_day'] = hours_per_day
-
     # Create initial hours distribution
     work_hours = {day: hours_per_day if enabled else 0.0 for day, enabled in work_days.items()}
-    context.user_data['work_hours'] = work_hours
 
     await query.edit_message_text(
         f"Your work schedule has been saved.\n\n"
@@ -1613,15 +1776,10 @@ async def save_work_days(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"Total hours per week: {total_hours_per_week}h\n"
         f"Hours per day: {hours_per_day}h\n\n"
         f"How would you like to set up your work hours?",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("⌛ Standard Distribution", callback_data="hours_standard")],
-            [InlineKeyboardButton("📝 Set Specific Hours per Day", callback_data="set_specific_hours")],
-            [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
-            [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
-        ])
+        reply_markup=HOURS_DISTRIBUTION_MARKUP
     )
 
-    return SETTING_WORK_HOURS
+    return State.SETTING_WORK_HOURS
 
 async def set_hours_distribution(update: Update, context: ContextTypes.DEFAULT_TYPE, hours_type: str) -> int:
     """Set the distribution of hours based on the selected type."""
@@ -1629,7 +1787,7 @@ async def set_hours_distribution(update: Update, context: ContextTypes.DEFAULT_T
     user_id = query.from_user.id
 
     # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
+    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS)
 
     # Calculate selected days count
     selected_days = [day for day, enabled in work_days.items() if enabled]
@@ -1657,26 +1815,10 @@ async def set_hours_distribution(update: Update, context: ContextTypes.DEFAULT_T
     hours_per_day = total_hours / selected_days_count if selected_days_count > 0 else 0
 
     # Create hours dictionary
-    work_hours = {}
-    for day in WEEKDAY_KEYS:
-        work_hours[day] = hours_per_day if work_days.get(day, False) else 0.0
+    work_hours = {day: hours_per_day if work_days.get(day, False) else 0.0 for day in WEEKDAY_KEYS}
 
     # Save to user credentials
-    global user_credentials
-    if str(user_id) not in user_credentials:
-        user_credentials[str(user_id)] = {}
-
-    user_credentials[str(user_id)]['work_schedule'] = {
-        'type': schedule_type,
-        'days': work_days,
-        'hours': work_hours
-    }
-
-    # Save to environment variable
-    save_credentials(user_credentials)
-
-    # Update plot_times expected hours
-    update_plot_times_expected_hours(user_id)
+    await save_work_schedule(user_id, schedule_type, work_days, work_hours)
 
     # Show confirmation
     days_text = ", ".join([day for day, enabled in work_days.items() if enabled])
@@ -1687,47 +1829,28 @@ async def set_hours_distribution(update: Update, context: ContextTypes.DEFAULT_T
         f"Hours per day: {hours_per_day:.1f}h"
     )
 
+    clear_schedule_draft(context)
     await show_menu_buttons(update, context)
     return ConversationHandler.END
 
-async def show_specific_hours_setup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show options for setting up specific hours for each work day."""
-    query = update.callback_query
-    user_id = query.from_user.id
-
-    work_days = context.user_data.get('temp_work_days', {})
-    work_hours = context.user_data.get('temp_work_hours', {})
-
-    # Only show buttons for enabled work days
-    keyboard = []
-    day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    day_full_names = {
-        "Mon": "Monday",
-        "Tue": "Tuesday",
-        "Wed": "Wednesday",
-        "Thu": "Thursday",
-        "Fri": "Friday",
-        "Sat": "Saturday",
-        "Sun": "Sunday"
-    }
-
+def specific_hours_view(work_days, work_hours):
+    """Build the text and keyboard for setting specific hours per enabled work day."""
     # Sort days according to week order and only include enabled days
-    enabled_days = sorted(
+    enabled_days = tuple(sorted(
         [day for day, enabled in work_days.items() if enabled],
-        key=lambda x: day_order.index(x)
-    )
-
-    # Create buttons for each enabled day
-    for day in enabled_days:
-        hours = work_hours.get(day, 0.0)
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{day_full_names[day]}: {hours}h",
-                callback_data=f"edit_hours_{day}"
-            )
-        ])
-
-    # Add control buttons
+        key=WEEKDAY_INDEX.__getitem__
+    ))
+    day_hours = tuple(work_hours.get(day, 0.0) for day in enabled_days)
+    return _render_specific_hours_view(enabled_days, day_hours, sum(work_hours.values()))
+
+@functools.lru_cache(maxsize=256)
+def _render_specific_hours_view(enabled_days, day_hours, total_hours):
+    """Render specific_hours_view; cached since the same schedule state repeats across edits."""
+    # One button per enabled day, followed by the control buttons
+    keyboard = [
+        [InlineKeyboardButton(f"{DAY_FULL_NAMES[day]}: {hours}h", callback_data=f"edit_hours_{day}")]
+        for day, hours in zip(enabled_days, day_hours)
+    ]
     keyboard.extend([
         [InlineKeyboardButton("💼 Set All Hours at Once", callback_data="set_all_hours")],
         [InlineKeyboardButton("✅ Save Hours", callback_data="save_specific_hours")],
@@ -1735,19 +1858,28 @@ async def show_specific_hours_setup(update: Update, context: ContextTypes.DEFAUL
         [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
     ])
 
-    total_hours = sum(work_hours.values())
-    formatted_days = [day_full_names[day] for day in enabled_days]
-    days_text = ", ".join(formatted_days)
+    days_text = ", ".join(DAY_FULL_NAMES[day] for day in enabled_days)
 
-    await query.edit_message_text(
+    text = (
         f"Set your work hours for each day:\n\n"
         f"Work days: {days_text}\n"
         f"Total hours per week: {total_hours:.1f}h\n\n"
-        f"Click on a day to edit its hours:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        f"Click on a day to edit its hours:"
     )
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def show_specific_hours_setup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show options for setting up specific hours for each work day."""
+    query = update.callback_query
+    user_id = query.from_user.id
+
+    work_days = context.user_data.get('temp_work_days', {})
+    work_hours = context.user_data.get('temp_work_hours', {})
+
+    text, markup = specific_hours_view(work_days, work_hours)
+    await query.edit_message_text(text, reply_markup=markup)
 
-    return SETTING_SPECIFIC_HOURS
+    return State.SETTING_SPECIFIC_HOURS
 
 async def set_all_hours_at_once(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show interface to set all hours at once."""
@@ -1755,30 +1887,25 @@ async def set_all_hours_at_once(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
 
     # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
+    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS)
     work_hours = context.user_data.get('temp_work_hours', {})
 
-    # Create a message showing current hours for each selected day
-    message = "Enter hours for each work day in a single message.\n\n"
-    message += "Format: Use one line per day with 'Day: hours'\n"
-    message += "Example:\n"
-
-    # Add example and current values
-    selected_days = []
-    for day in WEEKDAY_KEYS:
-        if work_days.get(day, False):
-            selected_days.append(day)
-            current_hours = work_hours.get(day, 0.0)
-            message += f"{day}: {current_hours:.1f}\n"
-
-    message += "\nEnter your hours below:"
+    # Create a message showing current hours for each selected day as the example
+    selected_days = [day for day in WEEKDAY_KEYS if work_days.get(day, False)]
+    example = "".join(f"{day}: {work_hours.get(day, 0.0):.1f}\n" for day in selected_days)
+    message = (
+        "Enter hours for each work day in a single message.\n\n"
+        "Format: Use one line per day with 'Day: hours'\n"
+        f"Example:\n{example}"
+        "\nEnter your hours below:"
+    )
 
     # Store selected days for validation
     context.user_data['selected_days'] = selected_days
 
     await query.edit_message_text(message)
 
-    return WAITING_FOR_ALL_HOURS_INPUT
+    return State.WAITING_FOR_ALL_HOURS_INPUT
 
 async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle user input for all hours at once."""
@@ -1790,21 +1917,20 @@ async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     work_hours = context.user_data.get('temp_work_hours', {})
 
     # Parse the input
-    lines = user_input.strip().split('\n')
     parsed_hours = {}
     errors = []
 
-    for line in lines:
+    for line in user_input.splitlines():
         if not line.strip():
             continue
 
-        parts = line.split(':')
-        if len(parts) != 2:
+        match = _HOURS_LINE_RE.match(line)
+        if match is None:
             errors.append(f"Invalid format in line: '{line}'. Use 'Day: hours'")
             continue
 
-        day = parts[0].strip()
-        if day not in WEEKDAY_KEYS:
+        day, value = match.groups()
+        if day not in WEEKDAY_INDEX:
             errors.append(f"Invalid day '{day}'. Use one of {', '.join(WEEKDAY_KEYS)}")
             continue
 
@@ -1812,20 +1938,19 @@ async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             errors.append(f"Day '{day}' is not selected as a work day")
             continue
 
-        try:
-            hours = float(parts[1].strip())
-            if hours < 0 or hours > 12:
-                errors.append(f"Hours for {day} must be between 0 and 12")
-                continue
+        if not _HOURS_VALUE_RE.match(value):
+            errors.append(f"Invalid hours value for {day}: '{value}'")
+            continue
+
+        hours = float(value)
+        if hours < 0 or hours > 12:
+            errors.append(f"Hours for {day} must be between 0 and 12")
+            continue
 
-            parsed_hours[day] = hours
-        except ValueError:
-            errors.append(f"Invalid hours value for {day}: '{parts[1].strip()}'")
+        parsed_hours[day] = hours
 
     # Check if all selected days have hours
-    for day in selected_days:
-        if day not in parsed_hours:
-            errors.append(f"Missing hours for {day}")
+    errors.extend(f"Missing hours for {day}" for day in selected_days if day not in parsed_hours)
 
     # If there are errors, show them and ask again
     if errors:
@@ -1833,7 +1958,7 @@ async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         error_message += "\n".join(errors)
         error_message += "\n\nPlease try again."
         await update.message.reply_text(error_message)
-        return WAITING_FOR_ALL_HOURS_INPUT
+        return State.WAITING_FOR_ALL_HOURS_INPUT
 
     # Update hours
     for day, hours in parsed_hours.items():
@@ -1842,7 +1967,7 @@ async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data['temp_work_hours'] = work_hours
 
     # Calculate total hours
-    total_hours = sum(work_hours.get(day, 0.0) for day in WEEKDAY_KEYS if day in selected_days)
+    total_hours = sum(work_hours.get(day, 0.0) for day in selected_days)
 
     # Confirm the hours were set
     await update.message.reply_text(
@@ -1850,59 +1975,13 @@ async def all_hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"Total hours per week: {total_hours:.1f}h"
     )
 
-    # Instead of using a fake callback query, create a new message with the hours setup
+    # Show the updated hours setup as a new message
     work_days = context.user_data.get('temp_work_days', {})
 
-    # Only show buttons for enabled work days
-    keyboard = []
-    day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    day_full_names = {
-        "Mon": "Monday",
-        "Tue": "Tuesday",
-        "Wed": "Wednesday",
-        "Thu": "Thursday",
-        "Fri": "Friday",
-        "Sat": "Saturday",
-        "Sun": "Sunday"
-    }
-
-    # Sort days according to week order and only include enabled days
-    enabled_days = sorted(
-        [day for day, enabled in work_days.items() if enabled],
-        key=lambda x: day_order.index(x)
-    )
-
-    # Create buttons for each enabled day
-    for day in enabled_days:
-        hours = work_hours.get(day, 0.0)
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{day_full_names[day]}: {hours}h",
-                callback_data=f"edit_hours_{day}"
-            )
-        ])
-
-    # Add control buttons
-    keyboard.extend([
-        [InlineKeyboardButton("💼 Set All Hours at Once", callback_data="set_all_hours")],
-        [InlineKeyboardButton("✅ Save Hours", callback_data="save_specific_hours")],
-        [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
-        [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
-    ])
-
-    total_hours = sum(work_hours.values())
-    formatted_days = [day_full_names[day] for day in enabled_days]
-    days_text = ", ".join(formatted_days)
-
-    await update.message.reply_text(
-        f"Set your work hours for each day:\n\n"
-        f"Work days: {days_text}\n"
-        f"Total hours per week: {total_hours:.1f}h\n\n"
-        f"Click on a day to edit its hours:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    text, markup = specific_hours_view(work_days, work_hours)
+    await update.message.reply_text(text, reply_markup=markup)
 
-    return SETTING_SPECIFIC_HOURS
+    return State.SETTING_SPECIFIC_HOURS
 
 async def edit_day_hours(update: Update, context: ContextTypes.DEFAULT_TYPE, day: str) -> int:
     """Edit the hours for a specific day."""
@@ -1921,19 +2000,7 @@ async def edit_day_hours(update: Update, context: ContextTypes.DEFAULT_TYPE, day
         f"Please enter a number between 0 and 12, e.g., 8 or 7.5"
     )
 
-    return WAITING_FOR_HOURS_INPUT
-
-# Define FakeCallbackQuery class for use in hours_input
-class FakeCallbackQuery:
-    def __init__(self, user_id):
-        self.from_user = type('obj', (object,), {'id': user_id})
-        self.data = "work_schedule"
-
-    async def edit_message_text(self, text, reply_markup=None):
-        pass
-
-    async def answer(self):
-        pass
+    return State.WAITING_FOR_HOURS_INPUT
 
 async def hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle user input for specific hours."""
@@ -1941,12 +2008,15 @@ async def hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     user_id = update.message.from_user.id
 
     try:
+        # Same check as all_hours_input, float() alone would take 'nan', 'inf' or '1e1'
+        if not _HOURS_VALUE_RE.match(user_input):
+            raise ValueError(f"Invalid hours value: {user_input!r}")
         hours = float(user_input)
         if hours < 0 or hours > 12:
             await update.message.reply_text(
                 "Please enter a valid number between 0 and 12."
             )
-            return WAITING_FOR_HOURS_INPUT
+            return State.WAITING_FOR_HOURS_INPUT
 
         # Get the day being edited
         day = context.user_data.get('editing_day')
@@ -1954,13 +2024,13 @@ async def hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
             await update.message.reply_text(
                 "Error: No day selected for editing. Please try again."
             )
-            # Create a new update with a fake callback query
-            fake_query = FakeCallbackQuery(user_id)
-            # Important: Log this operation
-            logger.info(f"Creating fake callback query for user {user_id} to return to hours setup")
-            # Create a new update object with the callback_query attribute
-            fake_update = Update(update.update_id, callback_query=fake_query)
-            return await show_specific_hours_setup(fake_update, context)
+            # Show the hours setup again as a new message
+            logger.info(f"No day selected for user {user_id}, returning to hours setup")
+            text, markup = specific_hours_view(
+                context.user_data.get('temp_work_days', {}), context.user_data.get('temp_work_hours', {})
+            )
+            await update.message.reply_text(text, reply_markup=markup)
+            return State.SETTING_SPECIFIC_HOURS
 
         # Update hours for this day
         work_hours = context.user_data.get('temp_work_hours', {})
@@ -1972,65 +2042,19 @@ async def hours_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
             f"Hours for {day} set to {hours:.1f}h"
         )
 
-        # Instead of using a fake callback query, create a new message with the hours setup
+        # Show the updated hours setup as a new message
         work_days = context.user_data.get('temp_work_days', {})
 
-        # Only show buttons for enabled work days
-        keyboard = []
-        day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        day_full_names = {
-            "Mon": "Monday",
-            "Tue": "Tuesday",
-            "Wed": "Wednesday",
-            "Thu": "Thursday",
-            "Fri": "Friday",
-            "Sat": "Saturday",
-            "Sun": "Sunday"
-        }
-
-        # Sort days according to week order and only include enabled days
-        enabled_days = sorted(
-            [day for day, enabled in work_days.items() if enabled],
-            key=lambda x: day_order.index(x)
-        )
-
-        # Create buttons for each enabled day
-        for day in enabled_days:
-            hours = work_hours.get(day, 0.0)
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{day_full_names[day]}: {hours}h",
-                    callback_data=f"edit_hours_{day}"
-                )
-            ])
-
-        # Add control buttons
-        keyboard.extend([
-            [InlineKeyboardButton("💼 Set All Hours at Once", callback_data="set_all_hours")],
-            [InlineKeyboardButton("✅ Save Hours", callback_data="save_specific_hours")],
-            [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
-            [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
-        ])
-
-        total_hours = sum(work_hours.values())
-        formatted_days = [day_full_names[day] for day in enabled_days]
-        days_text = ", ".join(formatted_days)
-
-        await update.message.reply_text(
-            f"Set your work hours for each day:\n\n"
-            f"Work days: {days_text}\n"
-            f"Total hours per week: {total_hours:.1f}h\n\n"
-            f"Click on a day to edit its hours:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        text, markup = specific_hours_view(work_days, work_hours)
+        await update.message.reply_text(text, reply_markup=markup)
 
-        return SETTING_SPECIFIC_HOURS
+        return State.SETTING_SPECIFIC_HOURS
 
     except ValueError:
         await update.message.reply_text(
             "Please enter a valid number (e.g., 8 or 7.5)."
         )
-        return WAITING_FOR_HOURS_INPUT
+        return State.WAITING_FOR_HOURS_INPUT
 
 async def save_specific_hours(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Save the specific hours setup and complete the work schedule setup."""
@@ -2048,63 +2072,31 @@ async def save_specific_hours(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return await show_specific_hours_setup(update, context)
 
-    # Save the temporary work days and hours to the permanent storage
-    context.user_data['work_days'] = work_days
-    context.user_data['work_hours'] = work_hours
-
-    # Format days for display
-    day_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    day_full_names = {
-        "Mon": "Monday",
-        "Tue": "Tuesday",
-        "Wed": "Wednesday",
-        "Thu": "Thursday",
-        "Fri": "Friday",
-        "Sat": "Saturday",
-        "Sun": "Sunday"
-    }
-
-    # Create reverse mapping from full names to abbreviations
-    full_to_abbrev = {v: k for k, v in day_full_names.items()}
-
     # Convert any full day names to abbreviations before sorting
     normalized_enabled_days = []
     for day in [day for day, enabled in work_days.items() if enabled]:
-        if day in full_to_abbrev:  # If it's a full day name
-            normalized_enabled_days.append(full_to_abbrev[day])
+        if day in FULL_TO_ABBREV:  # If it's a full day name
+            normalized_enabled_days.append(FULL_TO_ABBREV[day])
         else:  # It's already an abbreviation
             normalized_enabled_days.append(day)
 
     # Sort and format enabled days
     enabled_days = sorted(
         normalized_enabled_days,
-        key=lambda x: day_order.index(x)
+        key=WEEKDAY_INDEX.__getitem__
     )
-    formatted_days = [day_full_names[day] for day in enabled_days]
+    formatted_days = [DAY_FULL_NAMES[day] for day in enabled_days]
     days_text = ", ".join(formatted_days)
 
     # Save to user credentials
-    if str(user_id) not in user_credentials:
-        user_credentials[str(user_id)] = {}
-
-    user_credentials[str(user_id)]['work_schedule'] = {
-        'type': 'custom',
-        'days': work_days,
-        'hours': work_hours
-    }
-
-    # Save credentials
-    save_credentials(user_credentials)
-
-    # Update plot_times expected hours
-    update_plot_times_expected_hours(user_id)
+    await save_work_schedule(user_id, 'custom', work_days, work_hours)
 
     # Show confirmation with schedule details
     schedule_details = []
     for day in enabled_days:
         hours = work_hours.get(day, 0.0)
         if hours > 0:
-            schedule_details.append(f"{day_full_names[day]}: {hours}h")
+            schedule_details.append(f"{DAY_FULL_NAMES[day]}: {hours}h")
 
     schedule_text = "\n".join(schedule_details)
 
@@ -2114,34 +2106,22 @@ async def save_specific_hours(update: Update, context: ContextTypes.DEFAULT_TYPE
         f"Total hours per week: {total_hours:.1f}h"
     )
 
+    clear_schedule_draft(context)
     await show_menu_buttons(update, context)
     return ConversationHandler.END
 
-def update_plot_times_expected_hours(user_id):
-    """Update plot_times.EXPECTED_HOURS_BY_DAY based on user's work schedule."""
-    if str(user_id) not in user_credentials or 'work_schedule' not in user_credentials[str(user_id)]:
-        return
-
-    work_schedule = user_credentials[str(user_id)]['work_schedule']
+def expected_hours_by_day(user_id):
+    """Expected work hours per weekday from the user's work schedule, as passed to plot_times."""
+    work_schedule = user_credentials.get(str(user_id), {}).get('work_schedule', {})
     work_days = work_schedule.get('days', {})
     work_hours = work_schedule.get('hours', {})
-
-    # Update the global variable in plot_times
-    for day in plot_times.EXPECTED_HOURS_BY_DAY:
-        plot_times.EXPECTED_HOURS_BY_DAY[day] = work_hours.get(day, 0.0) if work_days.get(day, False) else 0.0
-
-    logger.info(f"Updated expected hours for user {user_id}: {plot_times.EXPECTED_HOURS_BY_DAY}")
+    return {day: work_hours.get(day, 0.0) if work_days.get(day, False) else 0.0 for day in WEEKDAY_KEYS}
 
 async def work_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Command handler for /work_schedule command."""
     user_id = update.effective_user.id
     logger.info(f"User {user_id} is setting work schedule")
 
-    # Create a fake callback query to reuse the show_work_schedule_options function
-    fake_query = FakeCallbackQuery(user_id)
-    # Set the fake query as the callback_query attribute of the update
-    update._callback_query = fake_query
-
     return await show_work_schedule_options(update, context)
 
 async def start_part_time_custom(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -2151,8 +2131,9 @@ async def start_part_time_custom(update: Update, context: ContextTypes.DEFAULT_T
 
     # Initialize with default or existing work days
     if str(user_id) in user_credentials and 'work_schedule' in user_credentials[str(user_id)]:
-        work_days = user_credentials[str(user_id)]['work_schedule'].get('days', DEFAULT_WORK_DAYS.copy())
-        work_hours = user_credentials[str(user_id)]['work_schedule'].get('hours', {})
+        work_days = user_credentials[str(user_id)]['work_schedule'].get('days', DEFAULT_WORK_DAYS)
+        # Edited in place by the hours handlers, so don't share the saved dict
+        work_hours = dict(user_credentials[str(user_id)]['work_schedule'].get('hours', {}))
     else:
         # For part-time custom, start with all weekdays enabled for selection
         work_days = {
@@ -2169,86 +2150,201 @@ async def start_part_time_custom(update: Update, context: ContextTypes.DEFAULT_T
     # Store in context for the conversation
     context.user_data['temp_work_days'] = work_days
     context.user_data['temp_work_hours'] = work_hours
-    context.user_data['is_part_time_custom'] = True
 
     # Show work days selection
     return await show_part_time_days_selection(update, context)
 
-async def show_part_time_days_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show the work days selection interface for part-time schedule."""
+async def show_part_time_days_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, notice: str = "") -> int:
+    """Show the work days selection interface for part-time schedule, optionally below a notice line."""
     query = update.callback_query
 
     # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
-
-    # Create keyboard with toggles for each day
-    keyboard = []
-    for day in ["Mon", "Tue", "Wed", "Thu", "Fri"]:  # Only weekdays for part-time
-        status = "✅" if work_days.get(day, False) else "❌"
-        keyboard.append([
-            InlineKeyboardButton(f"{day}: {status}", callback_data=f"toggle_day_{day}")
-        ])
-
-    # Add save and continue buttons
-    keyboard.append([
-        InlineKeyboardButton("✅ Continue to Set Hours", callback_data="save_part_time_days"),
-        InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")
-    ])
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS)
 
-    # Count selected days
-    selected_days = sum(1 for day, enabled in work_days.items() if day in ["Mon", "Tue", "Wed", "Thu", "Fri"] and enabled)
+    # Keyboard with toggles for each day (only weekdays for part-time)
+    selected = tuple(bool(work_days.get(day, False)) for day in TOGGLE_WORK_DAYS)
+    # Remembered for toggle_work_day(), which redraws the keyboard with the same Continue button
+    context.user_data['work_days_continue'] = "save_part_time_days"
+    reply_markup = _work_days_markup(selected, "save_part_time_days")
 
-    await query.edit_message_text(
-        f"Select your part-time work days (Monday-Friday):\n"
+    await edit_message_if_changed(
+        query,
+        f"{notice}Select your part-time work days (Monday-Friday):\n"
         f"(Click on a day to toggle it on/off)\n\n"
-        f"Selected days: {selected_days}/5\n"
         f"After selecting days, you'll be able to set specific hours for each day.",
-        reply_markup=reply_markup
+        reply_markup
     )
 
-    return SETTING_WORK_DAYS
+    return State.SETTING_WORK_DAYS
 
 async def save_part_time_days(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Save the selected part-time work days and proceed to hours setup."""
     query = update.callback_query
 
     # Get the temporary work days from context
-    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS.copy())
+    work_days = context.user_data.get('temp_work_days', DEFAULT_WORK_DAYS)
 
-    # Calculate selected days count (only weekdays)
-    selected_days_count = sum(1 for day, enabled in work_days.items()
-                             if day in ["Mon", "Tue", "Wed", "Thu", "Fri"] and enabled)
+    # Selected days in weekday order (only weekdays)
+    selected_days = [day for day in TOGGLE_WORK_DAYS if work_days.get(day, False)]
 
-    if selected_days_count == 0:
-        await query.edit_message_text(
-            "You must select at least one work day. Please try again."
-        )
-        return await show_part_time_days_selection(update, context)
+    if not selected_days:
+        return await show_part_time_days_selection(update, context, NO_WORK_DAYS_NOTICE)
 
     # Store selected days in context
-    context.user_data['selected_days'] = [day for day, enabled in work_days.items() if enabled]
-
-    # Show options for hours distribution
-    keyboard = [
-        [InlineKeyboardButton("⌛ Standard Part-Time (20h/week)", callback_data="hours_part_time")],
-        [InlineKeyboardButton("📝 Set Specific Hours per Day", callback_data="set_specific_hours")],
-        [InlineKeyboardButton("◀️ Back to Day Selection", callback_data="back_to_days")],
-        [InlineKeyboardButton("❌ Cancel", callback_data="cancel_work_schedule")]
-    ]
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    context.user_data['selected_days'] = selected_days
 
-    days_text = ", ".join([day for day, enabled in work_days.items() if enabled])
+    days_text = ", ".join(selected_days)
 
     await query.edit_message_text(
         f"You selected these work days: {days_text}\n\n"
         f"How would you like to set your work hours?",
-        reply_markup=reply_markup
+        reply_markup=PART_TIME_HOURS_MARKUP
     )
 
-    return SETTING_WORK_HOURS
+    return State.SETTING_WORK_HOURS
+
+# WebDriver endpoint of an already running chromedriver or Selenium server, if any
+SELENIUM_REMOTE_URL = os.getenv('SELENIUM_REMOTE_URL')
+
+# Chrome and chromedriver binaries, defaulting to Heroku's Chrome for Testing buildpack;
+# a remote WebDriver brings its own Chrome unless GOOGLE_CHROME_BIN says otherwise
+CHROME_BIN = os.getenv('GOOGLE_CHROME_BIN') or (
+    None if SELENIUM_REMOTE_URL else "/app/.chrome-for-testing/chrome-linux64/chrome"
+)
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH') or "/app/.chrome-for-testing/chromedriver-linux64/chromedriver"
+
+# Local chromedriver started once and shared by every pooled browser
+_chromedriver_service = None
+
+def chromedriver_url():
+    """Return the WebDriver endpoint, starting the shared local chromedriver on first use."""
+    global _chromedriver_service
+    if SELENIUM_REMOTE_URL:
+        return SELENIUM_REMOTE_URL
+    if _chromedriver_service is None:
+        logger.debug("Starting ChromeDriver %s for Chrome binary %s", CHROMEDRIVER_PATH, CHROME_BIN)
+        service = Service(executable_path=CHROMEDRIVER_PATH)
+        service.start()
+        _chromedriver_service = service
+    return _chromedriver_service.service_url
+
+def stop_chromedriver():
+    """Stop the shared local chromedriver, if it was started."""
+    global _chromedriver_service
+    if _chromedriver_service is not None:
+        _chromedriver_service.stop()
+        _chromedriver_service = None
+
+# Smallest /dev/shm Chrome is left to use for shared memory
+MIN_SHM_BYTES = 256 * 1024 * 1024
+
+def shm_too_small():
+    """Return True if /dev/shm is missing or too small for Chrome's shared memory."""
+    try:
+        return shutil.disk_usage("/dev/shm").total < MIN_SHM_BYTES
+    except OSError:
+        return True
+
+def create_chrome_driver():
+    """Start a headless Chrome configured for the Heroku Chrome for Testing buildpack."""
+    # Setup chrome options for Selenium
+    chrome_options = webdriver.ChromeOptions()
+    if CHROME_BIN:
+        chrome_options.binary_location = CHROME_BIN
+
+    chrome_options.add_argument("--headless=new")
+    if not SELENIUM_REMOTE_URL and shm_too_small():
+        # Fall back to /tmp for shared memory only where /dev/shm cannot hold the renderer
+        chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-background-networking")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+
+    # Open a session on the shared chromedriver instead of spawning one per browser; the
+    # Chromium connection adds the goog/cdp/execute command that plain Remote sessions lack
+    connection = ChromiumRemoteConnection(chromedriver_url(), vendor_prefix="goog", browser_name="chrome")
+    driver = webdriver.Remote(command_executor=connection, options=chrome_options)
+
+    # Skip media, fonts and trackers the login does not need; the block list stays with the tab
+    try:
+        driver.execute("executeCdpCommand", {"cmd": "Network.enable", "params": {}})
+        driver.execute("executeCdpCommand", {"cmd": "Network.setBlockedURLs", "params": {"urls": fetch_tokens.BLOCKED_URL_PATTERNS}})
+    except Exception as e:
+        logger.warning(f"Could not block unneeded requests in the browser: {e}")
+    return driver
+
+# Threads that run the blocking Selenium calls so the event loop keeps handling updates
+selenium_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SELENIUM_WORKERS', '2')), thread_name_prefix='selenium'
+)
+
+class DriverPool:
+    """Keeps a few headless Chrome sessions alive so logins skip the browser startup."""
+
+    def __init__(self, size=2, timeout=120):
+        self.size = size
+        self.timeout = timeout
+        self._idle = asyncio.Queue()
+        # One slot per driver in use, freed again by release() or discard()
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        """Return an idle driver, starting a new one when none is idle.
+
+        Waits at most ``timeout`` seconds for a free slot and raises asyncio.TimeoutError otherwise.
+        """
+        await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        if not self._idle.empty():
+            return self._idle.get_nowait()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(selenium_executor, create_chrome_driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    @staticmethod
+    def _reset(driver):
+        """Clear the previous user's cookies and storage and leave the driver on a blank page."""
+        driver.delete_all_cookies()
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        driver.get("about:blank")
+
+    @staticmethod
+    def _quit(driver):
+        """Quit a driver, logging instead of raising if the browser is already gone."""
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting browser: {e}")
+
+    async def release(self, driver):
+        """Clear the previous user's login state and put the driver back into the pool."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(selenium_executor, self._reset, driver)
+        except Exception as e:
+            logger.warning(f"Could not reset pooled browser, discarding it: {e}")
+            self.discard(driver)
+            return
+        self._idle.put_nowait(driver)
+        self._slots.release()
+
+    def discard(self, driver):
+        """Quit a driver and free its slot, so a waiting caller starts a fresh one."""
+        self._quit(driver)
+        self._slots.release()
+
+    def close(self):
+        """Quit all idle drivers and the shared chromedriver."""
+        while not self._idle.empty():
+            self._quit(self._idle.get_nowait())
+        stop_chromedriver()
+
+# Browsers used by the auto fetch tokens flow
+driver_pool = DriverPool(
+    size=int(os.getenv('CHROME_POOL_SIZE', '2')),
+    timeout=float(os.getenv('CHROME_POOL_TIMEOUT', '120')),
+)
 
 async def email_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle email input for auto fetch."""
@@ -2259,163 +2355,157 @@ async def email_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     context.user_data['email'] = email
 
     await update.message.reply_text("Please enter your Odoo password")
-    return WAITING_FOR_PASSWORD
-
-async def password_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle password input and auto fetch tokens."""
-    user_id = update.effective_user.id
-    password = update.message.text.strip()
+    return State.WAITING_FOR_PASSWORD
 
-    # Delete the password message for security
-    await update.message.delete()
+# Database name sent to /web/session/authenticate, defaults to the Odoo Online subdomain
+ODOO_DB = os.getenv('ODOO_DB')
 
-    # Get stored values
-    odoo_url = context.user_data.get('odoo_url')
-    email = context.user_data.get('email')
+# Log in through the Selenium browser pool instead of Odoo's JSON-RPC login endpoint
+SELENIUM_LOGIN = os.getenv('SELENIUM_LOGIN', '').lower() in ('1', 'true', 'yes')
 
-    # Send a processing message
-    processing_message = await update.message.reply_text("Fetching tokens from Odoo... This might take a moment.")
+class OdooLoginError(Exception):
+    """Raised when Odoo rejects a login; the message is shown to the user."""
 
+async def http_fetch_tokens(odoo_url, email, password):
+    """Log in with fetch_tokens.http_fetch_tokens() and return the session ID, CSRF token and uid."""
+    login = functools.partial(fetch_tokens.http_fetch_tokens, odoo_url, email, password, ODOO_DB, log=logger.info)
     try:
-        # Log environment variables for debugging
-        chrome_bin = os.environ.get("GOOGLE_CHROME_BIN")
-        chromedriver_path = os.environ.get("CHROMEDRIVER_PATH")
-        logger.info(f"Chrome binary path: {chrome_bin}")
-        logger.info(f"ChromeDriver path: {chromedriver_path}")
-
-        # Setup chrome options for Selenium
-        chrome_options = webdriver.ChromeOptions()
-
-        # Check if GOOGLE_CHROME_BIN is set, otherwise use default path for Heroku Chrome for Testing
-        if chrome_bin:
-            chrome_options.binary_location = chrome_bin
-        else:
-            # Use the default location for Chrome on Heroku's Chrome for Testing buildpack
-            chrome_options.binary_location = "/app/.chrome-for-testing/chrome-linux64/chrome"
-            logger.info("Using default Chrome binary location for Heroku Chrome for Testing")
+        tokens = await asyncio.get_running_loop().run_in_executor(None, login)
+    except fetch_tokens.OdooLoginError as e:
+        logger.info(f"Odoo login rejected: {e}")
+        raise OdooLoginError("Login failed. Please check your email and password and try again.") from e
+    return tokens["session_id"], tokens["csrf_token"], tokens["uid"]
+
+def login_outcome(driver):
+    """Wait condition returning ("error", element) or ("ok", element) once the login settles, else False."""
+    errors = driver.find_elements(By.CSS_SELECTOR, ".alert-danger, .o_error_message, .o_notification.o_notification_error")
+    if errors:
+        return "error", errors[0]
+    apps = driver.find_elements(By.CLASS_NAME, "o_app")
+    if apps:
+        return "ok", apps[0]
+    return False
 
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--no-sandbox")
+def _selenium_login(driver, odoo_url, email, password):
+    """Log in with the given browser and return the session ID and CSRF token; blocks the calling thread."""
+    # Navigate to the Odoo login page and wait for the login form
+    driver.get(odoo_url)
+    email_field = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "login")))
+
+    # Find and fill login fields
+    password_field = driver.find_element(By.ID, "password")
+
+    email_field.clear()
+    email_field.send_keys(email)
+
+    password_field.clear()
+    password_field.send_keys(password)
 
-        # Create a Service object with the chromedriver path
-        chrome_service = Service(executable_path=chromedriver_path or "/app/.chrome-for-testing/chromedriver-linux64/chromedriver")
+    # Click login button
+    login_button = driver.find_element(By.XPATH,
+                  "//button[@type='submit' and contains(@class, 'btn-primary')]")
+    login_button.click()
 
-        # Initialize the driver with the service
-        driver = webdriver.Chrome(service=chrome_service, options=chrome_options)
+    # Wait until either a login error or the dashboard shows up
+    try:
+        status, element = WebDriverWait(driver, 20).until(login_outcome)
+    except Exception:
+        # If we time out waiting for the dashboard, assume login failed
+        raise OdooLoginError("Login failed. Please check your email and password and try again.")
+
+    # If we found an error element, this means login failed
+    if status == "error":
+        error_text = element.text.strip()
+        if "password" in error_text.lower():
+            raise OdooLoginError("Wrong password. Please try again.")
+        raise OdooLoginError(f"Login failed: {error_text}")
+
+    # Get cookies for session ID
+    all_cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+    session_id = all_cookies.get('session_id')
+
+    # Get CSRF token from storage, the odoo namespace or the page source
+    try:
+        csrf_token = driver.execute_script(fetch_tokens.CSRF_LOOKUP_JS)
+    except Exception:
+        csrf_token = None
 
-        # Navigate to the Odoo login page
-        driver.get(odoo_url)
-        time.sleep(2)  # Wait for page to load
+    return session_id, csrf_token
 
-        # Find and fill login fields
-        email_field = driver.find_element(By.ID, "login")
-        password_field = driver.find_element(By.ID, "password")
+async def selenium_fetch_tokens(odoo_url, email, password):
+    """Log in with a pooled headless Chrome and return the session ID, CSRF token and uid (unknown, None)."""
+    # Borrow a warm browser from the pool
+    driver = await driver_pool.acquire()
+    try:
+        tokens = await asyncio.get_running_loop().run_in_executor(
+            selenium_executor, _selenium_login, driver, odoo_url, email, password
+        )
+    except OdooLoginError:
+        await driver_pool.release(driver)
+        raise
+    except Exception:
+        # The browser may be in an unknown state, so do not reuse it
+        driver_pool.discard(driver)
+        raise
 
-        email_field.clear()
-        email_field.send_keys(email)
+    # Return the browser to the pool
+    await driver_pool.release(driver)
+    return (*tokens, None)
+
+# User-facing messages for auto fetch failures, checked in order so subclasses come first
+AUTO_FETCH_ERROR_MESSAGES = (
+    (requests.Timeout, "Login timed out. Please try again later."),
+    (requests.RequestException, "Could not reach Odoo. Please try again later."),
+    (WebDriverTimeoutException, "Login timed out. Please check your credentials and try again."),
+    (NoSuchElementException, "Login page elements not found. The Odoo website structure may have changed."),
+    (WebDriverException, "Browser connection error. Please try again later."),
+    (asyncio.TimeoutError, "All login browsers are busy. Please try again later."),
+)
 
-        password_field.clear()
-        password_field.send_keys(password)
+def auto_fetch_error_message(error):
+    """Return the message shown to the user for an unexpected auto fetch failure."""
+    for error_type, message in AUTO_FETCH_ERROR_MESSAGES:
+        if isinstance(error, error_type):
+            return message
+    # For other errors, display a user-friendly message
+    return "Error fetching tokens. Please try manual credential entry."
 
-        # Click login button
-        login_button = driver.find_element(By.XPATH,
-                      "//button[@type='submit' and contains(@class, 'btn-primary')]")
-        login_button.click()
+async def password_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle password input and auto fetch tokens."""
+    user_id = update.effective_user.id
+    password = update.message.text.strip()
 
-        # Check for login error messages
-        try:
-            # Wait a short time for error message to appear if login failed
-            error_wait = WebDriverWait(driver, 5)
-            error_element = error_wait.until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, ".alert-danger, .o_error_message, .o_notification.o_notification_error")))
-
-            # If we found an error element, this means login failed
-            error_text = error_element.text.strip()
-            if "password" in error_text.lower():
-                error_message = "Wrong password. Please try again."
-            else:
-                error_message = f"Login failed: {error_text}"
+    # Delete the password message for security
+    await update.message.delete()
 
-            driver.quit()
+    # Get stored values
+    odoo_url = context.user_data.get('odoo_url')
+    email = context.user_data.get('email')
 
-            await context.bot.edit_message_text(
-                chat_id=update.effective_chat.id,
-                message_id=processing_message.message_id,
-                text=error_message
-            )
-            await show_menu_buttons(update, context)
-            return ConversationHandler.END
+    # Send a processing message
+    processing_message = await update.message.reply_text("Fetching tokens from Odoo... This might take a moment.")
 
-        except Exception:
-            # No error message found, continue with normal flow
-            pass
+    try:
+        fetch = selenium_fetch_tokens if SELENIUM_LOGIN else http_fetch_tokens
+        session_id, csrf_token, odoo_uid = await fetch(odoo_url, email, password)
 
-        # Wait for login to complete and dashboard to load
-        try:
-            wait = WebDriverWait(driver, 20)
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, "o_app")))
-        except Exception:
-            # If we time out waiting for the dashboard, assume login failed
-            driver.quit()
+        # Check if we successfully got the tokens
+        if not session_id or not csrf_token:
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
                 message_id=processing_message.message_id,
-                text="Login failed. Please check your email and password and try again."
+                text="Failed to fetch authentication tokens. Please try manual credential entry or check your login details."
             )
             await show_menu_buttons(update, context)
             return ConversationHandler.END
 
-        # Get cookies for session ID
-        all_cookies = driver.get_cookies()
-        session_id = None
-        for cookie in all_cookies:
-            if cookie['name'] == 'session_id':
-                session_id = cookie['value']
-                break
-
-        # Get CSRF token from various sources
-        csrf_token = None
-
-        # Method 1: From localStorage
-        try:
-            csrf_token = driver.execute_script("return localStorage.getItem('csrf_token');")
-        except:
-            pass
-
-        # Method 2: From page source
-        if not csrf_token:
-            try:
-                page_source = driver.page_source
-                csrf_match = re.search(r"csrf_token\s*:\s*['\"]([^'\"]+)['\"]", page_source)
-                if csrf_match:
-                    csrf_token = csrf_match.group(1)
-            except:
-                pass
-
-        # Method 3: From sessionStorage
-        if not csrf_token:
-            try:
-                csrf_token = driver.execute_script("return sessionStorage.getItem('csrf_token');")
-            except:
-                pass
-
-        # Method 4: From odoo namespace in window
-        if not csrf_token:
-            try:
-                csrf_token = driver.execute_script("return odoo.csrf_token;")
-            except:
-                pass
-
-        # Close the driver
-        driver.quit()
-
-        # Check if we successfully got the tokens
-        if not session_id or not csrf_token:
+        # The JSON-RPC login returns the user's uid, so the credentials are complete
+        if odoo_uid:
+            await save_user_credentials(user_id, session_id, csrf_token, odoo_uid)
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
                 message_id=processing_message.message_id,
-                text="Failed to fetch authentication tokens. Please try manual credential entry or check your login details."
+                text=f"Successfully fetched tokens for UID {odoo_uid}! Your credentials have been saved and you can now generate reports."
             )
             await show_menu_buttons(update, context)
             return ConversationHandler.END
@@ -2430,32 +2520,60 @@ async def password_input(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             message_id=processing_message.message_id,
             text="Successfully fetched tokens! Please enter your Odoo User ID (UID)."
         )
-        return WAITING_FOR_ODOO_UID
+        return State.WAITING_FOR_ODOO_UID
+
+    except OdooLoginError as e:
+        await context.bot.edit_message_text(
+            chat_id=update.effective_chat.id,
+            message_id=processing_message.message_id,
+            text=str(e)
+        )
+        await show_menu_buttons(update, context)
+        return ConversationHandler.END
 
     except Exception as e:
         logger.error(f"Error in auto fetch: {str(e)}", exc_info=True)
 
-        # Check for common authentication errors based on error message
-        error_message = str(e)
-        if "chrome not reachable" in error_message.lower():
-            user_message = "Browser connection error. Please try again later."
-        elif "no such element" in error_message.lower():
-            user_message = "Login page elements not found. The Odoo website structure may have changed."
-        elif "timeout" in error_message.lower():
-            user_message = "Login timed out. Please check your credentials and try again."
-        elif "invalid username or password" in error_message.lower() or "password" in error_message.lower():
-            user_message = "Invalid username or password. Please check your credentials and try again."
-        else:
-            # For other errors, display a user-friendly message
-            user_message = "Error fetching tokens. Please try manual credential entry."
-
         await context.bot.edit_message_text(
             chat_id=update.effective_chat.id,
             message_id=processing_message.message_id,
-            text=user_message
+            text=auto_fetch_error_message(e)
         )
         await show_menu_buttons(update, context)
         return ConversationHandler.END
 
+# Callback data -> handler(update, context) returning the next conversation state
+BUTTON_HANDLERS = {
+    "month": lambda update, context: start_report_task(update, context, plot_month=True),
+    "week": lambda update, context: start_report_task(update, context, plot_week=True),
+    "custom_month": prompt_custom_month,
+    "status": lambda update, context: start_report_task(update, context, status_only=True),
+    "auto_fetch_tokens": prompt_odoo_email,
+    "work_schedule": show_work_schedule_options,
+    "help": show_help_callback,
+    # Work schedule options
+    "full_time": lambda update, context: set_work_schedule(update, context, FULL_TIME),
+    "part_time_custom": start_part_time_custom,
+    "custom_schedule": start_custom_schedule,
+    "save_work_days": save_work_days,
+    "save_part_time_days": save_part_time_days,
+    "cancel_work_schedule": cancel_work_schedule,
+    # Work hours options
+    "hours_full_time": lambda update, context: set_hours_distribution(update, context, "hours_full_time"),
+    "hours_part_time": lambda update, context: set_hours_distribution(update, context, "hours_part_time"),
+    "hours_standard": lambda update, context: set_hours_distribution(update, context, "hours_part_time"),
+    "set_specific_hours": show_specific_hours_setup,
+    "set_all_hours": set_all_hours_at_once,
+    "save_specific_hours": save_specific_hours,
+    "back_to_days": show_work_days_selection,
+    "back_to_hours_selection": save_work_days,
+}
+
+# Callback data prefix -> handler(update, context, suffix)
+PREFIX_BUTTON_HANDLERS = (
+    ("toggle_day_", toggle_work_day),
+    ("edit_hours_", edit_day_hours),
+)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -7,49 +7,140 @@ from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
-import time
+import functools
 import json
 import re
 import argparse
 import platform
 import os
 import subprocess
+import time
+import requests
+from urllib.parse import urlparse
+
+
+# Requests blocked in Chrome, the login only needs Odoo's HTML, JS, CSS and XHR (also used by bot.py)
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.mp4",
+    "*.woff", "*.woff2", "*.ttf",
+    "*google-analytics*", "*googletagmanager*",
+]
+
+# CSRF token embedded in the Odoo web client page source
+CSRF_RE = re.compile(r"csrf_token\s*:\s*['\"]([^'\"]+)['\"]")
+
+# Looks the CSRF token up in the browser storages, the odoo namespace and the page source in one round trip
+CSRF_LOOKUP_JS = r"""
+    return localStorage.getItem('csrf_token')
+        || sessionStorage.getItem('csrf_token')
+        || (window.odoo && odoo.csrf_token)
+        || (document.documentElement.outerHTML.match(/csrf_token\s*:\s*['"]([^'"]+)['"]/) || [])[1]
+        || null;
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def chromedriver_path(os_type=None):
+    """Resolve the chromedriver binary through webdriver-manager once per os_type."""
+    manager = ChromeDriverManager(os_type=os_type) if os_type else ChromeDriverManager()
+    return manager.install()
+
+
+@functools.lru_cache(maxsize=1)
+def find_mac_chrome():
+    """Return the macOS Chrome binary, asking Spotlight via mdfind only if it is not in /Applications."""
+    chrome_path = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+    if os.path.exists(chrome_path):
+        return chrome_path
+    # Try to find Chrome using mdfind
+    try:
+        app_path = subprocess.check_output(
+            ["mdfind", "kMDItemCFBundleIdentifier == 'com.google.Chrome'"], 
+            text=True
+        ).strip().split("\n")[0]
+    except:
+        print("Warning: Could not find Chrome browser using mdfind")
+        return None
+    return os.path.join(app_path, "Contents/MacOS/Google Chrome") if app_path else None
 
 
-def perform_automation(url, email, password, browser, headless, full_automation):
+def wait_for_clickable(wait, *locators):
+    """Wait until any of the locators matches a clickable element and return that element."""
+    return wait.until(EC.any_of(*(EC.element_to_be_clickable(locator) for locator in locators)))
+
+
+class OdooLoginError(ValueError):
+    """Raised when Odoo rejects the email and password."""
+
+
+def http_fetch_tokens(url, email, password, db=None, log=print):
+    """
+    Log in through Odoo's JSON-RPC endpoint and return the session ID, CSRF token, the
+    user's uid and the cookies. Progress goes to log, the bot passes its logger here.
+    """
+    base_url = url.rstrip('/').removesuffix('/web')
+    # Odoo Online databases are named after their subdomain
+    db = db or urlparse(base_url).hostname.split('.')[0]
+
+    session = requests.Session()
+    log(f"Authenticating against {base_url} (database {db})...")
+    response = session.post(f"{base_url}/web/session/authenticate", timeout=30, json={
+        "jsonrpc": "2.0", "method": "call",
+        "params": {"db": db, "login": email, "password": password},
+    })
+    response.raise_for_status()
+    data = response.json()
+    error = data.get("error")
+    if error:
+        raise OdooLoginError(f"Login failed: {error.get('data', {}).get('message') or error.get('message')}")
+    log("Successfully logged in")
+
+    # The web client page carries the CSRF token for the new session
+    log("Retrieving session information...")
+    page = session.get(f"{base_url}/web", timeout=30)
+    csrf_match = CSRF_RE.search(page.text)
+    cookies = session.cookies.get_dict()
+    return {
+        "session_id": cookies.get("session_id"),
+        "csrf_token": csrf_match.group(1) if csrf_match else None,
+        "uid": (data.get("result") or {}).get("uid"),
+        "cookies": cookies,
+    }
+
+
+def browser_fetch_tokens(url, email, password, browser="chrome", headless=True, keep_browser=False):
+    """
+    Log in with a browser, download the attendance report and return the session ID,
+    CSRF token and cookies. With keep_browser the still open driver is returned under
+    "driver" and the caller has to quit it; otherwise the browser is closed.
+    """
     driver = None
-    print("Starting Odoo Login Automation...")
-    
     try:
         if browser == "chrome":
             # Setup Chrome options
             print("Setting up Chrome browser...")
             chrome_options = ChromeOptions()
             chrome_options.add_argument("--start-maximized")
+            chrome_options.add_argument("--disable-extensions")
+            chrome_options.add_argument("--disable-background-networking")
             if headless:
                 chrome_options.add_argument("--headless=new")
             
             # Check if running on macOS ARM architecture
             is_mac_arm = platform.system() == 'Darwin' and platform.machine().startswith('arm')
-            if is_mac_arm:
+            remote_url = os.environ.get("SELENIUM_REMOTE_URL")
+            if remote_url:
+                # Connect to an already running chromedriver or Selenium server
+                print(f"Connecting to remote WebDriver at {remote_url}")
+                driver = webdriver.Remote(command_executor=remote_url, options=chrome_options)
+            elif is_mac_arm:
                 print("Detected macOS ARM architecture")
                 # Try to find Chrome browser installed on the system
-                chrome_path = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
-                if not os.path.exists(chrome_path):
-                    # Try to find Chrome using mdfind
-                    try:
-                        chrome_path = subprocess.check_output(
-                            ["mdfind", "kMDItemCFBundleIdentifier == 'com.google.Chrome'"], 
-                            text=True
-                        ).strip().split("\n")[0]
-                        if chrome_path:
-                            chrome_path = os.path.join(chrome_path, "Contents/MacOS/Google Chrome")
-                    except:
-                        print("Warning: Could not find Chrome browser using mdfind")
-                
-                if os.path.exists(chrome_path):
+                chrome_path = find_mac_chrome()
+                if chrome_path and os.path.exists(chrome_path):
                     print(f"Using Chrome at: {chrome_path}")
                     chrome_options.binary_location = chrome_path
                 
@@ -60,20 +151,26 @@ def perform_automation(url, email, password, browser, headless, full_automation)
                     print(f"First attempt failed: {str(e)}")
                     print("Trying with webdriver-manager...")
                     try:
-                        driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), 
+                        driver = webdriver.Chrome(service=ChromeService(chromedriver_path()), 
                                                options=chrome_options)
                     except Exception as e2:
                         print(f"Second attempt failed: {str(e2)}")
                         print("Trying with ChromeDriverManager(os_type='mac_arm64')...")
                         # Try specifying os_type explicitly
                         driver = webdriver.Chrome(
-                            service=ChromeService(ChromeDriverManager(os_type="mac_arm64").install()),
+                            service=ChromeService(chromedriver_path("mac_arm64")),
                             options=chrome_options
                         )
             else:
                 # Initialize Chrome driver for non-ARM macOS or other platforms
-                driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), 
-                                        options=chrome_options)
+                try:
+                    # Selenium Manager reuses its cached driver without a network check
+                    driver = webdriver.Chrome(options=chrome_options)
+                except Exception as e:
+                    print(f"Selenium Manager failed: {str(e)}")
+                    print("Trying with webdriver-manager...")
+                    driver = webdriver.Chrome(service=ChromeService(chromedriver_path()), 
+                                            options=chrome_options)
         else:
             # Setup Firefox options
             print("Setting up Firefox browser...")
@@ -82,17 +179,30 @@ def perform_automation(url, email, password, browser, headless, full_automation)
                 firefox_options.add_argument("--headless")
             
             # Initialize Firefox driver
-            driver = webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()), 
-                                      options=firefox_options)
+            try:
+                # Selenium Manager reuses its cached driver without a network check
+                driver = webdriver.Firefox(options=firefox_options)
+            except Exception as e:
+                print(f"Selenium Manager failed: {str(e)}")
+                print("Trying with webdriver-manager...")
+                driver = webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()), 
+                                          options=firefox_options)
+        
+        # Skip media, fonts and trackers the login does not need (Chrome only)
+        if browser == "chrome":
+            try:
+                driver.execute_cdp_cmd("Network.enable", {})
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            except Exception as e:
+                print(f"Warning: Could not block unneeded requests: {str(e)}")
         
         # Navigate to the Odoo login page
         print(f"Navigating to {url}...")
         driver.get(url)
-        time.sleep(2)  # Wait for page to load
         
-        # Find and fill login fields
+        # Find and fill login fields once the form is there
         print("Filling login credentials...")
-        email_field = driver.find_element(By.ID, "login")
+        email_field = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "login")))
         password_field = driver.find_element(By.ID, "password")
         
         email_field.clear()
@@ -114,180 +224,137 @@ def perform_automation(url, email, password, browser, headless, full_automation)
         
         print("Successfully logged in")
         
-        if full_automation:
-            # Click on Attendance app
-            print("Looking for Attendance app...")
-            
-            # Try different methods to find the Attendance app
-            try:
-                # First try using the data-menu-xmlid attribute
-                attendance_app = wait.until(EC.element_to_be_clickable(
-                    (By.CSS_SELECTOR, "[data-menu-xmlid='hr_attendance.menu_hr_attendance_root']")))
-            except:
-                try:
-                    # Then try using the app name text
-                    attendance_app = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//div[contains(@class, 'o_caption') and text()='Attendances']/..")))
-                except:
-                    try:
-                        # Try by the img alt attribute
-                        attendance_app = wait.until(EC.element_to_be_clickable(
-                            (By.XPATH, "//img[contains(@alt, 'Attendance')]/parent::a")))
-                    except:
-                        # Last resort - find by the image source if it has specific content
-                        attendance_app = wait.until(EC.element_to_be_clickable(
-                            (By.XPATH, "//img[contains(@src, 'attendance')]/parent::a")))
-            
-            # Click on the Attendance app
-            attendance_app.click()
-            print("Opened Attendance")
-            time.sleep(2)
-            
-            # Click on Reporting
-            print("Looking for Reporting menu...")
-            try:
-                # Try with data-menu-xmlid
-                reporting_menu = wait.until(EC.element_to_be_clickable(
-                    (By.CSS_SELECTOR, "[data-menu-xmlid='hr_attendance.menu_hr_attendance_reporting']")))
-            except:
-                try:
-                    # Try with text
-                    reporting_menu = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//a[contains(text(), 'Reporting')]")))
-                except:
-                    # Try with class and text
-                    reporting_menu = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//a[contains(@class, 'dropdown-item') and contains(text(), 'Reporting')]")))
-            
-            reporting_menu.click()
-            print("Opened Reporting")
-            time.sleep(2)
-            
-            # Click on Pivot View
-            print("Looking for Pivot view button...")
-            try:
-                # Try with class
-                pivot_button = wait.until(EC.element_to_be_clickable(
-                    (By.CSS_SELECTOR, ".oi-view-pivot")))
-            except:
-                try:
-                    # Try with icon class
-                    pivot_button = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//i[contains(@class, 'view-pivot')]")))
-                except:
-                    # Try with button text
-                    pivot_button = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//button[contains(@data-tooltip, 'Pivot')]")))
-            
-            pivot_button.click()
-            print("Switched to Pivot view")
-            time.sleep(2)
-            
-            # Click on Download button
-            print("Looking for Download button...")
-            try:
-                # Try with class
-                download_button = wait.until(EC.element_to_be_clickable(
-                    (By.CSS_SELECTOR, ".o_pivot_download")))
-            except:
-                try:
-                    # Try with icon and class
-                    download_button = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//button[contains(@class, 'fa-download') and contains(@class, 'o_pivot_download')]")))
-                except:
-                    # Try with aria-label
-                    download_button = wait.until(EC.element_to_be_clickable(
-                        (By.XPATH, "//button[@aria-label='Download xlsx']")))
-            
-            download_button.click()
-            print("XLSX file downloading...")
-            time.sleep(3)  # Wait for download to start
+        # Click on Attendance app
+        print("Looking for Attendance app...")
         
-        # Get CSRF token and Session ID
-        print("Retrieving session information...")
+        # Try different methods to find the Attendance app at once: the data-menu-xmlid
+        # attribute, the app name text, the img alt attribute and the image source
+        attendance_app = wait_for_clickable(wait,
+            (By.CSS_SELECTOR, "[data-menu-xmlid='hr_attendance.menu_hr_attendance_root']"),
+            (By.XPATH, "//div[contains(@class, 'o_caption') and text()='Attendances']/.."),
+            (By.XPATH, "//img[contains(@alt, 'Attendance')]/parent::a"),
+            (By.XPATH, "//img[contains(@src, 'attendance')]/parent::a"))
         
-        # Get cookies for session ID
-        all_cookies = driver.get_cookies()
-        session_id = None
-        for cookie in all_cookies:
-            if cookie['name'] == 'session_id':
-                session_id = cookie['value']
-                break
+        # Click on the Attendance app
+        attendance_app.click()
+        print("Opened Attendance")
         
-        # Get CSRF token from page source or localStorage
-        csrf_token = None
+        # Click on Reporting, found by data-menu-xmlid, text or class and text
+        print("Looking for Reporting menu...")
+        reporting_menu = wait_for_clickable(wait,
+            (By.CSS_SELECTOR, "[data-menu-xmlid='hr_attendance.menu_hr_attendance_reporting']"),
+            (By.XPATH, "//a[contains(text(), 'Reporting')]"),
+            (By.XPATH, "//a[contains(@class, 'dropdown-item') and contains(text(), 'Reporting')]"))
         
-        # Method 1: From localStorage
-        try:
-            csrf_token = driver.execute_script("return localStorage.getItem('csrf_token');")
-        except:
-            pass
+        reporting_menu.click()
+        print("Opened Reporting")
         
-        # Method 2: From page source
-        if not csrf_token:
-            try:
-                page_source = driver.page_source
-                csrf_match = re.search(r"csrf_token\s*:\s*['\"]([^'\"]+)['\"]", page_source)
-                if csrf_match:
-                    csrf_token = csrf_match.group(1)
-            except:
-                pass
+        # Click on Pivot View, found by class, icon class or button tooltip
+        print("Looking for Pivot view button...")
+        pivot_button = wait_for_clickable(wait,
+            (By.CSS_SELECTOR, ".oi-view-pivot"),
+            (By.XPATH, "//i[contains(@class, 'view-pivot')]"),
+            (By.XPATH, "//button[contains(@data-tooltip, 'Pivot')]"))
         
-        # Method 3: From sessionStorage
-        if not csrf_token:
-            try:
-                csrf_token = driver.execute_script("return sessionStorage.getItem('csrf_token');")
-            except:
-                pass
-                
-        # Method 4: From odoo namespace in window
-        if not csrf_token:
-            try:
-                csrf_token = driver.execute_script("return odoo.csrf_token;")
-            except:
-                pass
+        pivot_button.click()
+        print("Switched to Pivot view")
         
-        # Display token information
-        print("\n---- Session Information ----")
-        if session_id:
-            print(f"Session ID: {session_id}")
-        else:
-            print("Session ID: Not found")
-            
-        if csrf_token:
-            print(f"CSRF Token: {csrf_token}")
-        else:
-            print("CSRF Token: Not found")
+        # Click on Download button, found by class, icon and class or aria-label
+        print("Looking for Download button...")
+        download_button = wait_for_clickable(wait,
+            (By.CSS_SELECTOR, ".o_pivot_download"),
+            (By.XPATH, "//button[contains(@class, 'fa-download') and contains(@class, 'o_pivot_download')]"),
+            (By.XPATH, "//button[@aria-label='Download xlsx']"))
         
-        print("\nAll Cookies:")
-        for cookie in all_cookies:
-            print(f"{cookie['name']}: {cookie['value']}")
+        download_dir = os.path.expanduser("~/Downloads")
+        existing_files = set(os.listdir(download_dir)) if os.path.isdir(download_dir) else set()
+        download_button.click()
+        print("XLSX file downloading...")
         
-        # Ask user if they want to keep the browser open
-        if not headless:
-            user_input = input("\nKeep browser open? (y/n): ")
-            if user_input.lower() != 'y':
-                driver.quit()
-                print("Browser closed.")
-            else:
-                print("Browser remains open. Script complete.")
-                print("Press Ctrl+C to exit the script and close the browser.")
-                try:
-                    while True:
-                        time.sleep(1)
-                except KeyboardInterrupt:
-                    driver.quit()
-                    print("\nBrowser closed.")
-        else:
-            driver.quit()
-            print("Headless browser closed.")
+        # Wait for the finished file instead of a fixed delay
+        try:
+            WebDriverWait(driver, 30).until(lambda d: any(
+                name.endswith(".xlsx") and name not in existing_files for name in os.listdir(download_dir)))
+            print("XLSX file downloaded")
+        except Exception:
+            print(f"Warning: Could not confirm the download in {download_dir}")
         
+        # Get CSRF token and Session ID
+        print("Retrieving session information...")
+        
+        # Get cookies for session ID
+        all_cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+        session_id = all_cookies.get('session_id')
+        
+        # Get CSRF token from storage, the odoo namespace or the page source in one call
+        try:
+            csrf_token = driver.execute_script(CSRF_LOOKUP_JS)
+        except WebDriverException:
+            csrf_token = None
+        
+        if keep_browser:
+            return {"session_id": session_id, "csrf_token": csrf_token, "cookies": all_cookies, "driver": driver}
+        return {"session_id": session_id, "csrf_token": csrf_token, "cookies": all_cookies}
+    except Exception:
+        keep_browser = False
+        raise
+    finally:
+        if driver and not keep_browser:
+            driver.quit()
+
+
+def fetch_tokens(url, email, password, browser="chrome", headless=True, full_automation=False, db=None,
+                 keep_browser=False):
+    """
+    Log in to Odoo and return a dict with "session_id", "csrf_token" and "cookies", plus
+    "uid" for the HTTP login.
+    Never prompts, so it can also run in a worker thread. Only the full automation,
+    which downloads the attendance XLSX, needs a real browser.
+    """
+    if not full_automation:
+        return http_fetch_tokens(url, email, password, db)
+    return browser_fetch_tokens(url, email, password, browser, headless, keep_browser)
+
+
+def perform_automation(url, email, password, browser, headless, full_automation, db=None):
+    """Command line front end: fetch the tokens, print them and ask whether to keep a visible browser open."""
+    print("Starting Odoo Login Automation..." if full_automation else "Starting Odoo HTTP Login...")
+    keep_browser = full_automation and not headless
+    try:
+        tokens = fetch_tokens(url, email, password, browser, headless, full_automation, db, keep_browser)
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-        if driver:
-            driver.quit()
         return False
-        
+
+    # Display token information
+    print("\n---- Session Information ----")
+    print(f"Session ID: {tokens['session_id'] or 'Not found'}")
+    print(f"CSRF Token: {tokens['csrf_token'] or 'Not found'}")
+    print(f"UID: {tokens.get('uid') or 'Not found'}")
+
+    print("\nAll Cookies:")
+    for name, value in tokens["cookies"].items():
+        print(f"{name}: {value}")
+
+    # Ask user if they want to keep the browser open
+    driver = tokens.get("driver")
+    if driver:
+        user_input = input("\nKeep browser open? (y/n): ")
+        if user_input.lower() != 'y':
+            driver.quit()
+            print("Browser closed.")
+        else:
+            print("Browser remains open. Script complete.")
+            print("Press Ctrl+C to exit the script and close the browser.")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                driver.quit()
+                print("\nBrowser closed.")
+    elif full_automation:
+        print("Headless browser closed." if headless else "Browser closed.")
+
     return True
 
 
@@ -304,10 +371,20 @@ if __name__ == "__main__":
                         help='Browser to use (default: chrome)')
     parser.add_argument('--no-headless', action='store_true',
                         help='Run in visible browser mode (not headless)')
-    parser.add_argument('--no-automation', action='store_true',
-                        help='Skip full automation workflow')
+    parser.add_argument('--full-automation', action='store_true',
+                        help='Log in with a browser and download the attendance report (default: HTTP login only)')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Odoo database name (default: the URL subdomain)')
+    # Deprecated: skipping the browser workflow is the default now, kept so existing scripts still run
+    parser.add_argument('--no-automation', action='store_true', help=argparse.SUPPRESS)
     
     args = parser.parse_args()
+    if args.no_automation:
+        if args.full_automation:
+            parser.error("--no-automation and --full-automation cannot be combined")
+        print("Note: --no-automation is deprecated, the HTTP login without a browser is the default now.")
+    if args.no_headless and not args.full_automation:
+        parser.error("--no-headless only applies to --full-automation, the HTTP login does not open a browser")
     
     perform_automation(
         url=args.url,
@@ -315,5 +392,6 @@ if __name__ == "__main__":
         password=args.password,
         browser=args.browser,
         headless=not args.no_headless,  # Run headless by default
-        full_automation=not args.no_automation
+        full_automation=args.full_automation,
+        db=args.db
     )
\ No newline at end of file
@@ -1,14 +1,33 @@
 import pandas as pd
+import matplotlib
+
+# Use the non-interactive backend when imported by the bot; the CLI keeps the default so plt.show() still works
+# unless it is run with --no-show
+if __name__ != "__main__":
+    matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 import argparse
+import io
+import asyncio
 import datetime
 import calendar
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dateutil.relativedelta import relativedelta
 import math
+import logging
+import os
+import json
+import re
+import stat
+import time
 
 # These variables will be set by the bot when a user requests a report
 SESSION_ID = ""  # Will be populated from user credentials in the bot
@@ -27,8 +46,13 @@ EXPECTED_HOURS_BY_DAY = {
 # Specify your Bundesland here (e.g., "BB" for Brandenburg, "BE" for Berlin)
 MY_BUNDESLAND = "BB"  # Brandenburg
 
+logger = logging.getLogger(__name__)
+
 ATTENDANCE_FILENAME = "Anwesenheit (hr.attendance).xlsx"
 LEAVE_FILENAME = "Abwesenheiten (hr.leave).xlsx"
+# Export columns the report reads, the others are not parsed
+ATTENDANCE_COLUMNS = ["Einchecken", "Auschecken", "Arbeitsstunden"]
+LEAVE_COLUMNS = ["Abwesenheitstyp", "Startdatum", "Enddatum", "Status"]
 
 # Define leave types
 WEEKDAY_KEYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
@@ -41,6 +65,50 @@ HOLIDAYS_ICS_LINK = "https://www.feiertage-deutschland.de/kalender-download/ics/
 
 Holiday = namedtuple("Holiday", "summary date is_yearly")
 
+# How long the downloaded ICS file and the parsed holidays are reused before being refreshed
+HOLIDAYS_ICS_MAX_AGE = datetime.timedelta(days=1)
+HOLIDAYS_CACHE_MAX_AGE = datetime.timedelta(days=7)
+
+# User-owned directory for the downloaded and parsed holiday data
+CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "odoo-time-tracker"
+)
+
+# Parsed holiday windows of this process: (bundesland, year) -> (expiry timestamp, holidays)
+HOLIDAYS_MEMORY_CACHE = {}
+
+# Fields read from each VEVENT of the holidays ICS file, matched one stripped line at a time
+ICS_FIELD_RE = re.compile(r"(SUMMARY|LOCATION|DTSTART|RRULE)(?:;[^:]*)?:(.*)")
+
+# Shared keep-alive HTTP session, reused for the synchronous Odoo exports and holiday downloads
+HTTP = requests.Session()
+HTTP.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        # The Odoo export POSTs only read data, so they are as safe to retry as the GETs
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+        ),
+    ),
+)
+
+# Background thread for the holiday lookup, which main() runs while the Odoo exports are pulled and parsed
+HOLIDAYS_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# Odoo endpoint used for both the attendance and the leave export
+ODOO_EXPORT_URL = "https://perinet.odoo.com/web/export/xlsx"
+
+# Browser headers that httpx sets itself or that are not allowed over HTTP/2
+ASYNC_SKIP_HEADERS = {"Host", "Content-Length", "Connection", "Accept-Encoding"}
+
+# Odoo session IDs are long ASCII alphanumeric strings
+SESSION_ID_RE = re.compile(r"[A-Za-z0-9]{20,}")
+
 # -------------------- Added Half-Day Configuration --------------------
 # List of dates considered as half days. Format: 'YYYY-MM-DD'
 HALF_DAY_LIST = [
@@ -49,18 +117,18 @@ HALF_DAY_LIST = [
 ]
 # -----------------------------------------------------------------------
 
-def pull_attendance_leave_lists():
+def build_export_requests():
     """
-    Downloads the attendance and leave Excel files from the specified web service.
-    The files are saved as ATTENDANCE_FILENAME and LEAVE_FILENAME in the current directory.
+    Validates the Odoo credentials and builds the headers and multipart payloads
+    for the attendance and leave exports.
 
-    Requires SESSION_ID and CSRF_TOKEN to be correctly set.
+    Returns a (headers, payload_attendance, payload_leave) tuple.
     """
     # Validate credentials before making API calls
     if not SESSION_ID or not CSRF_TOKEN or not UID:
         raise ValueError("Missing credentials: SESSION_ID, CSRF_TOKEN, and UID must be set")
     
-    if len(SESSION_ID) < 20 or not SESSION_ID.isalnum():
+    if not SESSION_ID_RE.fullmatch(SESSION_ID):
         raise ValueError("Invalid SESSION_ID format. Session IDs are typically long alphanumeric strings.")
     
     if len(CSRF_TOKEN) < 20:
@@ -123,37 +191,76 @@ Content-Disposition: form-data; name="csrf_token"
 --BOUNDARY--"""
     )
 
-    r = requests.post(
-        "https://perinet.odoo.com/web/export/xlsx",
-        headers=headers,
-        data=payload_attendance,
-    )
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 401 or e.response.status_code == 403:
-            raise ValueError("Authentication failed. Your session ID or CSRF token has expired or is invalid. Please update your credentials.")
-        else:
-            raise ValueError(f"HTTP error when downloading attendance data: {e.response.status_code}. Your session may have expired.")
-    
-    with open(ATTENDANCE_FILENAME, "wb") as file:
-        file.write(r.content)
-    print(f"ATTENDANCE FINISHED WITH STATUS {r.status_code}")
-    
-    r = requests.post(
-        "https://perinet.odoo.com/web/export/xlsx", headers=headers, data=payload_leave
+    return headers, payload_attendance, payload_leave
+
+
+def check_export_status(status_code, export_name):
+    """Raises a ValueError with a user-facing message if an Odoo export request failed."""
+    if status_code < 400:
+        return
+    if status_code == 401 or status_code == 403:
+        raise ValueError("Authentication failed. Your session ID or CSRF token has expired or is invalid. Please update your credentials.")
+    raise ValueError(f"HTTP error when downloading {export_name} data: {status_code}. Your session may have expired.")
+
+
+def pull_attendance_leave_lists():
+    """
+    Downloads the attendance and leave Excel files from the specified web service.
+    The files are saved as ATTENDANCE_FILENAME and LEAVE_FILENAME in the current directory.
+
+    Requires SESSION_ID and CSRF_TOKEN to be correctly set.
+    """
+    headers, payload_attendance, payload_leave = build_export_requests()
+
+    def download(payload, export_name, filename):
+        # Streamed to disk in chunks instead of buffering the whole workbook in memory
+        with HTTP.post(ODOO_EXPORT_URL, headers=headers, data=payload, stream=True) as r:
+            check_export_status(r.status_code, export_name)
+            with open(f"{filename}.part", "wb") as file:
+                for chunk in r.iter_content(chunk_size=65536):
+                    file.write(chunk)
+        os.replace(f"{filename}.part", filename)
+        logger.info(f"{export_name.upper()} FINISHED WITH STATUS {r.status_code}")
+
+    # Both exports are independent, so download them concurrently over the shared session
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        downloads = [
+            pool.submit(download, payload_attendance, "attendance", ATTENDANCE_FILENAME),
+            pool.submit(download, payload_leave, "leave", LEAVE_FILENAME),
+        ]
+        # Raise the attendance error first, as the sequential version did
+        for future in downloads:
+            future.result()
+
+
+async def pull_attendance_leave_lists_async(client):
+    """
+    Async variant of pull_attendance_leave_lists() using a shared httpx.AsyncClient.
+    Both exports are requested concurrently so they can be multiplexed over a
+    single HTTP/2 connection instead of blocking the caller's event loop.
+    """
+    headers, payload_attendance, payload_leave = build_export_requests()
+    headers = {key: value for key, value in headers.items() if key not in ASYNC_SKIP_HEADERS}
+
+    async def download(payload, export_name, filename):
+        # Streamed to disk in chunks instead of buffering the whole workbook in memory
+        async with client.stream("POST", ODOO_EXPORT_URL, headers=headers, content=payload) as r:
+            check_export_status(r.status_code, export_name)
+            with open(f"{filename}.part", "wb") as file:
+                async for chunk in r.aiter_bytes(chunk_size=65536):
+                    file.write(chunk)
+        os.replace(f"{filename}.part", filename)
+        logger.info(f"{export_name.upper()} FINISHED WITH STATUS {r.status_code}")
+
+    results = await asyncio.gather(
+        download(payload_attendance, "attendance", ATTENDANCE_FILENAME),
+        download(payload_leave, "leave", LEAVE_FILENAME),
+        return_exceptions=True,
     )
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 401 or e.response.status_code == 403:
-            raise ValueError("Authentication failed. Your session ID or CSRF token has expired or is invalid. Please update your credentials.")
-        else:
-            raise ValueError(f"HTTP error when downloading leave data: {e.response.status_code}. Your session may have expired.")
-    
-    with open(LEAVE_FILENAME, "wb") as file:
-        file.write(r.content)
-    print(f"LEAVE FINISHED WITH STATUS {r.status_code}")
+    # Raise the attendance error first, as the sequential version did
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
 
 
 def load_attendance_data(file_path, start_date, end_date):
@@ -170,55 +277,167 @@ def load_attendance_data(file_path, start_date, end_date):
     """
     try:
         # Try with openpyxl engine first
-        print(f"Attempting to read attendance file: {file_path}")
-        df = pd.read_excel(file_path, parse_dates=["Einchecken", "Auschecken"], engine='openpyxl')
+        logger.info(f"Attempting to read attendance file: {file_path}")
+        df = pd.read_excel(file_path, usecols=ATTENDANCE_COLUMNS, parse_dates=["Einchecken", "Auschecken"], engine='openpyxl')
     except ValueError as e:
         if "Excel file format cannot be determined" in str(e):
-            print("Excel format couldn't be determined with openpyxl, trying xlrd engine...")
+            logger.info("Excel format couldn't be determined with openpyxl, trying xlrd engine...")
             try:
-                df = pd.read_excel(file_path, parse_dates=["Einchecken", "Auschecken"], engine='xlrd')
+                df = pd.read_excel(file_path, usecols=ATTENDANCE_COLUMNS, parse_dates=["Einchecken", "Auschecken"], engine='xlrd')
             except Exception as e2:
-                print(f"Failed with xlrd engine too: {str(e2)}")
-                print(
+                logger.warning(f"Failed with xlrd engine too: {str(e2)}")
+                logger.warning(
                     "Couldn't read the attendance excel file. Maybe it wasn't downloaded correctly. This can happen if your login and CSRF token are invalid or outdated."
                 )
                 # Instead of exiting, let's raise a more descriptive error
                 raise ValueError("Failed to read Excel file. Your session ID or CSRF token may be invalid or expired. Please update your credentials using the /credentials command.") from e
         elif "File is not a zip file" in str(e) or "Zip file structure" in str(e):
-            print("Invalid Excel file format. This typically happens when credentials are expired or invalid.")
+            logger.warning("Invalid Excel file format. This typically happens when credentials are expired or invalid.")
             raise ValueError("Your session ID or CSRF token has expired or is invalid. Please update your credentials using the /credentials command.") from e
         else:
             raise
 
     # Fill NaN values with current time for the 'Auschecken' column
-    df["Auschecken"] = df["Auschecken"].fillna(datetime.datetime.now())
+    df["Auschecken"] = df["Auschecken"].fillna(pd.Timestamp.now())
 
-    # Select only the desired timespan
-    df = df[
-        (df["Einchecken"] >= pd.Timestamp(start_date))
-        & (df["Einchecken"] <= pd.Timestamp(end_date + datetime.timedelta(days=1)))
-    ]
+    # Select only the desired timespan, building the mask in place on the raw check-in times
+    check_in = df["Einchecken"].to_numpy()
+    in_timespan = check_in >= pd.Timestamp(start_date).to_datetime64()
+    in_timespan &= check_in <= pd.Timestamp(end_date + datetime.timedelta(days=1)).to_datetime64()
+    df = df[in_timespan]
     return df
 
 
-def get_holidays_in_daterange(bundesland, start_date, end_date):
+def private_cache_dir():
     """
-    Fetches and parses holidays from an ICS file within a specified date range and Bundesland.
+    Returns CACHE_DIR, creating it if needed. Refuses a directory that is not a real directory
+    owned by and private to the current user, so other local users cannot plant cache files.
+    """
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    info = os.lstat(CACHE_DIR)
+    if not stat.S_ISDIR(info.st_mode) or (
+        hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o077)
+    ):
+        raise OSError(f"Cache directory {CACHE_DIR} is not private to the current user")
+    return CACHE_DIR
+
+
+def refresh_holidays_ics(cache_path):
+    """
+    Streams HOLIDAYS_ICS_LINK into cache_path unless the cached copy is younger than
+    HOLIDAYS_ICS_MAX_AGE. A failed download keeps using an older copy if there is one.
+
+    Args:
+        cache_path (str): Path of the cached ICS file.
+    """
+    try:
+        if time.time() - os.path.getmtime(cache_path) < HOLIDAYS_ICS_MAX_AGE.total_seconds():
+            return
+    except OSError:
+        pass
+
+    # Written under a per-process name and renamed once complete, so readers never see a partial file
+    partial_path = f"{cache_path}.{os.getpid()}"
+    try:
+        with HTTP.get(HOLIDAYS_ICS_LINK, stream=True) as r, open(partial_path, "w", encoding="utf-8") as file:
+            r.raise_for_status()
+            # Decode like r.text would, the cache copy is always stored as UTF-8
+            r.encoding = r.encoding or "utf-8"
+            for chunk in r.iter_content(chunk_size=65536, decode_unicode=True):
+                file.write(chunk)
+        os.replace(partial_path, cache_path)
+    except (requests.RequestException, OSError) as e:
+        if not os.path.exists(cache_path):
+            raise
+        logger.warning(f"Could not refresh the holidays ICS file, using the older cached copy: {e}")
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def ics_events(lines):
+    """
+    Yields the SUMMARY, LOCATION, DTSTART and RRULE fields of each VEVENT, one line at a time.
+
+    Args:
+        lines (iterable of str): Lines of an ICS file.
+
+    Returns:
+        generator of dict: Field name to stripped value, per event.
+    """
+    fields = None
+    for line in lines:
+        line = line.strip()
+        if line == "BEGIN:VEVENT":
+            fields = {}
+        elif line.startswith("END:VEVENT"):
+            if fields is not None:
+                yield fields
+            fields = None
+        elif fields is not None:
+            match = ICS_FIELD_RE.fullmatch(line)
+            if match:
+                fields[match.group(1)] = match.group(2).strip()
+
+
+def holidays_ics_events():
+    """
+    Yields the events of the holidays ICS file. The file is kept as a single holidays.ics in
+    CACHE_DIR (see refresh_holidays_ics()) and read line by line, so the feed is never held in
+    memory as a whole. Without a usable CACHE_DIR the download is parsed while it streams in.
+    """
+    try:
+        cache_dir = private_cache_dir()
+    except OSError as e:
+        logger.warning(f"Holidays are not cached: {e}")
+        with HTTP.get(HOLIDAYS_ICS_LINK, stream=True) as r:
+            r.raise_for_status()
+            r.encoding = r.encoding or "utf-8"
+            yield from ics_events(r.iter_lines(decode_unicode=True))
+        return
+
+    cache_path = os.path.join(cache_dir, "holidays.ics")
+    refresh_holidays_ics(cache_path)
+    with open(cache_path, encoding="utf-8", errors="replace") as file:
+        yield from ics_events(file)
+
+
+def holidays_in_year_window(bundesland, current_year):
+    """
+    Parses the holidays of a Bundesland for the year before, of and after current_year from
+    the holidays ICS file. The result is kept in memory and as JSON in CACHE_DIR for up to
+    HOLIDAYS_CACHE_MAX_AGE, so later reports (also from other processes) skip the download and
+    parsing.
 
     Args:
         bundesland (str): Bundesland abbreviation (e.g., "BB" for Brandenburg).
-        start_date (datetime.date): Start date of the range.
-        end_date (datetime.date): End date of the range.
+        current_year (int): Middle year of the three-year window.
 
     Returns:
-        list of Holiday: List of holidays within the date range.
+        tuple of Holiday: Holidays within the three-year window, sorted by date.
     """
-    r = requests.get(HOLIDAYS_ICS_LINK)
-    r.raise_for_status()
+    cache_key = (bundesland.upper(), current_year)
+    expires_at, holidays = HOLIDAYS_MEMORY_CACHE.get(cache_key, (0, None))
+    if time.time() < expires_at:
+        return holidays
+
+    max_age = HOLIDAYS_CACHE_MAX_AGE.total_seconds()
+    cache_name = f"holidays-{cache_key[0]}-{current_year}.json"
+    try:
+        cache_path = os.path.join(private_cache_dir(), cache_name)
+        modified = os.path.getmtime(cache_path)
+        if time.time() - modified < max_age:
+            with open(cache_path, encoding="utf-8") as file:
+                holidays = tuple(
+                    Holiday(summary, datetime.date.fromisoformat(date), is_yearly)
+                    for summary, date, is_yearly in json.load(file)
+                )
+            HOLIDAYS_MEMORY_CACHE[cache_key] = (modified + max_age, holidays)
+            return holidays
+    except (OSError, ValueError, TypeError):
+        pass
 
     holidays = []
-    this_holiday = [None, None, False]
-    is_fitting_holiday = False
 
     # Normalize Bundesland
     bundesland_full_names = {
@@ -242,59 +461,77 @@ def get_holidays_in_daterange(bundesland, start_date, end_date):
     bundesland_normalized = bundesland_full_names.get(bundesland.upper(), bundesland.lower())
 
     # Define the three-year window: last year, this year, next year
-    current_year = end_date.year
     years_to_include = {current_year - 1, current_year, current_year + 1}
 
-    for line in r.text.split("\n"):
-        line = line.strip()
-        if line.startswith("BEGIN:VEVENT"):
-            this_holiday = [None, None, False]
-            is_fitting_holiday = False  # Reset for new event
-        elif line.startswith("LOCATION:"):
-            location = line[len("LOCATION:") :].strip().lower()
-            # Check if the holiday applies to the specified Bundesland or all
-            if bundesland_normalized in location or "alle bundesländer" in location:
-                is_fitting_holiday = True
-        elif line.startswith("SUMMARY:"):
-            this_holiday[0] = line[len("SUMMARY:") :].strip()
-        elif line.startswith("DTSTART"):
-            # Handle different DTSTART formats
-            if line.startswith("DTSTART;VALUE=DATE:"):
-                dateval = line[len("DTSTART;VALUE=DATE:") :].strip()
-            else:
-                # Handle datetime DTSTART if present
-                dateval = line[len("DTSTART:") :].strip()[:8]  # Extract YYYYMMDD
-            try:
-                year = int(dateval[0:4])
-                month = int(dateval[4:6])
-                day = int(dateval[6:8])
-                this_holiday[1] = datetime.date(year, month, day)
-            except ValueError:
-                print(f"Invalid date format in DTSTART: {dateval}")
-                continue
-        elif line.startswith("RRULE:FREQ=YEARLY"):
-            this_holiday[2] = True
-        elif line.startswith("END:VEVENT"):
-            if is_fitting_holiday and this_holiday[1]:
-                if this_holiday[2]:
-                    # Generate holiday instances for last, current, and next year
-                    for year in years_to_include:
-                        try:
-                            new_exact_date = datetime.date(
-                                year, this_holiday[1].month, this_holiday[1].day
-                            )
-                            holidays.append(
-                                Holiday(this_holiday[0], new_exact_date, this_holiday[2])
-                            )
-                        except ValueError:
-                            # Handle invalid dates like February 29th on non-leap years
-                            continue
-                else:
-                    holidays.append(Holiday(*this_holiday))
-
-    # Filter holidays within the date range
-    in_daterange = lambda d: start_date <= d.date and d.date <= end_date
-    return list(filter(in_daterange, holidays))
+    for fields in holidays_ics_events():
+
+        # Check if the holiday applies to the specified Bundesland or all
+        location = fields.get("LOCATION", "").lower()
+        if not (bundesland_normalized in location or "alle bundesländer" in location):
+            continue
+
+        # Both DTSTART;VALUE=DATE and datetime DTSTART values start with YYYYMMDD
+        dateval = fields.get("DTSTART", "")[:8]
+        try:
+            date = datetime.date(int(dateval[0:4]), int(dateval[4:6]), int(dateval[6:8]))
+        except ValueError:
+            logger.warning(f"Invalid date format in DTSTART: {dateval}")
+            continue
+
+        holiday = {
+            "summary": fields.get("SUMMARY"),
+            "date": date,
+            "is_yearly": fields.get("RRULE", "").startswith("FREQ=YEARLY"),
+        }
+        if holiday["is_yearly"]:
+            # Generate holiday instances for last, current, and next year
+            for year in years_to_include:
+                try:
+                    holidays.append(Holiday(**{**holiday, "date": date.replace(year=year)}))
+                except ValueError:
+                    # Handle invalid dates like February 29th on non-leap years
+                    continue
+        else:
+            holidays.append(Holiday(**holiday))
+
+    holidays = tuple(sorted(holidays, key=lambda holiday: holiday.date))
+    HOLIDAYS_MEMORY_CACHE[cache_key] = (time.time() + max_age, holidays)
+
+    try:
+        cache_path = os.path.join(private_cache_dir(), cache_name)
+        # Written under a per-process name and renamed once complete, so readers never see a partial file
+        partial_path = f"{cache_path}.{os.getpid()}"
+        try:
+            with open(partial_path, "w", encoding="utf-8") as file:
+                json.dump([[holiday.summary, holiday.date.isoformat(), holiday.is_yearly] for holiday in holidays], file)
+            os.replace(partial_path, cache_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+    except OSError as e:
+        logger.warning(f"Could not cache holidays for {bundesland}: {e}")
+    return holidays
+
+
+def get_holidays_in_daterange(bundesland, start_date, end_date):
+    """
+    Fetches and parses holidays from an ICS file within a specified date range and Bundesland.
+
+    Args:
+        bundesland (str): Bundesland abbreviation (e.g., "BB" for Brandenburg).
+        start_date (datetime.date): Start date of the range.
+        end_date (datetime.date): End date of the range.
+
+    Returns:
+        list of Holiday: List of holidays within the date range, sorted by date.
+    """
+    holidays = holidays_in_year_window(bundesland, end_date.year)
+
+    # The window is sorted by date, so the date range is the slice between two binary searches
+    dates = np.array([holiday.date for holiday in holidays], dtype="datetime64[D]")
+    lo = np.searchsorted(dates, np.datetime64(start_date, "D"), side="left")
+    hi = np.searchsorted(dates, np.datetime64(end_date, "D"), side="right")
+    return list(holidays[lo:hi])
 
 
 def load_leave_data(file_path, start_date, end_date):
@@ -311,22 +548,22 @@ def load_leave_data(file_path, start_date, end_date):
     """
     try:
         # Try with openpyxl engine first
-        print(f"Attempting to read leave file: {file_path}")
-        df = pd.read_excel(file_path, parse_dates=["Startdatum", "Enddatum"], engine='openpyxl')
+        logger.info(f"Attempting to read leave file: {file_path}")
+        df = pd.read_excel(file_path, usecols=LEAVE_COLUMNS, parse_dates=["Startdatum", "Enddatum"], engine='openpyxl')
     except ValueError as e:
         if "Excel file format cannot be determined" in str(e):
-            print("Excel format couldn't be determined with openpyxl, trying xlrd engine...")
+            logger.info("Excel format couldn't be determined with openpyxl, trying xlrd engine...")
             try:
-                df = pd.read_excel(file_path, parse_dates=["Startdatum", "Enddatum"], engine='xlrd')
+                df = pd.read_excel(file_path, usecols=LEAVE_COLUMNS, parse_dates=["Startdatum", "Enddatum"], engine='xlrd')
             except Exception as e2:
-                print(f"Failed with xlrd engine too: {str(e2)}")
-                print(
+                logger.warning(f"Failed with xlrd engine too: {str(e2)}")
+                logger.warning(
                     "Couldn't read the leave excel file. Maybe it wasn't downloaded correctly. This can happen if your login and CSRF token are invalid or outdated."
                 )
                 # Instead of exiting, let's raise a more descriptive error
                 raise ValueError("Failed to read Excel file. Your session ID or CSRF token may be invalid or expired. Please update your credentials using the /credentials command.") from e
         elif "File is not a zip file" in str(e) or "Zip file structure" in str(e):
-            print("Invalid Excel file format. This typically happens when credentials are expired or invalid.")
+            logger.warning("Invalid Excel file format. This typically happens when credentials are expired or invalid.")
             raise ValueError("Your session ID or CSRF token has expired or is invalid. Please update your credentials using the /credentials command.") from e
         else:
             raise
@@ -338,6 +575,58 @@ def load_leave_data(file_path, start_date, end_date):
     return df.loc[df["Status"] != "Abgelehnt"]
 
 
+def expand_leave_days(leaves_df, start_date, end_date):
+    """
+    Expands the vacation, sick and special leaves into one row per leave day within the time span.
+    Leaves of other types are left out.
+
+    Args:
+        leaves_df (pd.DataFrame): Leave data as returned by load_leave_data().
+        start_date (datetime.date): Start date of the time span.
+        end_date (datetime.date): End date of the time span.
+
+    Returns:
+        pd.DataFrame: Columns Date (pd.Timestamp), Type (leave type) and Is_Vacation_Sick
+        (False for special leaves), ordered by leave and then by date.
+    """
+    if len(leaves_df) == 0:
+        return pd.DataFrame(
+            {
+                "Date": pd.DatetimeIndex([]),
+                "Type": pd.Series(dtype=object),
+                "Is_Vacation_Sick": pd.Series(dtype=bool),
+            }
+        )
+
+    # There are only a few distinct leave types, so match the prefixes once per type and map
+    # the result back through the category codes (-1 for a missing type picks the trailing False)
+    leave_types = leaves_df["Abwesenheitstyp"].astype("category")
+    types = leave_types.cat.categories
+    codes = leave_types.cat.codes.to_numpy()
+    is_vacation_sick = np.append(
+        types.str.startswith(tuple(VACATION_LEAVE_TYPES + SICK_LEAVE_TYPES)), False
+    )[codes]
+    is_special = ~is_vacation_sick & np.append(types.str.startswith(tuple(SPECIAL_LEAVE_TYPES)), False)[codes]
+
+    # Clip every leave to the time span, leaves outside of it end up with no days
+    starts = leaves_df["Startdatum"].dt.normalize().clip(lower=pd.Timestamp(start_date))
+    ends = leaves_df["Enddatum"].dt.normalize().clip(upper=pd.Timestamp(end_date))
+    n_days = (ends - starts).dt.days.fillna(-1).to_numpy(dtype=np.int64) + 1
+    n_days = np.where(is_vacation_sick | is_special, np.maximum(n_days, 0), 0)
+
+    # Repeat each leave once per day and number the repeats 0, 1, ... within each leave
+    rows = np.repeat(np.arange(len(leaves_df)), n_days)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+
+    return pd.DataFrame(
+        {
+            "Date": starts.to_numpy()[rows] + offsets.astype("timedelta64[D]"),
+            "Type": leaves_df["Abwesenheitstyp"].to_numpy()[rows],
+            "Is_Vacation_Sick": is_vacation_sick[rows],
+        }
+    )
+
+
 def calculate_overtime_undertime(total_expected, total_worked):
     """
     Calculates the difference between total expected work hours and actual worked hours.
@@ -372,6 +661,24 @@ def calculate_overtime_undertime(total_expected, total_worked):
     return status, int(hours), int(minutes)
 
 
+def difference_labels(expected, actual):
+    """
+    Labels how far the actual hours are above ("+1.5h") or below ("-1.5h") the expected hours.
+
+    Args:
+        expected (pd.Series): Expected hours.
+        actual (pd.Series): Actual hours, matched to expected by position.
+
+    Returns:
+        np.ndarray: One label per position, empty where both are equal.
+    """
+    diffs = np.asarray(expected, dtype=float) - np.asarray(actual, dtype=float)
+    amounts = np.char.mod("%.1fh", np.abs(diffs))
+    return np.where(
+        diffs < 0, np.char.add("+", amounts), np.where(diffs > 0, np.char.add("-", amounts), "")
+    )
+
+
 def plot_data(
     daily_work_hours,
     expected_daily_work_hours,
@@ -379,6 +686,8 @@ def plot_data(
     expected_cumulative_work_hours,
     max_expected_daily_work_hours,
     pdf_file_name,
+    pdf_output=None,
+    show=False,
 ):
     """
     Generates and saves plots visualizing work hours over time.
@@ -390,9 +699,17 @@ def plot_data(
         expected_cumulative_work_hours (pd.Series): Cumulative expected work hours.
         max_expected_daily_work_hours (float): Maximum expected daily work hours for plot scaling.
         pdf_file_name (str): Base name for the saved PDF file.
+        pdf_output (file-like): If given, the PDF is written here instead of to pdf_file_name.
+        show (bool): Open the figure in a window before saving it.
     """
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 8), sharex=False)
 
+    # Plot against float day numbers so matplotlib skips its datetime unit conversion,
+    # xaxis_date() below keeps the ticks formatted as dates
+    expected_days = mdates.date2num(expected_daily_work_hours.index)
+    days = mdates.date2num(daily_work_hours.index)
+    cumulative_days = mdates.date2num(cumulative_work_hours.index)
+
     EXPECTED_TIME_COLOR = "#DADFE1"
     WORKTIME_COLOR = "#AAAD00"
     SPECIAL_TIME_COLOR = "#1E1A3F"
@@ -400,37 +717,48 @@ def plot_data(
     HALF_DAY_COLOR = "#FF5733"
 
     expected_1 = ax1.bar(
-        expected_daily_work_hours.index,
+        expected_days,
         expected_daily_work_hours,
         color=EXPECTED_TIME_COLOR,
         edgecolor=EXPECTED_TIME_COLOR,
         label="Expected Work Time",
     )
 
+    # Stack the segments so each one is drawn once; together they reach Summed_Hours
+    worked = daily_work_hours["Worked_Hours"].to_numpy()
+    half_day = daily_work_hours["Half_Day_Hours"].to_numpy()
+    special = daily_work_hours["Special_Hours"].to_numpy()
+    vacation_sick = daily_work_hours["Summed_Hours"].to_numpy() - (worked + half_day + special)
+
     actual_1 = ax1.bar(
-        daily_work_hours.index,
-        daily_work_hours["Summed_Hours"],
+        days,
+        vacation_sick,
+        bottom=worked + half_day + special,
         color=VACATION_SICK_COLOR,
         edgecolor=VACATION_SICK_COLOR,
         label="Vacation, Holiday and Sick Times",
     )
     _ = ax1.bar(
-        daily_work_hours.index,
-        daily_work_hours.loc[:, ["Worked_Hours", "Special_Hours"]].sum(axis=1),
+        days,
+        special,
+        bottom=worked + half_day,
         color=SPECIAL_TIME_COLOR,
         edgecolor=SPECIAL_TIME_COLOR,
         label="Special Leave Times",
     )
+    # Drawn above the half day segments so the edges of empty segments resting on it stay hidden
     _ = ax1.bar(
-        daily_work_hours.index,
-        daily_work_hours["Worked_Hours"],
+        days,
+        worked,
         color=WORKTIME_COLOR,
         edgecolor=WORKTIME_COLOR,
         label="Actual Work Time",
+        zorder=1.5,
     )
     _ = ax1.bar(
-        daily_work_hours.index,
-        daily_work_hours["Half_Day_Hours"],
+        days,
+        half_day,
+        bottom=worked,
         color=HALF_DAY_COLOR,
         edgecolor=HALF_DAY_COLOR,
         label="Half Day Hours",
@@ -441,103 +769,88 @@ def plot_data(
     ax1.set_ylabel("Daily Work Hours")
 
     date_format = mdates.DateFormatter("%d.%m\n%a")
-    ax1.set_xticks(expected_daily_work_hours.index)
+    ax1.xaxis_date()
+    ax1.set_xticks(expected_days)
     ax1.xaxis.set_major_formatter(date_format)
     ax1.legend(loc="upper left")
 
-    for expected_bar, actual_bar in zip(expected_1, actual_1):
-        height_diff = expected_bar.get_height() - actual_bar.get_height()
-        if height_diff < 0:
-            label = f"+{abs(height_diff):.1f}h"
-            ax1.annotate(
-                label,
-                xy=(
-                    actual_bar.get_x() + actual_bar.get_width() / 2,
-                    actual_bar.get_height(),
-                ),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha="center",
-                va="bottom",
-            )
-        elif height_diff > 0:
-            label = f"-{abs(height_diff):.1f}h"
-            ax1.annotate(
-                label,
-                xy=(
-                    actual_bar.get_x() + actual_bar.get_width() / 2,
-                    actual_bar.get_height(),
-                ),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha="center",
-                va="bottom",
-            )
+    ax1.bar_label(
+        actual_1,
+        labels=difference_labels(expected_daily_work_hours, daily_work_hours["Summed_Hours"]),
+        padding=3,
+    )
 
-    ax2.plot(
-        cumulative_work_hours.index,
+    # Markers go into one scatter collection instead of being drawn per point by the line
+    (cumulative_line,) = ax2.plot(
+        cumulative_days,
         cumulative_work_hours,
         color="#C2D100",
         label="Cumulative Work Time",
-        marker="o",
         alpha=0.5,
     )
+    cumulative_markers = ax2.scatter(
+        cumulative_days,
+        cumulative_work_hours,
+        color="#C2D100",
+        s=36,
+        alpha=0.5,
+        zorder=2,
+    )
 
     ax2.fill_between(
-        cumulative_work_hours.index,
+        cumulative_days,
         cumulative_work_hours,
         color="#C2D100",
         alpha=0.3,
         label="Area under Cumulative Work Time",
     )
 
-    expected_cumulative_work_hours_index = pd.date_range(
-        start=cumulative_work_hours.index.min(), end=cumulative_work_hours.index.max()
+    expected_cumulative_days = mdates.date2num(
+        pd.date_range(start=cumulative_work_hours.index.min(), end=cumulative_work_hours.index.max())
     )
-    expected_2 = ax2.plot(
-        expected_cumulative_work_hours_index,
+    (expected_line,) = ax2.plot(
+        expected_cumulative_days,
         expected_cumulative_work_hours,
         color="#1E1A3F",
-        marker="o",
         linestyle="--",
         label="Expected Cumulative Work Time",
     )
+    expected_markers = ax2.scatter(
+        expected_cumulative_days,
+        expected_cumulative_work_hours,
+        color="#1E1A3F",
+        s=36,
+        zorder=2,
+    )
 
-    for i in range(len(cumulative_work_hours)):
-        height_diff = (
-            expected_cumulative_work_hours.iloc[i] - cumulative_work_hours.iloc[i]
+    # Surplus is labelled at the actual line, shortfall at the expected line
+    cumulative_labels = difference_labels(expected_cumulative_work_hours, cumulative_work_hours)
+    for i in np.flatnonzero(cumulative_labels != ""):
+        if cumulative_labels[i].startswith("+"):
+            xy = (cumulative_days[i], cumulative_work_hours.iloc[i])
+        else:
+            xy = (expected_cumulative_days[i], expected_cumulative_work_hours.iloc[i])
+        ax2.annotate(
+            cumulative_labels[i],
+            xy=xy,
+            xytext=(0, 3),
+            textcoords="offset points",
+            ha="center",
+            va="bottom",
         )
-        if height_diff < 0:
-            label = f"+{abs(height_diff):.1f}h"
-            ax2.annotate(
-                label,
-                xy=(cumulative_work_hours.index[i], cumulative_work_hours.iloc[i]),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha="center",
-                va="bottom",
-            )
-        elif height_diff > 0:
-            label = f"-{abs(height_diff):.1f}h"
-            ax2.annotate(
-                label,
-                xy=(
-                    expected_cumulative_work_hours_index[i],
-                    expected_cumulative_work_hours.iloc[i],
-                ),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha="center",
-                va="bottom",
-            )
 
     ax2.set_title("Cumulative Work Time vs. Expected Cumulative Work Time")
     ax2.set_xlabel("Date")
     ax2.set_ylabel("Cumulative Work Time")
 
-    ax2.set_xticks(cumulative_work_hours.index)
+    ax2.xaxis_date()
+    ax2.set_xticks(cumulative_days)
     ax2.xaxis.set_major_formatter(date_format)
-    ax2.legend(loc="upper left")
+    # Show each line together with its markers in the legend
+    handles, labels = ax2.get_legend_handles_labels()
+    markers = {cumulative_line: cumulative_markers, expected_line: expected_markers}
+    handles = [(handle, markers[handle]) if handle in markers else handle for handle in handles]
+    ax2.legend(handles, labels, loc="upper left")
 
     ax1.set_ylim(ax1.get_ylim()[0], ax1.get_ylim()[1] * 1.1)
     ax2.set_ylim(ax2.get_ylim()[0], ax2.get_ylim()[1] * 1.1)
@@ -547,8 +860,27 @@ def plot_data(
     )
 
     plt.tight_layout()
-    plt.show()
-    fig.savefig(f"{pdf_file_name}.pdf")
+    if show:
+        plt.show()
+    if pdf_output is not None:
+        fig.savefig(pdf_output, format="pdf")
+    else:
+        fig.savefig(f"{pdf_file_name}.pdf")
+    # Release the figure, report workers are long-lived
+    plt.close(fig)
+
+
+def expected_hours_by_dow(expected_hours_per_day):
+    """
+    Lays out expected work hours per weekday as an array indexed by weekday number (Monday == 0).
+
+    Args:
+        expected_hours_per_day (dict): Expected work hours per weekday, like EXPECTED_HOURS_BY_DAY.
+
+    Returns:
+        np.ndarray: Expected hours for Monday to Sunday, int hours are kept as ints.
+    """
+    return np.array([expected_hours_per_day[day] for day in WEEKDAY_KEYS])
 
 
 def preprocess_data(df, expected_hours_per_day, start_date, end_date):
@@ -557,7 +889,8 @@ def preprocess_data(df, expected_hours_per_day, start_date, end_date):
 
     Args:
         df (pd.DataFrame): Raw attendance data.
-        expected_hours_per_day (dict): Expected work hours per weekday.
+        expected_hours_per_day (dict or np.ndarray): Expected work hours per weekday, either as a
+            dict like EXPECTED_HOURS_BY_DAY or as returned by expected_hours_by_dow().
         start_date (datetime.date): Start date for the analysis.
         end_date (datetime.date): End date for the analysis.
 
@@ -566,30 +899,28 @@ def preprocess_data(df, expected_hours_per_day, start_date, end_date):
     """
     all_days = pd.date_range(start=start_date, end=end_date, freq="D")
     dummy_df = pd.DataFrame(index=all_days)
-    dummy_df.index = pd.to_datetime(dummy_df.index)
     df_merged = dummy_df.join(df.set_index("Einchecken_Date"), how="left")
     df_merged["Arbeitsstunden"] = df_merged["Arbeitsstunden"].fillna(0)
 
-    df_merged["Arbeitsstunden"] = df_merged.apply(
-        lambda row: (
-            (row["Auschecken"] - row["Einchecken"]).total_seconds() / 3600
-            if pd.isna(row["Arbeitsstunden"]) or row["Arbeitsstunden"] == 0
-            else row["Arbeitsstunden"]
-        ) if pd.notna(row["Einchecken"]) and pd.notna(row["Auschecken"]) else 0,
-        axis=1,
+    # Days with both check-in and check-out but no recorded hours use the check-in/out span,
+    # days missing either time count as 0 hours
+    has_times = (df_merged["Einchecken"].notna() & df_merged["Auschecken"].notna()).to_numpy()
+    span_hours = (df_merged["Auschecken"] - df_merged["Einchecken"]).dt.total_seconds().to_numpy() / 3600
+    recorded_hours = df_merged["Arbeitsstunden"].to_numpy(dtype=float)
+    df_merged["Arbeitsstunden"] = np.where(
+        has_times, np.where(recorded_hours == 0, span_hours, recorded_hours), 0.0
     )
 
-    df_merged["Expected_Work_Time"] = list(
-        map(
-            lambda dow: expected_hours_per_day[WEEKDAY_KEYS[dow]],
-            df_merged.index.dayofweek,
-        )
-    )
+    if isinstance(expected_hours_per_day, dict):
+        expected_by_dow = expected_hours_by_dow(expected_hours_per_day)
+    else:
+        expected_by_dow = expected_hours_per_day
+    df_merged["Expected_Work_Time"] = expected_by_dow[df_merged.index.dayofweek.to_numpy()]
 
-    daily_work_hours = df_merged.groupby(df_merged.index)["Arbeitsstunden"].sum()
-    expected_daily_work_hours = df_merged.groupby(df_merged.index)[
-        "Expected_Work_Time"
-    ].max()
+    # Days with several check-ins have one row each, so sum them in a single groupby pass
+    daily = df_merged.groupby(level=0).agg({"Arbeitsstunden": "sum", "Expected_Work_Time": "max"})
+    daily_work_hours = daily["Arbeitsstunden"]
+    expected_daily_work_hours = daily["Expected_Work_Time"]
 
     return daily_work_hours, expected_daily_work_hours
 
@@ -609,9 +940,65 @@ def calculate_hours_minutes(total_hours):
     return hours, minutes
 
 
-def main():
+def calculate_hours_minutes_array(total_hours):
     """
-    Main function to execute the script. Parses arguments, processes data, and generates reports.
+    Array version of calculate_hours_minutes(), converting all values in one pass.
+
+    Args:
+        total_hours (array-like): Total hours per entry.
+
+    Returns:
+        tuple: (hours, minutes) lists of ints, rounded like calculate_hours_minutes().
+    """
+    total_hours = np.asarray(total_hours, dtype=float)
+    hours = np.trunc(total_hours)
+    minutes = np.round((total_hours - hours) * 60)
+    return hours.astype(np.int64).tolist(), minutes.astype(np.int64).tolist()
+
+
+@dataclass
+class ReportResult:
+    """
+    Summary of a processed time span, as returned by main() and printed by print_report().
+
+    Hours/minutes pairs are already split with calculate_hours_minutes(). The holidays and
+    leaves DataFrames have "Date", "Type" and "Hours" columns, one row per holiday, leave day
+    or half day; the weekly list holds dicts
+    with "Week_End", "Hours", "Minutes" and "Days_In_Month" (None unless the week is a
+    partial week at a month boundary).
+    """
+
+    plot_week: bool
+    status: str
+    diff_hours: int
+    diff_minutes: int
+    worked_hours: int
+    worked_minutes: int
+    expected_hours: int
+    expected_minutes: int
+    accounted_hours: int
+    accounted_minutes: int
+    remaining_hours: int
+    remaining_minutes: int
+    expected_after_leaves_hours: int
+    expected_after_leaves_minutes: int
+    boundary_adjusted: bool
+    holidays: pd.DataFrame
+    leaves: pd.DataFrame
+    weekly: list
+    pdf_file_name: str
+    pdf_bytes: bytes = None
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line arguments.
+
+    Args:
+        argv (list of str): Arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments, as expected by main().
     """
     parser = argparse.ArgumentParser(
         description="Visualize and analyze work attendance data."
@@ -681,7 +1068,29 @@ def main():
         help="Custom month to process in yyyy-mm format (e.g., 2024-12). Incompatible with --week, --month, and --start/--end.",
         default=None,
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--no-show",
+        dest="show",
+        default=True,
+        action="store_false",
+        help="Only save the PDF report, without opening the plot in a window.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(args=None, in_memory_pdf=False):
+    """
+    Main function to execute the script. Processes data, saves the PDF report and returns its summary.
+
+    Args:
+        args (argparse.Namespace): Arguments as returned by parse_args(). Parsed from the command line if not given.
+        in_memory_pdf (bool): Return the PDF as ReportResult.pdf_bytes instead of saving it to disk.
+
+    Returns:
+        ReportResult: Summary figures, holidays, leaves and weekly totals of the processed time span.
+    """
+    if args is None:
+        args = parse_args()
 
     if args.custom_month is not None:
         assert not args.plot_week and not args.plot_month and args.start_date is None and args.end_date is None, (
@@ -744,6 +1153,11 @@ def main():
         last_day_of_month = calendar.monthrange(now.year, now.month)[1]
         end_date = datetime.date(now.year, now.month, last_day_of_month)
 
+    # The holidays do not depend on the Odoo exports, so start fetching them right away
+    holidays_future = HOLIDAYS_EXECUTOR.submit(
+        get_holidays_in_daterange, MY_BUNDESLAND, start_date, end_date
+    )
+
     if not args.attendance_file:
         assert (
             SESSION_ID != "" and CSRF_TOKEN != ""
@@ -761,121 +1175,123 @@ def main():
     df["Einchecken_Date"] = df["Einchecken"].dt.date
     df["Auschecken_Date"] = df["Auschecken"].dt.date
 
+    # EXPECTED_HOURS_BY_DAY is replaced per report, so its array form is built here rather than at import
+    expected_by_dow = expected_hours_by_dow(EXPECTED_HOURS_BY_DAY)
     daily_work_hours, expected_daily_work_hours = preprocess_data(
-        df, EXPECTED_HOURS_BY_DAY, start_date, end_date
+        df, expected_by_dow, start_date, end_date
     )
 
     leaves_df = load_leave_data(leave_file_path, start_date, end_date)
-    daily_work_hours = daily_work_hours.to_frame(name="Worked_Hours")
-    daily_work_hours.loc[
-        :, ["Vacation_Sick_Hours", "Special_Hours", "Half_Day_Hours", "Summed_Hours"]
-    ] = 0  # Initialize new column 'Half_Day_Hours'
-
-    vacation_sick_dates = set()
-    detailed_leaves = []
-    for _, row in leaves_df.iterrows():
-        if row["Start_Date"] > end_date or row["End_Date"] < start_date:
-            continue
-        else:
-            leave_start_date = max(row["Start_Date"], start_date)
-            leave_end_date = min(row["End_Date"], end_date)
-            leave_days_range = pd.date_range(
-                start=leave_start_date, end=leave_end_date, freq="D"
-            )
-            if any(
-                row["Abwesenheitstyp"].startswith(t)
-                for t in (VACATION_LEAVE_TYPES + SICK_LEAVE_TYPES)
-            ):
-                for date in leave_days_range:
-                    vacation_sick_dates.add(date)
-                    detailed_leaves.append({
-                        "Date": date.date(),
-                        "Type": row["Abwesenheitstyp"],
-                        "Hours": expected_daily_work_hours.get(date, 0)
-                    })
-            elif any(
-                row["Abwesenheitstyp"].startswith(t) for t in SPECIAL_LEAVE_TYPES
-            ):
-                for date in leave_days_range:
-                    daily_work_hours.loc[date, "Special_Hours"] = expected_daily_work_hours.get(
-                        date, 0
-                    )
-                    detailed_leaves.append({
-                        "Date": date.date(),
-                        "Type": row["Abwesenheitstyp"],
-                        "Hours": expected_daily_work_hours.get(date, 0)
-                    })
-            else:
-                continue
-
-    holidays = get_holidays_in_daterange(MY_BUNDESLAND, start_date, end_date)
-    detailed_holidays = []
-    for holiday in holidays:
-        vacation_sick_dates.add(pd.Timestamp(holiday.date))
-        detailed_holidays.append({
-            "Date": holiday.date,
+    # Float columns, so fractional expected hours can be written without an upcast
+    zero_hours = np.zeros(len(daily_work_hours), dtype=np.float64)
+    daily_work_hours = daily_work_hours.to_frame(name="Worked_Hours").assign(
+        Vacation_Sick_Hours=zero_hours,
+        Special_Hours=zero_hours,
+        Half_Day_Hours=zero_hours,
+        Summed_Hours=zero_hours,
+    )
+
+    # One entry per leave day, their expected hours are looked up at once and the special
+    # leave hours are written in a single assignment
+    leave_days = expand_leave_days(leaves_df, start_date, end_date)
+    leave_hours = expected_daily_work_hours.reindex(leave_days["Date"]).fillna(0).to_numpy()
+    is_vacation_sick = leave_days["Is_Vacation_Sick"].to_numpy()
+    special_dates = pd.DatetimeIndex(leave_days["Date"].to_numpy()[~is_vacation_sick])
+    daily_work_hours.loc[special_dates, "Special_Hours"] = leave_hours[~is_vacation_sick]
+    vacation_sick_dates = pd.DatetimeIndex(leave_days["Date"].to_numpy()[is_vacation_sick])
+    # Hours stay as given (object column), so whole hours keep printing as 8h next to 4.0h half days
+    detailed_leaves = pd.DataFrame(
+        {
+            "Date": leave_days["Date"].dt.date,
+            "Type": leave_days["Type"],
+            "Hours": pd.Series(leave_hours, dtype=object),
+        }
+    )
+
+    holidays = holidays_future.result()
+    holiday_dates = pd.DatetimeIndex([holiday.date for holiday in holidays])
+    detailed_holidays = pd.DataFrame(
+        {
+            "Date": holiday_dates.date,
             "Type": "Holiday",
-            "Hours": expected_daily_work_hours.get(pd.Timestamp(holiday.date), 0)
-        })
+            "Hours": pd.Series(
+                expected_daily_work_hours.reindex(holiday_dates).fillna(0).to_numpy(), dtype=object
+            ),
+        }
+    )
 
-    for date in vacation_sick_dates:
-        daily_work_hours.loc[date, "Vacation_Sick_Hours"] = expected_daily_work_hours.get(
-            date, 0
-        )
+    # Vacation, sick and holiday hours are written in a single assignment, each day counted once
+    vacation_sick_dates = vacation_sick_dates.union(holiday_dates)
+    daily_work_hours.loc[vacation_sick_dates, "Vacation_Sick_Hours"] = (
+        expected_daily_work_hours.reindex(vacation_sick_dates).fillna(0).to_numpy()
+    )
 
     # -------------------- Handle Half Days --------------------
-    half_day_dates = set()
-    for date_str in HALF_DAY_LIST:
-        try:
-            date_obj = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
-            if start_date <= date_obj <= end_date:
-                half_day_dates.add(pd.Timestamp(date_obj))
-        except ValueError:
-            print(f"Invalid date format in HALF_DAY_LIST: {date_str}. Expected 'YYYY-MM-DD'. Skipping this date.")
-            continue
+    half_day_dates = pd.to_datetime(HALF_DAY_LIST, format="%Y-%m-%d", errors="coerce")
+    for date_str in np.asarray(HALF_DAY_LIST, dtype=object)[half_day_dates.isna()]:
+        logger.warning(f"Invalid date format in HALF_DAY_LIST: {date_str}. Expected 'YYYY-MM-DD'. Skipping this date.")
+    half_day_dates = half_day_dates[
+        (half_day_dates >= pd.Timestamp(start_date)) & (half_day_dates <= pd.Timestamp(end_date))
+    ].unique()
 
     # Add half of the expected work hours to Half_Day_Hours for each half day
-    for date in half_day_dates:
-        if date in daily_work_hours.index:
-            if (
-                daily_work_hours.loc[date, "Vacation_Sick_Hours"] == 0 and
-                daily_work_hours.loc[date, "Special_Hours"] == 0
-            ):
-                half_expected = 0.5 * expected_daily_work_hours.loc[date]
-                daily_work_hours.loc[date, "Half_Day_Hours"] += half_expected
-                detailed_leaves.append({
-                    "Date": date.date(),
-                    "Type": "Half Day",
-                    "Hours": half_expected
-                })
-            else:
-                # Optionally, log that the half day was skipped
-                print(f"Half day on {date.date()} was skipped because it's already marked as a leave day.")
+    half_day_dates = half_day_dates[half_day_dates.isin(daily_work_hours.index)]
+    other_leave = (
+        daily_work_hours.loc[half_day_dates, ["Vacation_Sick_Hours", "Special_Hours"]].to_numpy() != 0
+    ).any(axis=1)
+    for date in half_day_dates[other_leave]:
+        logger.warning(f"Half day on {date.date()} was skipped because it's already marked as a leave day.")
+    half_day_dates = half_day_dates[~other_leave]
+    if len(half_day_dates) != 0:
+        half_expected = 0.5 * expected_daily_work_hours.reindex(half_day_dates).to_numpy()
+        daily_work_hours.loc[half_day_dates, "Half_Day_Hours"] += half_expected
+        half_day_leaves = pd.DataFrame(
+            {
+                "Date": half_day_dates.date,
+                "Type": "Half Day",
+                "Hours": pd.Series(half_expected, dtype=object),
+            }
+        )
+        detailed_leaves = pd.concat([detailed_leaves, half_day_leaves], ignore_index=True)
     # Recalculate Summed_Hours to include Half_Day_Hours
-    daily_work_hours["Summed_Hours"] = daily_work_hours.loc[
-        :, ["Worked_Hours", "Vacation_Sick_Hours", "Special_Hours", "Half_Day_Hours"]
-    ].sum(axis=1)
+    daily_work_hours["Summed_Hours"] = (
+        daily_work_hours["Worked_Hours"].to_numpy()
+        + daily_work_hours["Vacation_Sick_Hours"].to_numpy()
+        + daily_work_hours["Special_Hours"].to_numpy()
+        + daily_work_hours["Half_Day_Hours"].to_numpy()
+    )
 
-    cumulative_work_hours = daily_work_hours.loc[:, "Summed_Hours"].cumsum()
-    expected_cumulative_work_hours = expected_daily_work_hours.cumsum()
+    # Running totals straight on the arrays, wrapped back onto the existing date index for plotting
+    cumulative_work_hours = pd.Series(
+        np.cumsum(daily_work_hours["Summed_Hours"].to_numpy()), index=daily_work_hours.index
+    )
+    expected_cumulative_work_hours = pd.Series(
+        np.cumsum(expected_daily_work_hours.to_numpy()), index=expected_daily_work_hours.index
+    )
 
-    sum_vacation_sick_hours = daily_work_hours["Vacation_Sick_Hours"].sum()
-    sum_half_hours = daily_work_hours["Half_Day_Hours"].sum()
+    # All column totals in one reduction
+    sums = daily_work_hours[
+        ["Worked_Hours", "Vacation_Sick_Hours", "Half_Day_Hours", "Summed_Hours"]
+    ].sum()
+    sum_vacation_sick_hours = sums["Vacation_Sick_Hours"]
+    sum_half_hours = sums["Half_Day_Hours"]
 
     # Calculate Adjusted Expected Hours after removing holidays and vacation
     total_expected_hours = expected_cumulative_work_hours.iloc[-1]
-    sum_vacation_sick_hours = daily_work_hours["Vacation_Sick_Hours"].sum()
-    sum_half_hours = daily_work_hours["Half_Day_Hours"].sum()
     
+    # Month and custom month reports adjust the weeks crossing the month boundary
+    is_month_view = bool(args.plot_month or args.custom_month)
+
     # Fix for the missing hour in the final week of the month
     next_month_expected_hours = 0
+    end_weekday = end_date.weekday()
     # Check if the last day of the month is not a Sunday (end of week)
-    if (args.plot_month or args.custom_month) and end_date.weekday() != 6:  # 6 is Sunday
+    if is_month_view and end_weekday != 6:  # 6 is Sunday
         # Find the last week in the data
         last_week_end = pd.Timestamp(end_date)
         # Calculate days remaining to complete the week
-        days_to_sunday = 6 - end_date.weekday()
-        last_week_start = last_week_end - pd.Timedelta(days=end_date.weekday())
+        days_to_sunday = 6 - end_weekday
+        last_week_start = last_week_end - pd.Timedelta(days=end_weekday)
         
         # Check if this week spans into the next month
         if last_week_end.month == last_week_start.month:
@@ -884,23 +1300,19 @@ def main():
         else:
             # Week spans across months, calculate expected hours for the remaining days
             # that would be in the next month
-            next_month_start = end_date + datetime.timedelta(days=1)
-            for i in range(days_to_sunday):
-                next_day = next_month_start + datetime.timedelta(days=i)
-                next_day_weekday = next_day.weekday()
-                weekday_key = WEEKDAY_KEYS[next_day_weekday]
-                next_month_expected_hours += EXPECTED_HOURS_BY_DAY.get(weekday_key, 0)
+            # These are the weekdays after end_date up to and including Sunday
+            next_month_expected_hours += expected_by_dow[end_weekday + 1 :].sum().item()
             
             # Add a note about the adjustment
-            print(f"\nNote: Final week spans into next month. Adjusting calculations to include {days_to_sunday} days from next month.")
-            print(f"Additional expected hours from next month days: {next_month_expected_hours:.1f}h")
+            logger.info(f"Note: Final week spans into next month. Adjusting calculations to include {days_to_sunday} days from next month.")
+            logger.info(f"Additional expected hours from next month days: {next_month_expected_hours:.1f}h")
     
     # Apply the adjustment to the total expected hours
     total_expected_hours_adjusted = total_expected_hours + next_month_expected_hours
     sum_expected_after_holidays_vacation = total_expected_hours_adjusted - sum_vacation_sick_hours - sum_half_hours
 
     # Calculate Difference as Y - X (Total Expected Hours - Total Worked Hours)
-    sum_Worked_Hours = round(daily_work_hours["Worked_Hours"].sum(), 3)
+    sum_Worked_Hours = round(sums["Worked_Hours"], 3)
     difference = sum_expected_after_holidays_vacation - sum_Worked_Hours  # D = Y - X
 
     # Convert to hours and minutes
@@ -919,22 +1331,121 @@ def main():
         sum_expected_after_holidays_vacation, sum_Worked_Hours
     )
 
-    if args.plot_week:
+    # Total summed hours (actual work + vacation/sick + special + half days)
+    total_summed_hours = sums["Summed_Hours"]
+
+    # Group the days by the Sunday ending their week, the same bins as resample("W-SUN")
+    week_ends = daily_work_hours.index + pd.to_timedelta(6 - daily_work_hours.index.weekday, unit="D")
+    weekly_work_hours = daily_work_hours["Summed_Hours"].groupby(week_ends).sum()
+
+    if is_month_view:
+        # Days of each week that fall into the report month, every week runs from Monday to Sunday
+        week_days = pd.date_range(weekly_work_hours.index[0] - pd.Timedelta(days=6), weekly_work_hours.index[-1])
+        in_month = (week_days.month == end_date.month) & (week_days.year == end_date.year)
+        month_days_per_week = in_month.reshape(-1, 7).sum(axis=1)
+
+    weekly = []
+    all_weekly_hours, all_weekly_minutes = calculate_hours_minutes_array(weekly_work_hours.to_numpy())
+    for i, week in enumerate(weekly_work_hours.index):
+        weekly_hours, weekly_minutes = all_weekly_hours[i], all_weekly_minutes[i]
+
+        # Check if this is the last week of the month and it's incomplete
+        week_end_date = week.date()
+        week_start_date = (week - pd.Timedelta(days=6)).date()
+
+        days_in_current_month = None
+        # If the week spans across month boundaries and we're in month view
+        if is_month_view and week_end_date.month != week_start_date.month:
+            # Calculate how many days of this week are in the current month
+            days_in_current_month = int(month_days_per_week[i])
+
+        weekly.append({
+            "Week_End": week_end_date,
+            "Hours": weekly_hours,
+            "Minutes": weekly_minutes,
+            "Days_In_Month": days_in_current_month
+        })
+
+    pdf_output = io.BytesIO() if in_memory_pdf else None
+    plot_data(
+        daily_work_hours,
+        expected_daily_work_hours,
+        cumulative_work_hours,
+        expected_cumulative_work_hours,
+        expected_daily_work_hours.max(),
+        pdf_file_name,
+        pdf_output,
+        show=args.show and not in_memory_pdf,
+    )
+
+    # Use adjusted expected hours if there's an adjustment
+    boundary_adjusted = next_month_expected_hours > 0
+    if boundary_adjusted:
+        expected_hours, expected_minutes = expected_hours_adjusted, expected_minutes_adjusted
+
+    return ReportResult(
+        plot_week=args.plot_week,
+        status=status,
+        diff_hours=diff_hours,
+        diff_minutes=diff_minutes,
+        worked_hours=worked_hours,
+        worked_minutes=worked_minutes,
+        expected_hours=expected_hours,
+        expected_minutes=expected_minutes,
+        accounted_hours=math.floor(total_summed_hours),
+        accounted_minutes=int((total_summed_hours % 1) * 60),
+        remaining_hours=difference_hours,
+        remaining_minutes=difference_minutes,
+        expected_after_leaves_hours=sum_expected_after_holidays_vacation_hours,
+        expected_after_leaves_minutes=sum_expected_after_holidays_vacation_minutes,
+        boundary_adjusted=boundary_adjusted,
+        holidays=detailed_holidays,
+        leaves=detailed_leaves,
+        weekly=weekly,
+        pdf_file_name=pdf_file_name,
+        pdf_bytes=pdf_output.getvalue() if pdf_output is not None else None,
+    )
+
+
+def run_report(args, expected_hours_by_day):
+    """
+    Runs main() with the given expected hours and an in-memory PDF; used by the bot to generate reports in a worker process.
+
+    Args:
+        args (argparse.Namespace): Arguments as returned by parse_args().
+        expected_hours_by_day (dict): Expected work hours per weekday, replacing EXPECTED_HOURS_BY_DAY.
+
+    Returns:
+        ReportResult: Summary of the processed time span.
+    """
+    global EXPECTED_HOURS_BY_DAY
+    EXPECTED_HOURS_BY_DAY = dict(expected_hours_by_day)
+    return main(args, in_memory_pdf=True)
+
+
+def print_report(result):
+    """
+    Prints the summary returned by main() in the command line format.
+
+    Args:
+        result (ReportResult): Summary of the processed time span.
+    """
+    if result.plot_week:
         print(
-            f"\nTotal hours worked this week: {worked_hours} hours and {worked_minutes} minutes of {expected_hours} hours and {expected_minutes} minutes"
+            f"\nTotal hours worked this week: {result.worked_hours} hours and {result.worked_minutes} minutes of {result.expected_hours} hours and {result.expected_minutes} minutes"
         )
         print(
-            f"🕒 Actual Hours Worked: {worked_hours}h {worked_minutes}m"
+            f"🕒 Actual Hours Worked: {result.worked_hours}h {result.worked_minutes}m"
         )
         print(
-            f"📆 Expected Hours: {expected_hours}h {expected_minutes}m"
+            f"📆 Expected Hours: {result.expected_hours}h {result.expected_minutes}m"
         )
         print(
-            f"✓ Total Hours Accounted: {worked_hours}h {worked_minutes}m"
+            f"✓ Total Hours Accounted: {result.worked_hours}h {result.worked_minutes}m"
         )
         # Calculate remaining hours
-        remaining_hours = max(0, expected_hours - worked_hours)
-        remaining_minutes = max(0, expected_minutes - worked_minutes)
+        remaining_hours = max(0, result.expected_hours - result.worked_hours)
+        remaining_minutes = max(0, result.expected_minutes - result.worked_minutes)
         if remaining_minutes < 0:
             remaining_hours -= 1
             remaining_minutes += 60
@@ -942,78 +1453,53 @@ def main():
             f"⏳ Remaining Hours Needed: {remaining_hours}h {remaining_minutes}m"
         )
     else:
-        # Calculate the total summed hours (actual work + vacation/sick + special + half days)
-        total_summed_hours = daily_work_hours["Summed_Hours"].sum()
-        total_summed_hours_floor = math.floor(total_summed_hours)
-        total_summed_minutes = int((total_summed_hours % 1) * 60)
-        
-        # Use adjusted expected hours if there's an adjustment
-        if next_month_expected_hours > 0:
-            print(
-                f"\nTotal hours Accounted this period (Including Attendance, leaves, Sick, Half Days, Holidays and Vacation Out of Total work days in this month): {total_summed_hours_floor} hours and {total_summed_minutes} minutes of {expected_hours_adjusted} hours and {expected_minutes_adjusted} minutes (adjusted for month boundary)"
-            )
-        else:
-            print(
-                f"\nTotal hours Accounted this period (Including Attendance, leaves, Sick, Half Days, Holidays and Vacation Out of Total work days in this month): {total_summed_hours_floor} hours and {total_summed_minutes} minutes of {expected_hours} hours and {expected_minutes} minutes"
-            )
         print(
-            f"Total work time accounted so far (Attendance Data): {worked_hours} hours and {worked_minutes} minutes"
+            f"\nTotal hours Accounted this period (Including Attendance, leaves, Sick, Half Days, Holidays and Vacation Out of Total work days in this month): {result.accounted_hours} hours and {result.accounted_minutes} minutes of {result.expected_hours} hours and {result.expected_minutes} minutes"
+            + (" (adjusted for month boundary)" if result.boundary_adjusted else "")
+        )
+        print(
+            f"Total work time accounted so far (Attendance Data): {result.worked_hours} hours and {result.worked_minutes} minutes"
         )
         print(
-            f"Total hours To complete this period (hours left on Actual Work Days[total work days - All holidays and leaves]): {difference_hours} hours and {difference_minutes} minutes of {sum_expected_after_holidays_vacation_hours} hours and {sum_expected_after_holidays_vacation_minutes} minutes after Holidays and vacation"
+            f"Total hours To complete this period (hours left on Actual Work Days[total work days - All holidays and leaves]): {result.remaining_hours} hours and {result.remaining_minutes} minutes of {result.expected_after_leaves_hours} hours and {result.expected_after_leaves_minutes} minutes after Holidays and vacation"
         )
 
-    print(f"Status: {status}, Difference: {'+' if status == 'Overtime' else ''}{diff_hours} hours and {diff_minutes} minutes")
+    print(f"Status: {result.status}, Difference: {'+' if result.status == 'Overtime' else ''}{result.diff_hours} hours and {result.diff_minutes} minutes")
 
-    if detailed_holidays:
-        print("\nList of Holidays:")
-        for holiday in detailed_holidays:
-            print(f"Date: {holiday['Date']}, Type: {holiday['Type']}, Hours Accounted: {holiday['Hours']}h")
+    if not result.holidays.empty:
+        # Each list is written with a single print call
+        print("\nList of Holidays:\n" + "\n".join(
+            f"Date: {holiday.Date}, Type: {holiday.Type}, Hours Accounted: {holiday.Hours}h"
+            for holiday in result.holidays.itertuples(index=False)
+        ))
     else:
         print("\nNo Holidays Detected in this period.")
 
-    if detailed_leaves:
-        print("\nList of Leaves and Half Days:")
-        for leave in detailed_leaves:
-            print(f"Date: {leave['Date']}, Type: {leave['Type']}, Hours Accounted: {leave['Hours']}h")
+    if not result.leaves.empty:
+        print("\nList of Leaves and Half Days:\n" + "\n".join(
+            f"Date: {leave.Date}, Type: {leave.Type}, Hours Accounted: {leave.Hours}h"
+            for leave in result.leaves.itertuples(index=False)
+        ))
     else:
         print("\nNo Leaves or Half Days Detected in this period.")
 
-    daily_work_hours.index = pd.to_datetime(daily_work_hours.index)
-    weekly_work_hours = daily_work_hours["Summed_Hours"].resample("W-SUN").sum()
-
     print("\nTotal weekly working hours:")
-    for week, hours in weekly_work_hours.items():
-        weekly_hours, weekly_minutes = calculate_hours_minutes(hours)
-        
-        # Check if this is the last week of the month and it's incomplete
-        week_end_date = week.date()
-        week_start_date = (week - pd.Timedelta(days=6)).date()
-        
-        # If the week spans across month boundaries and we're in month view
-        if (args.plot_month or args.custom_month) and week_end_date.month != week_start_date.month:
-            # Calculate how many days of this week are in the current month
-            days_in_current_month = sum(1 for d in pd.date_range(week_start_date, week_end_date) 
-                                      if d.month == end_date.month and d.year == end_date.year)
-            
+    for week in result.weekly:
+        if week["Days_In_Month"] is not None:
             # Add a note about partial week
             print(
-                f"Week ending {week.strftime('%Y-%m-%d')}: {weekly_hours} hours and {weekly_minutes} minutes (Partial week: {days_in_current_month}/7 days in this month)"
+                f"Week ending {week['Week_End'].strftime('%Y-%m-%d')}: {week['Hours']} hours and {week['Minutes']} minutes (Partial week: {week['Days_In_Month']}/7 days in this month)"
             )
         else:
             print(
-                f"Week ending {week.strftime('%Y-%m-%d')}: {weekly_hours} hours and {weekly_minutes} minutes"
+                f"Week ending {week['Week_End'].strftime('%Y-%m-%d')}: {week['Hours']} hours and {week['Minutes']} minutes"
             )
 
-    plot_data(
-        daily_work_hours,
-        expected_daily_work_hours,
-        cumulative_work_hours,
-        expected_cumulative_work_hours,
-        expected_daily_work_hours.max(),
-        pdf_file_name,
-    )
-
 
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    cli_args = parse_args()
+    if not cli_args.show:
+        # Nothing is displayed, so skip setting up a GUI backend
+        matplotlib.use("Agg")
+    print_report(main(cli_args))
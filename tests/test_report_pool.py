@@ -0,0 +1,59 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
+
+import bot
+
+
+def fake_report(seconds, expected_hours):
+    """Stands in for plot_times.run_report in the worker, sleeping for the given seconds."""
+    time.sleep(seconds)
+    return expected_hours
+
+
+@unittest.skipUnless(hasattr(signal, "SIGKILL"), "needs SIGKILL")
+class RunReportWorkerDeathTest(unittest.TestCase):
+    """A report worker killed from outside must not break the reports that follow."""
+
+    def setUp(self):
+        patcher = mock.patch.object(bot.plot_times, "run_report", fake_report)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        bot.report_pool, bot.report_worker_pid = bot.new_report_pool()
+        self.addCleanup(lambda: bot.report_pool.shutdown(cancel_futures=True))
+
+    def kill_worker(self):
+        os.kill(bot.report_worker_pid.result(timeout=30), signal.SIGKILL)
+
+    def test_worker_killed_during_report(self):
+        async def scenario():
+            report = asyncio.ensure_future(bot.run_report(30, {"Mon": 8}, 60))
+            await asyncio.sleep(1)
+            self.kill_worker()
+            with self.assertRaises(BrokenProcessPool):
+                await report
+            return await bot.run_report(0, {"Mon": 8}, 60)
+
+        self.assertEqual(asyncio.run(scenario()), {"Mon": 8})
+
+    def test_worker_killed_while_idle(self):
+        async def scenario():
+            await bot.run_report(0, {"Mon": 8}, 60)
+            self.kill_worker()
+            # Give the pool time to notice the dead worker
+            await asyncio.sleep(1)
+            return await bot.run_report(0, {"Tue": 4}, 60)
+
+        self.assertEqual(asyncio.run(scenario()), {"Tue": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()